@@ -4,32 +4,31 @@
 Nichibun card scraper
 ---------------------
 Given a list of card identifiers (e.g., U426_nichibunken_0051_0032_0000),
-fetch the Nichibun YoukaiGazou detail page to extract:
+fetch the Nichibun YoukaiGazou detail page (one parse, shared with the
+identifier crawler's `parse_card`) to extract:
   - subjects (主題)
   - description (内容記述)
   - IIIF manifest / viewer links
   - Best-effort image URL
 
-Optionally download the referenced JPEGs while throttling requests so the
+Optionally download the referenced JPEGs. Requests go through the shared
+async fetch engine (`nichibun_fetch`), which rate-limits per host so the
 remote server is not overloaded. Supports limited concurrency and caption
 generation so images can be passed directly into the LoRA dataset prep pipeline.
 """
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
 import sys
-import time
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Sequence, Set
-import threading
-from urllib.parse import urljoin
 
-import requests
-from bs4 import BeautifulSoup
+from nichibun_fetch import Fetcher, add_fetch_arguments, config_from_args, decode_html
+from nichibun_identifier_crawler import CARD_URL, IMAGE_BASE, parse_card
 
-from nichibun_identifier_crawler import CARD_URL, IMAGE_BASE, parse_card_metadata
+CARD_FIELDS = ("identifier", "subjects", "description", "card_url", "image_url", "manifest_url", "viewer_url")
 
 
 def parse_args() -> argparse.Namespace:
@@ -53,7 +52,15 @@ def parse_args() -> argparse.Namespace:
     ap.add_argument(
         "--input-csv",
         default=None,
-        help="CSV file that contains an 'identifier' column.",
+        help=(
+            "CSV file that contains an 'identifier' column. Rows that already carry full card "
+            "records (e.g. nichibun_identifier_crawler output) are used without fetching the card."
+        ),
+    )
+    ap.add_argument(
+        "--refetch",
+        action="store_true",
+        help="Fetch card pages even when --input-csv already has their records.",
     )
     ap.add_argument(
         "--out",
@@ -75,29 +82,6 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Overwrite images if they already exist locally.",
     )
-    ap.add_argument(
-        "--sleep",
-        type=float,
-        default=0.3,
-        help="Delay between HTTP requests in seconds (default: 0.3).",
-    )
-    ap.add_argument(
-        "--timeout",
-        type=float,
-        default=15.0,
-        help="HTTP request timeout in seconds (default: 15).",
-    )
-    ap.add_argument(
-        "--user-agent",
-        default="Mozilla/5.0 (compatible; NichibunCardScraper/1.0)",
-        help="Custom User-Agent header.",
-    )
-    ap.add_argument(
-        "--max-workers",
-        type=int,
-        default=2,
-        help="Maximum concurrent requests (keep small to avoid stressing the server).",
-    )
     ap.add_argument(
         "--captions-dir",
         default=None,
@@ -108,6 +92,12 @@ def parse_args() -> argparse.Namespace:
         default="yokai style",
         help="Prefix tag inserted when auto-generating captions (for LoRA training).",
     )
+    add_fetch_arguments(
+        ap,
+        user_agent="Mozilla/5.0 (compatible; NichibunCardScraper/1.0)",
+        concurrency=2,
+        concurrency_flags=("--max-workers", "--concurrency"),
+    )
     return ap.parse_args()
 
 
@@ -158,6 +148,15 @@ def gather_identifiers(args: argparse.Namespace) -> List[str]:
     return uniq
 
 
+def load_card_records(path: Path) -> Dict[str, Dict[str, str]]:
+    """identifier -> card fields, when the CSV has every column ``scrape_card`` produces."""
+    with path.open(encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if not set(CARD_FIELDS) <= set(reader.fieldnames or []):
+            return {}
+        return {row["identifier"]: {name: row.get(name) or "" for name in CARD_FIELDS} for row in reader if row.get("identifier")}
+
+
 def load_existing_rows(out_path: Path) -> List[Dict[str, str]]:
     if not out_path.exists():
         return []
@@ -170,62 +169,22 @@ def load_existing_rows(out_path: Path) -> List[Dict[str, str]]:
     return rows
 
 
-thread_local = threading.local()
-
-
-def get_thread_session(user_agent: str) -> requests.Session:
-    session = getattr(thread_local, "session", None)
-    if session is None:
-        session = requests.Session()
-        session.headers.update({"User-Agent": user_agent})
-        thread_local.session = session
-    return session
-
-
-def extract_media_links(html: str, base_url: str) -> Dict[str, str]:
-    """Locate the main JPEG, IIIF manifest, and viewer links from the card page."""
-    soup = BeautifulSoup(html, "html.parser")
-    media: Dict[str, str] = {}
-
-    img_tag = soup.select_one('td img[src*="YoukaiGazou/image/"]')
-    if img_tag:
-        src = img_tag.get("src")
-        if src:
-            media["image_url_html"] = urljoin(base_url, src)
-
-    for a_tag in soup.find_all("a", href=True):
-        href = a_tag["href"]
-        abs_href = urljoin(base_url, href)
-        if "IIIF/manifest" in href and "manifest_url" not in media:
-            media["manifest_url"] = abs_href
-        if "iiif-viewer" in href and "viewer_url" not in media:
-            media["viewer_url"] = abs_href
-
-    return media
-
-
-def scrape_card(
-    identifier: str,
-    session: requests.Session,
-    timeout: float,
-) -> Dict[str, str]:
+async def scrape_card(identifier: str, fetcher: Fetcher) -> Dict[str, str]:
     params = {"identifier": identifier}
-    resp = session.get(CARD_URL, params=params, timeout=timeout)
-    resp.raise_for_status()
-    html = resp.text
-    final_url = resp.url
+    resp = await fetcher.get(CARD_URL, params=params)
+    html = decode_html(resp)
+    final_url = str(resp.url)
 
-    metadata = parse_card_metadata(html)
-    media_links = extract_media_links(html, final_url)
+    card = parse_card(html, final_url)
 
-    subjects = metadata.get("subjects", "")
-    description = metadata.get("description", "")
+    subjects = card.get("subjects", "")
+    description = card.get("description", "")
 
     fallback_image_url = IMAGE_BASE + f"{identifier}.jpg"
-    image_url = media_links.get("image_url_html", fallback_image_url)
+    image_url = card.get("image_url_html", fallback_image_url)
 
-    manifest_url = media_links.get("manifest_url", "")
-    viewer_url = media_links.get("viewer_url", "")
+    manifest_url = card.get("manifest_url", "")
+    viewer_url = card.get("viewer_url", "")
 
     row = {
         "identifier": identifier,
@@ -239,27 +198,20 @@ def scrape_card(
     return row
 
 
-def download_image(
+async def download_image(
     identifier: str,
     image_url: str,
     out_dir: Path,
-    session: requests.Session,
-    timeout: float,
+    fetcher: Fetcher,
     overwrite: bool = False,
 ) -> Optional[Path]:
     out_dir.mkdir(parents=True, exist_ok=True)
     dest = out_dir / f"{identifier}.jpg"
-    if dest.exists() and not overwrite:
-        return dest
-    resp = session.get(image_url, timeout=timeout)
-    resp.raise_for_status()
-    if not resp.headers.get("content-type", "").startswith("image"):
-        print(
-            f"[warn] {identifier}: unexpected content-type {resp.headers.get('content-type')}",
-            file=sys.stderr,
-        )
+    try:
+        await fetcher.download(image_url, dest, overwrite=overwrite)
+    except ValueError as exc:
+        print(f"[warn] {identifier}: {exc}", file=sys.stderr)
         return None
-    dest.write_bytes(resp.content)
     return dest
 
 
@@ -303,23 +255,23 @@ def write_caption(identifier: str, caption_dir: Path, text: str) -> Path:
     return caption_path
 
 
-def process_identifier(
+async def process_identifier(
     identifier: str,
     args: argparse.Namespace,
+    fetcher: Fetcher,
     image_dir: Optional[Path],
     captions_dir: Optional[Path],
+    known: Optional[Dict[str, str]] = None,
 ) -> Dict[str, str]:
-    session = get_thread_session(args.user_agent)
-    row = scrape_card(identifier, session, args.timeout)
+    row = dict(known) if known is not None else await scrape_card(identifier, fetcher)
 
     image_path_str = ""
     if image_dir:
-        saved = download_image(
+        saved = await download_image(
             identifier,
             row["image_url"],
             image_dir,
-            session,
-            args.timeout,
+            fetcher,
             overwrite=args.overwrite_images,
         )
         if saved:
@@ -335,10 +287,35 @@ def process_identifier(
         write_caption(identifier, captions_dir, caption_text)
 
     row["image_path"] = image_path_str
-    time.sleep(args.sleep)
     return row
 
 
+async def scrape_all(
+    pending: Sequence[str],
+    args: argparse.Namespace,
+    image_dir: Optional[Path],
+    captions_dir: Optional[Path],
+    known: Optional[Dict[str, Dict[str, str]]] = None,
+) -> List[Dict[str, str]]:
+    rows: List[Dict[str, str]] = []
+    total = len(pending)
+    known = known or {}
+
+    async def one(identifier: str) -> None:
+        try:
+            row = await process_identifier(identifier, args, fetcher, image_dir, captions_dir, known.get(identifier))
+        except Exception as exc:  # noqa: BLE001
+            print(f"[error] {identifier}: {exc}", file=sys.stderr)
+            return
+        rows.append(row)
+        print(f"[ok] {identifier} ({len(rows)}/{total}) subjects='{row['subjects']}'")
+
+    async with Fetcher(config_from_args(args)) as fetcher:
+        await asyncio.gather(*(one(identifier) for identifier in pending))
+        print(f"[info] {fetcher.summary()}")
+    return rows
+
+
 def main() -> None:
     args = parse_args()
     identifiers = gather_identifiers(args)
@@ -363,27 +340,19 @@ def main() -> None:
         write_rows(processed_rows, out_path)
         return
 
-    max_workers = max(1, args.max_workers)
-    print(f"[info] Processing {total} identifiers with up to {max_workers} workers ...")
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_map = {
-            executor.submit(process_identifier, identifier, args, image_dir, captions_dir): identifier
-            for identifier in pending
-        }
-
-        completed = 0
-        for future in as_completed(future_map):
-            identifier = future_map[future]
-            try:
-                row = future.result()
-            except Exception as exc:  # noqa: BLE001
-                print(f"[error] {identifier}: {exc}", file=sys.stderr)
-                continue
-            processed_rows.append(row)
-            seen.add(identifier)
-            completed += 1
-            print(f"[ok] {identifier} ({completed}/{total}) subjects='{row['subjects']}'")
+    known: Dict[str, Dict[str, str]] = {}
+    if args.input_csv and not args.refetch:
+        known = load_card_records(Path(args.input_csv))
+        reused = sum(1 for identifier in pending if identifier in known)
+        if reused:
+            print(f"[info] {reused} card records taken from {args.input_csv} without fetching")
+
+    max_workers = max(1, args.concurrency)
+    print(f"[info] Processing {total} identifiers with up to {max_workers} requests in flight ...")
+
+    for row in asyncio.run(scrape_all(pending, args, image_dir, captions_dir, known)):
+        processed_rows.append(row)
+        seen.add(row["identifier"])
 
     if not processed_rows:
         print("[warn] No rows scraped.")
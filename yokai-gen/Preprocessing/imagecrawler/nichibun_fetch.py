@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared async fetch engine for the Nichibun crawlers
+---------------------------------------------------
+- One pooled keep-alive httpx.AsyncClient per crawl
+- Token-bucket rate limit per host (requests/second with a small burst) instead of fixed sleeps
+- Bounded concurrency; retries with jittered exponential backoff on timeouts, 429 and 5xx
+- On-disk HTTP cache (gzip bodies + ETag/Last-Modified): fresh entries cost no request,
+  stale ones are revalidated with If-None-Match/If-Modified-Since, --offline never
+  touches the network; entries unused for --cache-max-age-days or past --cache-max-mb
+  (least recently used first) are evicted
+
+Usage:
+    config = FetchConfig(rate=3.0, concurrency=4)
+    async with Fetcher(config) as fetcher:
+        html_text = await fetcher.get_text(CARD_URL, params={"identifier": ident})
+
+Politeness is set by --rate: total wall time is roughly requests / rate, no
+matter how high --concurrency is. Concurrency only hides network latency.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; NichibunCrawler/1.0)"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# The site serves a mix of UTF-8 and Shift_JIS pages without a charset header.
+HTML_ENCODINGS = ("utf-8", "cp932", "euc-jp")
+DEFAULT_CACHE_DIR = Path("data") / "cache" / "http"
+CACHED_HEADERS = ("content-type", "etag", "last-modified")
+
+
+@dataclass
+class FetchConfig:
+    rate: float = 1 / 0.3  # requests per second per host; <= 0 disables the limit
+    burst: float = 1.0
+    concurrency: int = 4
+    retries: int = 3
+    backoff: float = 1.0  # first retry delay in seconds, doubled per attempt
+    max_backoff: float = 30.0
+    timeout: float = 15.0
+    user_agent: str = DEFAULT_USER_AGENT
+    cache_dir: Optional[Path] = None  # None disables the HTTP cache
+    cache_ttl: float = 86400.0  # seconds an entry is served without revalidation
+    cache_max_bytes: int = 512 * 1024 * 1024
+    cache_max_age: float = 30 * 86400.0  # entries unused this long are evicted
+    offline: bool = False
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode for a URL that is not in the cache."""
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    headers: Dict[str, str]
+    stored_at: float
+    body: bytes
+
+    def response(self) -> httpx.Response:
+        return httpx.Response(200, headers=self.headers, content=self.body, request=httpx.Request("GET", self.url))
+
+    def validators(self) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+
+class HttpCache:
+    """GET responses on disk: ``<sha256(url)>.json`` (URL, headers, time) beside a gzipped ``.gz`` body.
+
+    The body file's mtime is the last use, which drives eviction.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, max_age: float) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._index: Dict[str, Tuple[float, int]] = {}  # key -> (last used, bytes on disk)
+        self._total = 0
+        directory.mkdir(parents=True, exist_ok=True)
+        for body in directory.glob("*/*.gz"):
+            meta = body.with_suffix(".json")
+            try:
+                stat = body.stat()
+                size = stat.st_size + meta.stat().st_size
+            except OSError:
+                continue
+            self._index[body.stem] = (stat.st_mtime, size)
+            self._total += size
+        self.prune()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        base = self.directory / key[:2] / key
+        return base.with_suffix(".json"), base.with_suffix(".gz")
+
+    def load(self, url: str) -> Optional[CacheEntry]:
+        key = self.key(url)
+        if key not in self._index:
+            return None
+        meta_path, body_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            body = gzip.decompress(body_path.read_bytes())
+        except (OSError, ValueError, EOFError):
+            self._remove(key)
+            return None
+        return CacheEntry(url=meta["url"], headers=meta["headers"], stored_at=meta["stored_at"], body=body)
+
+    def store(self, url: str, resp: httpx.Response) -> None:
+        headers = {name: resp.headers[name] for name in CACHED_HEADERS if name in resp.headers}
+        self._write(url, CacheEntry(str(resp.url), headers, time.time(), resp.content))
+
+    def refresh(self, url: str, entry: CacheEntry, resp: httpx.Response) -> CacheEntry:
+        """After a 304: restart the TTL and take over any updated validators."""
+        for name in CACHED_HEADERS:
+            if name in resp.headers and name != "content-type":
+                entry.headers[name] = resp.headers[name]
+        entry.stored_at = time.time()
+        self._write(url, entry)
+        return entry
+
+    def touch(self, url: str) -> None:
+        key = self.key(url)
+        if key not in self._index:
+            return
+        now = time.time()
+        try:
+            os.utime(self._paths(key)[1], (now, now))
+        except OSError:
+            return
+        self._index[key] = (now, self._index[key][1])
+
+    def _write(self, url: str, entry: CacheEntry) -> None:
+        key = self.key(url)
+        meta_path, body_path = self._paths(key)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = json.dumps({"url": entry.url, "headers": entry.headers, "stored_at": entry.stored_at}, ensure_ascii=False)
+        body = gzip.compress(entry.body, compresslevel=6)
+        # Write-then-rename so a crash never leaves a truncated entry behind.
+        for path, data in ((body_path, body), (meta_path, meta.encode("utf-8"))):
+            tmp = path.with_suffix(path.suffix + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        _, old_size = self._index.get(key, (0.0, 0))
+        size = len(body) + len(meta.encode("utf-8"))
+        self._index[key] = (time.time(), size)
+        self._total += size - old_size
+        if self._total > self.max_bytes:
+            self.prune()
+
+    def _remove(self, key: str) -> None:
+        for path in self._paths(key):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+        _, size = self._index.pop(key, (0.0, 0))
+        self._total -= size
+
+    def prune(self) -> None:
+        """Evict entries unused for ``max_age``, then least recently used ones down to 90% of ``max_bytes``."""
+        cutoff = time.time() - self.max_age
+        for key, (used, _size) in list(self._index.items()):
+            if used < cutoff:
+                self._remove(key)
+        if self._total <= self.max_bytes:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][0]):
+            if self._total <= self.max_bytes * 0.9:
+                break
+            self._remove(key)
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, at most ``burst`` back to back."""
+
+    def __init__(self, rate: float, burst: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # Waiters queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back the next acquisition for ``seconds`` (e.g. a server's Retry-After)."""
+        if self.rate <= 0 or seconds <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
+
+
+def retry_after_seconds(resp: httpx.Response) -> Optional[float]:
+    value = resp.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def decode_html(resp: httpx.Response) -> str:
+    """Body as text: the declared charset if any, else the first encoding that decodes cleanly."""
+    if resp.charset_encoding:
+        return resp.text
+    data = resp.content
+    for enc in HTML_ENCODINGS:
+        try:
+            return data.decode(enc)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+class Fetcher:
+    """Rate-limited, retrying GETs over one connection pool; use as ``async with``."""
+
+    def __init__(self, config: Optional[FetchConfig] = None, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self.config = config or FetchConfig()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._slots = asyncio.Semaphore(max(1, self.config.concurrency))
+        self.cache: Optional[HttpCache] = None
+        if self.config.cache_dir is not None:
+            self.cache = HttpCache(self.config.cache_dir, self.config.cache_max_bytes, self.config.cache_max_age)
+        self.requests = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.not_modified = 0
+
+    async def __aenter__(self) -> "Fetcher":
+        slots = max(1, self.config.concurrency)
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": self.config.user_agent},
+            timeout=self.config.timeout,
+            limits=httpx.Limits(max_connections=slots, max_keepalive_connections=slots),
+            follow_redirects=True,
+            transport=self._transport,
+        )
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlparse(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.config.rate, self.config.burst)
+        return bucket
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.config.max_backoff, self.config.backoff * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.5)
+
+    async def get(
+        self,
+        url: str,
+        params: Optional[Mapping[str, Any]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        cache: bool = True,
+    ) -> httpx.Response:
+        """GET ``url`` through the cache (unless ``cache=False``).
+
+        Retries timeouts, connection errors, 429 and 5xx, and raises on anything
+        else >= 400. A 304 is returned as is when the caller sent its own
+        validators; for cached URLs it turns into the cached 200.
+        """
+        full_url = str(httpx.URL(url, params=params)) if params else url
+        entry = self.cache.load(full_url) if cache and self.cache is not None else None
+        if entry is not None and (self.config.offline or time.time() - entry.stored_at < self.config.cache_ttl):
+            self.cache_hits += 1
+            self.cache.touch(full_url)
+            return entry.response()
+        if self.config.offline:
+            raise CacheMiss(f"not cached (offline): {full_url}")
+        send_headers = dict(headers or {})
+        if entry is not None:
+            send_headers.update(entry.validators())
+        resp = await self._send(full_url, send_headers)
+        if resp.status_code == 304:
+            self.not_modified += 1
+            if entry is not None:
+                return self.cache.refresh(full_url, entry, resp).response()
+            return resp
+        if cache and self.cache is not None and resp.status_code == 200:
+            self.cache.store(full_url, resp)
+        return resp
+
+    async def _send(self, url: str, headers: Mapping[str, str]) -> httpx.Response:
+        if self._client is None:
+            raise RuntimeError("Fetcher must be used as 'async with Fetcher(...)'")
+        bucket = self.bucket(url)
+        attempt = 0
+        while True:
+            error: Optional[Exception] = None
+            resp: Optional[httpx.Response] = None
+            async with self._slots:
+                await bucket.acquire()
+                self.requests += 1
+                try:
+                    resp = await self._client.get(url, headers=headers)
+                except httpx.TransportError as exc:
+                    error = exc
+            if resp is not None and resp.status_code not in RETRY_STATUS:
+                if resp.status_code != 304:
+                    resp.raise_for_status()
+                return resp
+            if attempt >= self.config.retries:
+                if resp is not None:
+                    resp.raise_for_status()
+                assert error is not None
+                raise error
+            delay = self._backoff(attempt)
+            if resp is not None:
+                hint = retry_after_seconds(resp)
+                if hint is not None:
+                    delay = max(delay, min(hint, self.config.max_backoff))
+                    bucket.pause(delay)
+                reason = f"HTTP {resp.status_code}"
+            else:
+                reason = type(error).__name__
+            print(f"[retry] {url} ({reason}); retry {attempt + 1} in {delay:.1f}s", file=sys.stderr)
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get_text(self, url: str, params: Optional[Mapping[str, Any]] = None) -> str:
+        return decode_html(await self.get(url, params=params))
+
+    async def download(self, url: str, dest: Path, overwrite: bool = False, content_type: str = "image") -> bool:
+        """Save ``url`` to ``dest``; False if ``dest`` already held the current file.
+
+        Downloads bypass the HTTP cache (the file itself is the cache). With
+        ``overwrite`` an existing file is revalidated by its mtime
+        (If-Modified-Since), which is set from the server's Last-Modified.
+        Raises ``ValueError`` when the Content-Type does not start with ``content_type``.
+        """
+        exists = dest.exists()
+        if exists and not overwrite:
+            return False
+        if self.config.offline:
+            raise CacheMiss(f"cannot download while offline: {url}")
+        headers = {"If-Modified-Since": formatdate(dest.stat().st_mtime, usegmt=True)} if exists else {}
+        resp = await self.get(url, headers=headers, cache=False)
+        if resp.status_code == 304:
+            return False
+        if content_type and not resp.headers.get("content-type", "").startswith(content_type):
+            raise ValueError(f"unexpected content-type {resp.headers.get('content-type')}")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_suffix(dest.suffix + ".part")
+        tmp.write_bytes(resp.content)
+        os.replace(tmp, dest)
+        modified = resp.headers.get("last-modified")
+        if modified:
+            try:
+                stamp = parsedate_to_datetime(modified).timestamp()
+                os.utime(dest, (stamp, stamp))
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return True
+
+    def summary(self) -> str:
+        return (
+            f"{self.requests} HTTP requests ({self.retries} retries), "
+            f"{self.cache_hits} served from cache, {self.not_modified} not modified"
+        )
+
+
+def add_fetch_arguments(
+    ap: argparse.ArgumentParser,
+    user_agent: str = DEFAULT_USER_AGENT,
+    concurrency: int = 4,
+    concurrency_flags: Sequence[str] = ("--concurrency",),
+) -> None:
+    """The politeness/network options every crawler shares."""
+    ap.add_argument("--rate", type=float, default=None, help="Max requests per second per host (default: 1 / --sleep)")
+    ap.add_argument("--burst", type=float, default=1.0, help="Requests allowed back to back before --rate applies (default: 1)")
+    ap.add_argument("--sleep", type=float, default=0.3, help="Legacy pacing: without --rate, one request per SLEEP seconds per host (default: 0.3)")
+    ap.add_argument(*concurrency_flags, dest="concurrency", type=int, default=concurrency, help=f"Max requests in flight (default: {concurrency})")
+    ap.add_argument("--retries", type=int, default=3, help="Retries on timeouts, 429 and 5xx (default: 3)")
+    ap.add_argument("--timeout", type=float, default=15.0, help="HTTP timeout seconds (default: 15)")
+    ap.add_argument("--user-agent", default=user_agent, help="Custom User-Agent header")
+    ap.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"On-disk HTTP cache (default: {DEFAULT_CACHE_DIR})")
+    ap.add_argument("--no-cache", action="store_true", help="Do not read or write the HTTP cache")
+    ap.add_argument("--cache-ttl", type=float, default=24.0, help="Hours a cached page is used without revalidation; 0 always revalidates (default: 24)")
+    ap.add_argument("--cache-max-mb", type=float, default=512.0, help="Evict least recently used pages beyond this size (default: 512)")
+    ap.add_argument("--cache-max-age-days", type=float, default=30.0, help="Evict pages unused for this many days (default: 30)")
+    ap.add_argument("--offline", action="store_true", help="Serve from the cache only; uncached URLs fail without a request")
+
+
+def config_from_args(args: argparse.Namespace) -> FetchConfig:
+    rate = args.rate
+    if rate is None:
+        rate = 1.0 / args.sleep if args.sleep > 0 else 0.0
+    return FetchConfig(
+        rate=rate,
+        burst=args.burst,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        timeout=args.timeout,
+        user_agent=args.user_agent,
+        cache_dir=None if args.no_cache or not args.cache_dir else Path(args.cache_dir),
+        cache_ttl=args.cache_ttl * 3600.0,
+        cache_max_bytes=int(args.cache_max_mb * 1024 * 1024),
+        cache_max_age=args.cache_max_age_days * 86400.0,
+        offline=args.offline,
+    )
@@ -5,21 +5,36 @@ Nichibun YoukaiGazou identifier crawler (brute force)
 ----------------------------------------------------
 - Generates candidate identifiers like U{AAA}_nichibunken_{BBBB}_{CCCC}_{DDDD}
 - Fetches the corresponding card.cgi page to confirm existence
-- Writes metadata for the hits (title, author, etc.) and optionally downloads images
+- Writes full card records for the hits (metadata plus image/IIIF/viewer links, from one
+  strained parse of the page already fetched) and optionally downloads images
+- --strategy adaptive (default): walks each BBBB from priors (bbbb_ranges.json,
+  discovered_ranges.json), skips BBBB listed in missing_bbbb.txt, probes DDDD=0 per
+  CCCC first (DDDD>0 under a hit, and inside a prior's CCCC range also when DDDD=0 is
+  missing), stops after --cccc-gap empty CCCC and gallops ahead for later ranges
+- --strategy grid: the full AAA x BBBB x CCCC x DDDD product, cut only by --max-miss-per-cccc
+- Every probe (hit/miss/error, HTTP code, time) is committed to a SQLite log and hits are
+  appended to the output CSV as they arrive, so a rerun resumes where the last one stopped
+  and never repeats a request that already has an answer
+- BBBB values (adaptive) or (BBBB, CCCC) groups (grid) are probed concurrently through
+  `nichibun_fetch`; probes within one stay sequential because each depends on the last
 """
 
 import argparse
+import asyncio
 import csv
 import json
 import sys
-import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+from urllib.parse import urljoin
 
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
+import httpx
+
+from nichibun_fetch import Fetcher, add_fetch_arguments, config_from_args
+from nichibun_probe_store import ERROR, HIT, MISS, ProbeStore
 from nichibun_theme_crawler import download_images as download_images_helper
 
 CARD_URL = "https://www.nichibun.ac.jp/cgi-bin/YoukaiGazou/card.cgi"
@@ -30,6 +45,43 @@ CONFIG_DIR = DATA_DIR / "config"
 DERIVED_DIR = DATA_DIR / "derived"
 OUTPUT_DIR = DATA_DIR / "outputs"
 
+try:
+    import lxml  # noqa: F401
+
+    HTML_PARSER = "lxml"
+except ImportError:  # pragma: no cover - falls back to the slower stdlib parser
+    HTML_PARSER = "html.parser"
+
+# A card page only matters for its metadata table, the image and the IIIF links;
+# everything else is dropped while parsing instead of being built into the tree.
+CARD_STRAINER = SoupStrainer(["table", "a", "img"])
+
+CSV_FIELDS = [
+    "identifier",
+    "aaa",
+    "bbbb",
+    "cccc",
+    "dddd",
+    "title",
+    "creator",
+    "subjects",
+    "description",
+    "publisher",
+    "contributor",
+    "date",
+    "resource_type",
+    "format",
+    "language",
+    "source",
+    "relation",
+    "coverage",
+    "rights",
+    "card_url",
+    "image_url",
+    "manifest_url",
+    "viewer_url",
+]
+
 LABEL_MAP = {
     "タイトル": "title",
     "著作者": "creator",
@@ -159,16 +211,21 @@ def generate_identifiers(
                     yield IdentifierParts(aaa=aaa, bbbb=bbbb, cccc=cccc, dddd=dddd)
 
 
-def fetch_card(identifier: str, session: requests.Session, timeout: float) -> Tuple[bool, str]:
-    resp = session.get(CARD_URL, params={"identifier": identifier}, timeout=timeout)
-    resp.raise_for_status()
-    html = resp.text
+def group_candidates(candidates: Iterable[IdentifierParts]) -> List[List[IdentifierParts]]:
+    """Split candidates into (AAA, BBBB, CCCC) groups, keeping first-seen group order and DDDD order."""
+    groups: Dict[Tuple[int, int, int], List[IdentifierParts]] = {}
+    for parts in candidates:
+        groups.setdefault((parts.aaa, parts.bbbb, parts.cccc), []).append(parts)
+    return list(groups.values())
+
+
+async def fetch_card(identifier: str, fetcher: Fetcher) -> Tuple[bool, str]:
+    html = await fetcher.get_text(CARD_URL, params={"identifier": identifier})
     exists = identifier in html
     return exists, html
 
 
-def parse_card_metadata(html: str) -> Dict[str, str]:
-    soup = BeautifulSoup(html, "html.parser")
+def card_metadata(soup: BeautifulSoup) -> Dict[str, str]:
     table = soup.select_one("table.dataTable")
     data: Dict[str, str] = {}
     if not table:
@@ -186,69 +243,388 @@ def parse_card_metadata(html: str) -> Dict[str, str]:
     return data
 
 
-def write_csv(rows: Sequence[Dict[str, str]], out_path: Path) -> None:
-    if not rows:
-        print("[warn] No identifiers discovered; CSV not written.")
-        return
-    fieldnames = [
-        "identifier",
-        "aaa",
-        "bbbb",
-        "cccc",
-        "dddd",
-        "title",
-        "creator",
-        "subjects",
-        "description",
-        "publisher",
-        "contributor",
-        "date",
-        "resource_type",
-        "format",
-        "language",
-        "source",
-        "relation",
-        "coverage",
-        "rights",
-        "card_url",
-        "image_url",
-    ]
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+def card_media_links(soup: BeautifulSoup, base_url: str) -> Dict[str, str]:
+    """The main JPEG (``image_url_html``), IIIF manifest and viewer links of a card page."""
+    media: Dict[str, str] = {}
+
+    img_tag = soup.select_one('td img[src*="YoukaiGazou/image/"]')
+    if img_tag:
+        src = img_tag.get("src")
+        if src:
+            media["image_url_html"] = urljoin(base_url, src)
+
+    for a_tag in soup.find_all("a", href=True):
+        href = a_tag["href"]
+        abs_href = urljoin(base_url, href)
+        if "IIIF/manifest" in href and "manifest_url" not in media:
+            media["manifest_url"] = abs_href
+        if "iiif-viewer" in href and "viewer_url" not in media:
+            media["viewer_url"] = abs_href
+
+    return media
+
+
+def parse_card(html: str, base_url: str = CARD_URL) -> Dict[str, str]:
+    """Metadata (LABEL_MAP keys) and media links from a single strained parse of a card page."""
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=CARD_STRAINER)
+    data = card_metadata(soup)
+    data.update(card_media_links(soup, base_url))
+    return data
+
+
+def build_row(parts: IdentifierParts, meta: Dict[str, str]) -> Dict[str, str]:
+    identifier = parts.id_str
+    return {
+        "identifier": identifier,
+        "aaa": str(parts.aaa),
+        "bbbb": f"{parts.bbbb:04d}",
+        "cccc": f"{parts.cccc:04d}",
+        "dddd": f"{parts.dddd:04d}",
+        "title": meta.get("title", ""),
+        "creator": meta.get("creator", ""),
+        "subjects": meta.get("subjects", ""),
+        "description": meta.get("description", ""),
+        "publisher": meta.get("publisher", ""),
+        "contributor": meta.get("contributor", ""),
+        "date": meta.get("date", ""),
+        "resource_type": meta.get("resource_type", ""),
+        "format": meta.get("format", ""),
+        "language": meta.get("language", ""),
+        "source": meta.get("source", ""),
+        "relation": meta.get("relation", ""),
+        "coverage": meta.get("coverage", ""),
+        "rights": meta.get("rights", ""),
+        "card_url": f"{CARD_URL}?identifier={identifier}",
+        "image_url": meta.get("image_url_html") or IMAGE_BASE + f"{identifier}.jpg",
+        "manifest_url": meta.get("manifest_url", ""),
+        "viewer_url": meta.get("viewer_url", ""),
+    }
+
+
+def load_range_priors(paths: Sequence[str]) -> Dict[int, Dict[str, int]]:
+    """Merge BBBB -> {c_min,c_max,d_min,d_max} files (keys like "51" or "0051"); missing files are skipped."""
+    priors: Dict[int, Dict[str, int]] = {}
+    for path_str in paths:
+        path = Path(path_str)
+        if not path.exists():
+            continue
+        for key, info in load_range_log(path).items():
+            try:
+                bbbb = int(key)
+                c_min, c_max = int(info["c_min"]), int(info["c_max"])
+                d_min, d_max = int(info["d_min"]), int(info["d_max"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            merged = priors.setdefault(bbbb, {"c_min": c_min, "c_max": c_max, "d_min": d_min, "d_max": d_max})
+            merged["c_min"] = min(merged["c_min"], c_min)
+            merged["c_max"] = max(merged["c_max"], c_max)
+            merged["d_min"] = min(merged["d_min"], d_min)
+            merged["d_max"] = max(merged["d_max"], d_max)
+    return priors
+
+
+def upgrade_csv_header(out_path: Path, fieldnames: Sequence[str]) -> None:
+    """Rewrite a CSV from an older run so its header includes ``fieldnames`` (new columns left empty)."""
+    with out_path.open(encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        header = list(reader.fieldnames or [])
+        missing = [name for name in fieldnames if name not in header]
+        if not header or not missing:
+            return
+        rows = list(reader)
+    tmp = out_path.with_suffix(out_path.suffix + ".tmp")
+    with tmp.open("w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=header + missing)
         writer.writeheader()
         writer.writerows(rows)
-    print(f"[ok] Wrote {len(rows)} identifiers to {out_path}")
+    tmp.replace(out_path)
+    print(f"[info] added columns {', '.join(missing)} to {out_path}")
 
 
-def main() -> None:
-    ap = argparse.ArgumentParser(description="Brute-force Nichibun identifiers and fetch card metadata.")
-    ap.add_argument("--aaa", nargs="+", type=int, default=[426], help="AAA collection numbers (default: 426)")
-    ap.add_argument("--bbbb", nargs="*", type=int, help="Specific BBBB values to include (4-digit numbers)")
-    ap.add_argument("--bbbb-file", default=None, help="Path to text file with BBBB integers (whitespace/newline separated)")
-    ap.add_argument("--bbbb-range", nargs=2, type=int, metavar=("MIN", "MAX"), help="Inclusive BBBB range")
-    ap.add_argument("--bbbb-priority-file", default=None, help="Text file listing BBBB values to prioritize")
-    ap.add_argument("--cccc-range", nargs=2, type=int, default=[1, 40], metavar=("MIN", "MAX"), help="Inclusive CCCC range (default: 1 40)")
-    ap.add_argument("--dddd-range", nargs=2, type=int, default=[0, 20], metavar=("MIN", "MAX"), help="Inclusive DDDD range (default: 0 20)")
-    ap.add_argument("--ranges-json", default=None, help="JSON mapping BBBB -> {c_min,c_max,d_min,d_max}")
-    ap.add_argument("--cccc-margin", type=int, default=2, help="Margin applied to JSON CCCC ranges (default: 2)")
-    ap.add_argument("--dddd-margin", type=int, default=1, help="Margin applied to JSON DDDD ranges (default: 1)")
-    ap.add_argument("--skip-csv", nargs="*", default=[], help="CSV file(s) with an identifier column to skip (e.g., existing datasets)")
-    ap.add_argument("--out", default=str(OUTPUT_DIR / "nichibun_cards.csv"), help="Output CSV path for discovered identifiers")
-    ap.add_argument("--range-log", default=str(DERIVED_DIR / "discovered_ranges.json"), help="Path to append discovered (BBBB, ranges)")
-    ap.add_argument("--max-found", type=int, default=None, help="Stop after discovering this many identifiers")
-    ap.add_argument("--max-candidates", type=int, default=None, help="Hard cap on total candidates processed")
-    ap.add_argument("--sleep", type=float, default=0.3, help="Delay between requests (seconds)")
-    ap.add_argument("--timeout", type=float, default=15.0, help="HTTP timeout seconds")
-    ap.add_argument("--user-agent", default="Mozilla/5.0 (compatible; NichibunIdentifierCrawler/1.0)", help="Custom User-Agent header")
-    ap.add_argument("--download-images", default=None, help="Directory to download discovered images (optional)")
-    ap.add_argument("--overwrite-images", action="store_true", help="Overwrite existing images when downloading")
-    ap.add_argument("--max-miss-per-cccc", type=int, default=1, help="Max consecutive misses per (BBBB, CCCC) before skipping remaining DDDD (default: 1)")
-    args = ap.parse_args()
+class CsvAppender:
+    """Appends discovered rows to the output CSV, flushed per row; existing rows are kept."""
 
-    file_bbbb = load_ints_from_file(args.bbbb_file)
-    priority_bbbb = load_ints_from_file(args.bbbb_priority_file)
+    def __init__(self, out_path: Path) -> None:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        fresh = not out_path.exists() or out_path.stat().st_size == 0
+        if not fresh:
+            upgrade_csv_header(out_path, CSV_FIELDS)
+            with out_path.open(encoding="utf-8-sig", newline="") as f:
+                fieldnames = next(csv.reader(f), None) or CSV_FIELDS
+        else:
+            fieldnames = CSV_FIELDS
+        # Only a new file gets the BOM (and header); appending one mid-file would corrupt it.
+        self._fh = out_path.open("a", newline="", encoding="utf-8-sig" if fresh else "utf-8")
+        self._writer = csv.DictWriter(self._fh, fieldnames=fieldnames, extrasaction="ignore")
+        if fresh:
+            self._writer.writeheader()
+            self._fh.flush()
+        self.path = out_path
+
+    def write(self, row: Dict[str, str]) -> None:
+        self._writer.writerow(row)
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class CrawlState:
+    """Hits, misses and limits shared by every probing coroutine of one run.
+
+    Each answer is written through to ``store`` and each new hit to ``out``
+    before the next probe, so nothing is lost when the run is interrupted.
+    """
+
+    def __init__(
+        self,
+        skip: Set[str],
+        range_log: Dict[str, Dict[str, int]],
+        misses: Set[str],
+        store: Optional[ProbeStore] = None,
+        out: Optional[CsvAppender] = None,
+        max_found: Optional[int] = None,
+        max_probes: Optional[int] = None,
+    ) -> None:
+        self.discovered: List[Dict[str, str]] = []
+        self.skip = skip
+        self.range_log = range_log
+        self.misses = misses
+        self.store = store
+        self.out = out
+        self.max_found = max_found
+        self.max_probes = max_probes
+        self.probes = 0
+
+    def should_stop(self) -> bool:
+        if self.max_found is not None and len(self.discovered) >= self.max_found:
+            return True
+        return self.max_probes is not None and self.probes >= self.max_probes
+
+    def record_hit(self, parts: IdentifierParts, html: str) -> None:
+        # A paid-for answer is always kept, even one that lands after --max-found or
+        # --max-candidates was reached while it was in flight; the limits only stop new probes.
+        if parts.id_str in self.skip:
+            return
+        row = build_row(parts, parse_card(html))
+        if self.out is not None:
+            self.out.write(row)
+        if self.store is not None:
+            self.store.record(parts.id_str, HIT, 200)
+        self.discovered.append(row)
+        self.skip.add(parts.id_str)
+        update_range_log(self.range_log, parts)
+        print(f"[ok] {parts.id_str} (total found: {len(self.discovered)})")
+
+    def record_miss(self, parts: IdentifierParts) -> None:
+        self.misses.add(parts.id_str)
+        if self.store is not None:
+            self.store.record(parts.id_str, MISS, 200)
+
+    def record_error(self, parts: IdentifierParts, http_status: Optional[int]) -> None:
+        # Errors are logged but not remembered as answers, so the next run retries them.
+        if self.store is not None:
+            self.store.record(parts.id_str, ERROR, http_status)
+
+
+async def probe(parts: IdentifierParts, fetcher: Fetcher, state: CrawlState) -> Optional[bool]:
+    """True/False for hit/miss (known ones cost no request); None on errors or once the run should stop."""
+    identifier = parts.id_str
+    if identifier in state.skip:
+        return True
+    if identifier in state.misses:
+        return False
+    if state.should_stop():
+        return None
+    state.probes += 1
+    try:
+        exists, html = await fetch_card(identifier, fetcher)
+    except Exception as exc:  # pragma: no cover - network dependent
+        print(f"[error] {identifier}: {exc}", file=sys.stderr)
+        state.record_error(parts, exc.response.status_code if isinstance(exc, httpx.HTTPStatusError) else None)
+        return None
+    if exists:
+        state.record_hit(parts, html)
+    else:
+        state.record_miss(parts)
+        print(f"[miss] {identifier}")
+    return exists
+
+
+async def probe_group(group: Sequence[IdentifierParts], fetcher: Fetcher, state: CrawlState, max_miss: int) -> None:
+    """Grid strategy: probe one (BBBB, CCCC) group in DDDD order, giving up after ``max_miss`` consecutive misses."""
+    miss_streak = 0
+    for parts in group:
+        if state.should_stop():
+            return
+        found = await probe(parts, fetcher, state)
+        if found is None:
+            continue
+        if found:
+            miss_streak = 0
+            continue
+        miss_streak += 1
+        if miss_streak >= max_miss:
+            print(f"[skip] stopping DDDD search at BBBB={parts.bbbb:04d} CCCC={parts.cccc:04d} after {miss_streak} misses")
+            return
 
+
+@dataclass(frozen=True)
+class BbbbPlan:
+    aaa: int
+    bbbb: int
+    prior: Optional[Dict[str, int]] = None
+
+
+async def scan_dddd(
+    aaa: int,
+    bbbb: int,
+    cccc: int,
+    d_limit: int,
+    fetcher: Fetcher,
+    state: CrawlState,
+    max_miss: int,
+    d_until: int = 0,
+) -> bool:
+    """Walk DDDD upward from 1 until ``max_miss`` consecutive misses at or past ``d_until``; True if anything hit."""
+    misses, any_hit = 0, False
+    for dddd in range(1, d_limit + 1):
+        found = await probe(IdentifierParts(aaa, bbbb, cccc, dddd), fetcher, state)
+        if found is None and state.should_stop():
+            break
+        any_hit = any_hit or bool(found)
+        misses = 0 if found else misses + 1
+        if misses >= max_miss and dddd >= d_until:
+            break
+    return any_hit
+
+
+async def gallop(
+    aaa: int,
+    bbbb: int,
+    last_miss: int,
+    stride: int,
+    c_limit: int,
+    fetcher: Fetcher,
+    state: CrawlState,
+) -> Optional[int]:
+    """Probe DDDD=0 at last_miss + stride, +2*stride, +4*stride ... and return the first CCCC of the next range.
+
+    The doubling jumps over long dead stretches in O(log n) probes; once one
+    lands on a hit, a binary search between it and the last miss finds where
+    that range starts. Ranges shorter than the current stride can be skipped.
+    """
+    lo, step = last_miss, max(1, stride)
+    while True:
+        hi = lo + step
+        if hi > c_limit or state.should_stop():
+            return None
+        if await probe(IdentifierParts(aaa, bbbb, hi, 0), fetcher, state):
+            break
+        lo, step = hi, step * 2
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if await probe(IdentifierParts(aaa, bbbb, mid, 0), fetcher, state):
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+
+async def scan_bbbb(plan: BbbbPlan, fetcher: Fetcher, state: CrawlState, args: argparse.Namespace) -> None:
+    """Adaptive strategy for one BBBB: DDDD=0 per CCCC first, DDDD>0 under a hit or inside the prior's CCCC range."""
+    aaa, bbbb, prior = plan.aaa, plan.bbbb, plan.prior
+    c_floor = args.cccc_range[0]
+    gap = max(1, args.cccc_gap)
+    known_max = prior["c_max"] if prior else c_floor - 1
+    c_limit = max(args.cccc_range[1], known_max + gap)
+    d_limit = max(args.dddd_range[1], prior["d_max"] if prior else 0)
+
+    async def visit(cccc: int) -> Optional[bool]:
+        found = await probe(IdentifierParts(aaa, bbbb, cccc, 0), fetcher, state)
+        if found:
+            await scan_dddd(aaa, bbbb, cccc, d_limit, fetcher, state, args.max_miss_per_cccc)
+        elif found is False and prior and prior["c_min"] <= cccc <= prior["c_max"]:
+            # Some groups have no DDDD=0 card (e.g. 0349/0001 is DDDD 1-22), so inside a
+            # known range look at DDDD>0 too, at least up to the prior's d_min.
+            found = await scan_dddd(aaa, bbbb, cccc, d_limit, fetcher, state, args.max_miss_per_cccc, prior["d_min"])
+        return found
+
+    start = max(c_floor, prior["c_min"]) if prior else c_floor
+    # Priors come from partial crawls, so look a little below the known range too.
+    misses, cccc = 0, start - 1
+    while cccc >= c_floor and misses < gap and not state.should_stop():
+        misses = 0 if await visit(cccc) else misses + 1
+        cccc -= 1
+
+    misses, cccc = 0, start
+    while cccc <= c_limit and not state.should_stop():
+        misses = 0 if await visit(cccc) else misses + 1
+        # Inside the known range every CCCC is tried; past it, `gap` misses end the linear walk.
+        if misses >= gap and cccc >= known_max:
+            nxt = await gallop(aaa, bbbb, cccc, gap, c_limit, fetcher, state)
+            if nxt is None:
+                break
+            print(f"[info] BBBB={bbbb:04d}: another range starts at CCCC={nxt:04d}")
+            misses, cccc = 0, nxt
+            continue
+        cccc += 1
+
+
+def plan_adaptive(
+    aaa_values: Sequence[int],
+    targets: Sequence[int],
+    priority: Sequence[int],
+    priors: Dict[int, Dict[str, int]],
+    missing: Set[int],
+) -> List[BbbbPlan]:
+    """Priority BBBB first; BBBB registered as missing are dropped unless a prior shows hits."""
+    order: List[int] = []
+    for bbbb in list(priority) + list(targets):
+        if bbbb in order or (bbbb in missing and bbbb not in priors):
+            continue
+        order.append(bbbb)
+    return [BbbbPlan(aaa, bbbb, priors.get(bbbb)) for aaa in aaa_values for bbbb in order]
+
+
+async def crawl(work: Sequence[object], args: argparse.Namespace, state: CrawlState) -> List[Dict[str, str]]:
+    """Run ``work`` (BbbbPlan items, or candidate groups for the grid strategy) on a shared worker pool."""
+    config = config_from_args(args)
+    # One shared iterator: workers take the next item in priority order.
+    pending = iter(work)
+    async with Fetcher(config) as fetcher:
+
+        async def worker() -> None:
+            for item in pending:
+                if state.should_stop():
+                    return
+                if isinstance(item, BbbbPlan):
+                    await scan_bbbb(item, fetcher, state, args)
+                else:
+                    await probe_group(item, fetcher, state, args.max_miss_per_cccc)
+
+        await asyncio.gather(*(worker() for _ in range(max(1, config.concurrency))))
+
+        found = len(state.discovered)
+        per_hit = f"{state.probes / found:.1f} probes per new identifier" if found else "no new identifiers"
+        print(f"[info] {state.probes} card probes, {found} new identifiers ({per_hit}); {fetcher.summary()}")
+
+        if args.download_images and state.discovered:
+            await download_images_helper(
+                state.discovered,
+                Path(args.download_images),
+                fetcher,
+                overwrite=args.overwrite_images,
+            )
+    return state.discovered
+
+
+def build_grid_tasks(
+    args: argparse.Namespace,
+    file_bbbb: Sequence[int],
+    priority_bbbb: Sequence[int],
+) -> List[Tuple[int, int, int, int, int]]:
+    """(BBBB, c_start, c_end, d_start, d_end) boxes for the grid strategy."""
     tasks: List[Tuple[int, int, int, int, int]] = []
     if args.ranges_json:
         ranges_data = json.loads(Path(args.ranges_json).read_text(encoding="utf-8"))
@@ -304,99 +680,89 @@ def main() -> None:
 
     if not tasks:
         raise SystemExit("No BBBB values specified. Provide --bbbb/--bbbb-file/--bbbb-range or --ranges-json.")
+    return tasks
 
-    identifier_iter = generate_identifiers(args.aaa, tasks)
-    skip = load_skip_identifiers(args.skip_csv + [args.out])
-    session = requests.Session()
-    session.headers.update({"User-Agent": args.user_agent})
 
-    discovered: List[Dict[str, str]] = []
-    attempts = 0
-    found = 0
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Brute-force Nichibun identifiers and fetch card metadata.")
+    ap.add_argument("--aaa", nargs="+", type=int, default=[426], help="AAA collection numbers (default: 426)")
+    ap.add_argument("--bbbb", nargs="*", type=int, help="Specific BBBB values to include (4-digit numbers)")
+    ap.add_argument("--bbbb-file", default=None, help="Path to text file with BBBB integers (whitespace/newline separated)")
+    ap.add_argument("--bbbb-range", nargs=2, type=int, metavar=("MIN", "MAX"), help="Inclusive BBBB range")
+    ap.add_argument("--bbbb-priority-file", default=None, help="Text file listing BBBB values to prioritize")
+    ap.add_argument("--cccc-range", nargs=2, type=int, default=[1, 40], metavar=("MIN", "MAX"), help="Inclusive CCCC range (default: 1 40)")
+    ap.add_argument("--dddd-range", nargs=2, type=int, default=[0, 20], metavar=("MIN", "MAX"), help="Inclusive DDDD range (default: 0 20)")
+    ap.add_argument("--ranges-json", default=None, help="JSON mapping BBBB -> {c_min,c_max,d_min,d_max}")
+    ap.add_argument("--cccc-margin", type=int, default=2, help="Margin applied to JSON CCCC ranges (default: 2)")
+    ap.add_argument("--dddd-margin", type=int, default=1, help="Margin applied to JSON DDDD ranges (default: 1)")
+    ap.add_argument("--skip-csv", nargs="*", default=[], help="CSV file(s) with an identifier column to skip (e.g., existing datasets)")
+    ap.add_argument("--out", default=str(OUTPUT_DIR / "nichibun_cards.csv"), help="Output CSV for discovered identifiers (appended to; rows already in it are skipped)")
+    ap.add_argument("--range-log", default=str(DERIVED_DIR / "discovered_ranges.json"), help="Path to append discovered (BBBB, ranges)")
+    ap.add_argument("--max-found", type=int, default=None, help="Stop after discovering this many identifiers")
+    ap.add_argument("--max-candidates", type=int, default=None, help="Hard cap on candidates (grid) or card requests (adaptive)")
+    ap.add_argument("--download-images", default=None, help="Directory to download discovered images (optional)")
+    ap.add_argument("--overwrite-images", action="store_true", help="Overwrite existing images when downloading")
+    ap.add_argument("--max-miss-per-cccc", type=int, default=1, help="Max consecutive misses per (BBBB, CCCC) before skipping remaining DDDD (default: 1)")
+    ap.add_argument("--strategy", choices=("adaptive", "grid"), default="adaptive", help="adaptive: prior-guided gap/galloping search (default); grid: full product")
+    ap.add_argument(
+        "--priors",
+        nargs="*",
+        default=[str(DERIVED_DIR / "bbbb_ranges.json"), str(DERIVED_DIR / "discovered_ranges.json")],
+        help="Range JSON files used as priors by --strategy adaptive (missing files are ignored)",
+    )
+    ap.add_argument("--missing-bbbb-file", default=str(CONFIG_DIR / "missing_bbbb.txt"), help="BBBB values known to be empty; skipped by --strategy adaptive")
+    ap.add_argument("--cccc-gap", type=int, default=3, help="Consecutive empty CCCC (DDDD=0 misses) before galloping ahead (default: 3)")
+    ap.add_argument("--state-db", default=str(DERIVED_DIR / "identifier_probes.sqlite3"), help="SQLite log of every probe; answered identifiers are skipped on resume")
+    ap.add_argument("--reprobe-misses", action="store_true", help="Probe logged misses again (hits are still skipped)")
+    add_fetch_arguments(ap, user_agent="Mozilla/5.0 (compatible; NichibunIdentifierCrawler/1.0)")
+    args = ap.parse_args()
 
-    last_key = None
-    miss_streak = 0
-    skip_cccc: Set[Tuple[int, int]] = set()
+    file_bbbb = load_ints_from_file(args.bbbb_file)
+    priority_bbbb = load_ints_from_file(args.bbbb_priority_file)
 
+    skip = load_skip_identifiers(args.skip_csv + [args.out])
+    store = ProbeStore(Path(args.state_db))
+    answered = store.statuses()
+    skip.update(ident for ident, status in answered.items() if status == HIT)
+    misses = set() if args.reprobe_misses else {ident for ident, status in answered.items() if status == MISS}
+    if answered:
+        counts = store.counts()
+        print(f"[info] resuming from {args.state_db}: {counts.get(HIT, 0)} hits, {counts.get(MISS, 0)} misses, {counts.get(ERROR, 0)} errors to retry")
     range_log_path = Path(args.range_log)
     range_log = load_range_log(range_log_path)
 
-    for parts in identifier_iter:
-        identifier = parts.id_str
-        if args.max_candidates is not None and attempts >= args.max_candidates:
-            break
-        attempts += 1
-        key = (parts.bbbb, parts.cccc)
-        if key in skip_cccc:
-            continue
-        if identifier in skip:
-            continue
-        try:
-            exists, html = fetch_card(identifier, session, args.timeout)
-        except Exception as exc:  # pragma: no cover - network dependent
-            print(f"[error] {identifier}: {exc}", file=sys.stderr)
-            time.sleep(args.sleep)
-            continue
-        if key != last_key:
-            miss_streak = 0
-            last_key = key
-        if not exists:
-            miss_streak += 1
-            print(f"[miss] {identifier} (miss streak: {miss_streak})")
-            if miss_streak >= args.max_miss_per_cccc:
-                print(f"[skip] stopping DDDD search at BBBB={parts.bbbb:04d} CCCC={parts.cccc:04d} after {miss_streak} misses")
-                skip_cccc.add(key)
-            time.sleep(args.sleep)
-            continue
-        miss_streak = 0
-
-        meta = parse_card_metadata(html)
-        row = {
-            "identifier": identifier,
-            "aaa": str(parts.aaa),
-            "bbbb": f"{parts.bbbb:04d}",
-            "cccc": f"{parts.cccc:04d}",
-            "dddd": f"{parts.dddd:04d}",
-            "title": meta.get("title", ""),
-            "creator": meta.get("creator", ""),
-            "subjects": meta.get("subjects", ""),
-            "description": meta.get("description", ""),
-            "publisher": meta.get("publisher", ""),
-            "contributor": meta.get("contributor", ""),
-            "date": meta.get("date", ""),
-            "resource_type": meta.get("resource_type", ""),
-            "format": meta.get("format", ""),
-            "language": meta.get("language", ""),
-            "source": meta.get("source", ""),
-            "relation": meta.get("relation", ""),
-            "coverage": meta.get("coverage", ""),
-            "rights": meta.get("rights", ""),
-            "card_url": f"{CARD_URL}?identifier={identifier}",
-            "image_url": IMAGE_BASE + f"{identifier}.jpg",
-        }
-        discovered.append(row)
-        skip.add(identifier)
-        found += 1
-        update_range_log(range_log, parts)
-        print(f"[ok] {identifier} (total found: {found})")
-        time.sleep(args.sleep)
-
-        if args.max_found is not None and found >= args.max_found:
-            break
-
-    out_path = Path(args.out)
-    write_csv(discovered, out_path)
-    save_range_log(range_log_path, range_log)
-
-    if args.download_images and discovered:
-        from pathlib import Path as _Path
-
-        download_images_helper(
-            discovered,
-            _Path(args.download_images),
-            sleep=args.sleep,
-            overwrite=args.overwrite_images,
-        )
+    work: List[object]
+    if args.strategy == "adaptive":
+        priors = load_range_priors(args.priors + ([args.ranges_json] if args.ranges_json else []))
+        if args.bbbb or file_bbbb or args.bbbb_range:
+            targets = build_bbbb_values(args.bbbb, file_bbbb, args.bbbb_range)
+        else:
+            targets = sorted(priors)
+        missing_path = Path(args.missing_bbbb_file) if args.missing_bbbb_file else None
+        missing = set(load_ints_from_file(args.missing_bbbb_file)) if missing_path and missing_path.exists() else set()
+        work = list(plan_adaptive(args.aaa, targets, priority_bbbb, priors, missing))
+        if not work:
+            raise SystemExit("No BBBB values to probe. Provide --bbbb/--bbbb-file/--bbbb-range or --priors.")
+        max_probes = args.max_candidates
+    else:
+        tasks = build_grid_tasks(args, file_bbbb, priority_bbbb)
+        candidates: Iterable[IdentifierParts] = generate_identifiers(args.aaa, tasks)
+        if args.max_candidates is not None:
+            candidates = (parts for _, parts in zip(range(args.max_candidates), candidates))
+        work = list(group_candidates(candidates))
+        max_probes = None
+
+    out = CsvAppender(Path(args.out))
+    state = CrawlState(skip, range_log, misses, store, out, max_found=args.max_found, max_probes=max_probes)
+    try:
+        asyncio.run(crawl(work, args, state))
+    except KeyboardInterrupt:
+        print("[info] interrupted; rerun the same command to resume", file=sys.stderr)
+    finally:
+        out.close()
+        store.close()
+        save_range_log(range_log_path, range_log)
+    print(f"[ok] {len(state.discovered)} new identifiers appended to {out.path}")
 
 
 if __name__ == "__main__":
@@ -6,31 +6,27 @@ Nichibun YoukaiGazou keyword scraper
 - Fetches search results for one or more keywords using the `query` parameter.
 - Reuses the BeautifulSoup-based parser from `nichibun_theme_crawler`.
 - Outputs CSV rows with: keyword, identifier, title, card_url, image_url.
+- Keywords are fetched concurrently through `nichibun_fetch` (rate-limited per host).
 """
 import argparse
+import asyncio
 import csv
-import time
 from pathlib import Path
 from typing import List, Dict
 
-import requests
-
+from nichibun_fetch import Fetcher, add_fetch_arguments, config_from_args
 from nichibun_theme_crawler import BASE, parse_entries
 
 SEARCH_URL = "https://www.nichibun.ac.jp/cgi-bin/YoukaiGazou/search.cgi"
 
 
-def fetch_keyword(keyword: str, session: requests.Session, timeout: float = 15.0) -> List[Dict[str, str]]:
+async def fetch_keyword(keyword: str, fetcher: Fetcher) -> List[Dict[str, str]]:
     params = {
         "query": keyword,
         "whence2": 0,
         "lang2": "ja",
     }
-    resp = session.get(SEARCH_URL, params=params, timeout=timeout)
-    resp.raise_for_status()
-    if resp.encoding == "ISO-8859-1":
-        resp.encoding = resp.apparent_encoding or "cp932"
-    html_text = resp.text
+    html_text = await fetcher.get_text(SEARCH_URL, params=params)
     rows = parse_entries(html_text, BASE)
     for r in rows:
         r["keyword"] = keyword
@@ -47,19 +43,36 @@ def write_csv(rows: List[Dict[str, str]], path: Path) -> None:
             writer.writerow({fn: r.get(fn, "") for fn in fieldnames})
 
 
+async def fetch_keywords(keywords: List[str], fetcher: Fetcher) -> List[Dict[str, str]]:
+    async def one(kw: str) -> List[Dict[str, str]]:
+        try:
+            rows = await fetch_keyword(kw, fetcher)
+        except Exception as exc:
+            print(f"[warn] {kw}: {exc}")
+            return []
+        print(f"[ok] {kw}: fetched {len(rows)} rows")
+        return rows
+
+    results = await asyncio.gather(*(one(kw) for kw in keywords))
+    # Keep the input keyword order regardless of completion order.
+    return [row for rows in results for row in rows]
+
+
+async def run(kw_list: List[str], args: argparse.Namespace) -> List[Dict[str, str]]:
+    async with Fetcher(config_from_args(args)) as fetcher:
+        rows = await fetch_keywords(kw_list, fetcher)
+        print(f"[info] {fetcher.summary()}")
+    return rows
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(description="Fetch Nichibun YoukaiGazou entries by keyword search (query parameter).")
     ap.add_argument("keywords", nargs="*", help="Zero or more keywords (Japanese text is OK).")
     ap.add_argument("--keyword-file", default=None, help="Optional UTF-8 text file with one keyword per line.")
     ap.add_argument("-o", "--out", default="data/nichibun_keywords.csv", help="Output CSV path")
-    ap.add_argument("--sleep", type=float, default=0.3, help="Delay between keyword requests (seconds)")
-    ap.add_argument("--timeout", type=float, default=15.0, help="HTTP timeout seconds")
-    ap.add_argument("--user-agent", default="Mozilla/5.0 (compatible; NichibunKeywordBot/1.0)", help="Custom User-Agent string")
+    add_fetch_arguments(ap, user_agent="Mozilla/5.0 (compatible; NichibunKeywordBot/1.0)")
     args = ap.parse_args()
 
-    session = requests.Session()
-    session.headers.update({"User-Agent": args.user_agent})
-
     kw_list: List[str] = list(args.keywords)
     if args.keyword_file:
         file_path = Path(args.keyword_file)
@@ -69,15 +82,7 @@ def main() -> None:
     if not kw_list:
         ap.error("Provide at least one keyword via arguments or --keyword-file.")
 
-    all_rows: List[Dict[str, str]] = []
-    for kw in kw_list:
-        try:
-            rows = fetch_keyword(kw, session=session, timeout=args.timeout)
-            print(f"[ok] {kw}: fetched {len(rows)} rows")
-            all_rows.extend(rows)
-        except Exception as exc:
-            print(f"[warn] {kw}: {exc}")
-        time.sleep(args.sleep)
+    all_rows = asyncio.run(run(kw_list, args))
 
     if not all_rows:
         print("[warn] No rows collected.")
@@ -89,4 +94,3 @@ def main() -> None:
 
 if __name__ == "__main__":
     main()
-
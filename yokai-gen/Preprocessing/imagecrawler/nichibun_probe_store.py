@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Durable probe log for the Nichibun identifier crawler
+-----------------------------------------------------
+- One SQLite row per probed identifier: status (hit/miss/error), HTTP code, timestamp
+- Committed as each probe finishes (WAL), so a crash or Ctrl-C loses at most the request in flight
+- On restart, hits and misses are answered from the log; only errors are probed again
+
+Inspect a sweep with:
+    sqlite3 data/derived/identifier_probes.sqlite3 "select status, count(*) from probes group by status"
+"""
+from __future__ import annotations
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+HIT = "hit"
+MISS = "miss"
+ERROR = "error"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    identifier TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    http_status INTEGER,
+    probed_at REAL NOT NULL
+)
+"""
+
+
+class ProbeStore:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL keeps every commit across a process crash; only an OS crash can drop the tail.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+    def statuses(self) -> Dict[str, str]:
+        """identifier -> last recorded status."""
+        return dict(self._conn.execute("SELECT identifier, status FROM probes"))
+
+    def record(self, identifier: str, status: str, http_status: Optional[int] = None) -> None:
+        # A later probe overrides an earlier one (e.g. an error that now answers).
+        self._conn.execute(
+            "INSERT OR REPLACE INTO probes (identifier, status, http_status, probed_at) VALUES (?, ?, ?, ?)",
+            (identifier, status, http_status, time.time()),
+        )
+        self._conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._conn.execute("SELECT status, COUNT(*) FROM probes GROUP BY status"))
+
+    def close(self) -> None:
+        self._conn.close()
@@ -22,37 +22,26 @@ Usage examples:
   # Write a flat list of image URLs (for aria2c/wget, etc.)
   python nichibun_theme_crawler.py --out nichibun.csv --write-urls urls.txt
 
-  # (Optional) Download images (be polite and throttle with --sleep)
-  python nichibun_theme_crawler.py --download-images images/ --sleep 0.5
+  # (Optional) Download images (be polite: at most 2 requests/second, 4 in flight)
+  python nichibun_theme_crawler.py --download-images images/ --rate 2 --concurrency 4
+
+  # Re-run a parser experiment on pages fetched before, without any network access
+  python nichibun_theme_crawler.py --topics 鬼 --offline --out nichibun_oni.csv
 """
-import re, csv, html, time, argparse, sys, urllib.parse
+import re, csv, html, argparse, asyncio, sys, urllib.parse
 from pathlib import Path
 from typing import List, Dict, Tuple, Set
 from urllib.parse import urljoin, urlparse, parse_qs, urlencode
 from bs4 import BeautifulSoup
 
+from nichibun_fetch import Fetcher, add_fetch_arguments, config_from_args
+
 BASE = "https://www.nichibun.ac.jp/"
 INDEX_URL = "https://www.nichibun.ac.jp/YoukaiGazou/"
 SEARCH_PATH = "/cgi-bin/YoukaiGazou/search.cgi"
 
-def fetch(url: str, session=None, timeout: float = 15.0, user_agent: str = None) -> str:
-    try:
-        import requests
-    except ImportError:
-        print("requests is required. Install with: pip install requests", file=sys.stderr)
-        sys.exit(1)
-    s = session or requests.Session()
-    if user_agent:
-        s.headers.update({"User-Agent": user_agent})
-    else:
-        s.headers.update({"User-Agent": "Mozilla/5.0 (compatible; NichibunCrawler/1.0)"})
-    r = s.get(url, timeout=timeout)
-    r.raise_for_status()
-    # Handle encoding: use apparent_encoding if headers are misleading, or fallback to utf-8/cp932
-    if r.encoding == 'ISO-8859-1':
-        r.encoding = r.apparent_encoding
-    
-    return r.text
+async def fetch(url: str, fetcher: Fetcher) -> str:
+    return await fetcher.get_text(url)
 
 # --- Parsers ---
 
@@ -191,55 +180,55 @@ def find_pagination_links(html_text: str, base_url: str, ychar_value: str) -> Li
     return out
 
 # --- Main crawl logic ---
-def crawl_topics(topics: List[Dict[str,str]], follow_pagination: bool = True, sleep: float = 0.3, user_agent: str = None, timeout: float = 15.0) -> List[Dict[str,str]]:
-    try:
-        import requests
-    except ImportError:
-        print("requests is required. Install with: pip install requests", file=sys.stderr)
-        sys.exit(1)
-    s = requests.Session()
-    s.headers.update({"User-Agent": user_agent or "Mozilla/5.0 (compatible; NichibunCrawler/1.0)"})
+async def crawl_topic(topic: Dict[str, str], fetcher: Fetcher, follow_pagination: bool = True) -> List[Dict[str, str]]:
+    topic_label = topic["label"]
+    topic_href = topic["href"]
+    # derive ychar for pagination matching
+    ychar_value = parse_qs(urlparse(topic_href).query).get("ychar", [None])[0]
+    if ychar_value is None:
+        # try to keep ychar_value decoded from label as last resort
+        ychar_value = urllib.parse.quote(topic_label)
+
+    rows: List[Dict[str, str]] = []
+    to_visit = [topic_href]
+    visited: Set[str] = set()
+    while to_visit:
+        url = to_visit.pop(0)
+        if url in visited:
+            continue
+        visited.add(url)
+        try:
+            html_text = await fetch(url, fetcher)
+        except Exception as ex:
+            print(f"[warn] fetch failed: {url}   ({ex})", file=sys.stderr)
+            continue
+
+        # Extract entries
+        for r in parse_entries(html_text, BASE):
+            r["topic_label"] = topic_label
+            r["topic_href"] = topic_href
+            rows.append(r)
+
+        # Follow pagination
+        if follow_pagination:
+            for nxt in find_pagination_links(html_text, BASE, ychar_value):
+                if nxt not in visited and nxt not in to_visit:
+                    to_visit.append(nxt)
+    return rows
+
+
+async def crawl_topics(topics: List[Dict[str,str]], fetcher: Fetcher, follow_pagination: bool = True) -> List[Dict[str,str]]:
+    """Crawl topics concurrently (pages within a topic in order); rows keep topic order."""
+    per_topic = await asyncio.gather(*(crawl_topic(t, fetcher, follow_pagination) for t in topics))
     all_rows: List[Dict[str, str]] = []
     seen_entries: Set[str] = set()
-    for t in topics:
-        topic_label = t["label"]
-        topic_href = t["href"]
-        # derive ychar for pagination matching
-        ychar_value = parse_qs(urlparse(topic_href).query).get("ychar", [None])[0]
-        if ychar_value is None:
-            # try to keep ychar_value decoded from label as last resort
-            ychar_value = urllib.parse.quote(topic_label)
-
-        to_visit = [topic_href]
-        visited: Set[str] = set()
-        while to_visit:
-            url = to_visit.pop(0)
-            if url in visited:
-                continue
-            visited.add(url)
-            try:
-                html_text = fetch(url, session=s, timeout=timeout, user_agent=user_agent)
-            except Exception as ex:
-                print(f"[warn] fetch failed: {url}   ({ex})", file=sys.stderr)
+    for rows in per_topic:
+        for r in rows:
+            key = r["identifier"]
+            if key in seen_entries:
                 continue
-
-            # Extract entries
-            for r in parse_entries(html_text, BASE):
-                key = r["identifier"]
-                if key in seen_entries:
-                    continue
-                seen_entries.add(key)
-                r["topic_label"] = topic_label
-                r["topic_href"] = topic_href
-                all_rows.append(r)
-
-            # Follow pagination
-            if follow_pagination:
-                for nxt in find_pagination_links(html_text, BASE, ychar_value):
-                    if nxt not in visited and nxt not in to_visit:
-                        to_visit.append(nxt)
-
-            time.sleep(sleep)
+            seen_entries.add(key)
+            all_rows.append(r)
     return all_rows
 
 # --- Utilities ---
@@ -264,34 +253,71 @@ def write_urls(rows: List[Dict[str, str]], path: Path) -> None:
         for r in rows:
             f.write(r["image_url"] + "\n")
 
-def download_images(rows: List[Dict[str, str]], outdir: Path, sleep: float = 0.3, overwrite: bool = False, timeout: float = 15.0, user_agent: str = None) -> None:
+async def download_image(row: Dict[str, str], outdir: Path, fetcher: Fetcher, overwrite: bool = False) -> None:
+    ident = row["identifier"]
+    url = row["image_url"]
+    dest = outdir / f"{ident}.jpg"
     try:
-        import requests
-    except ImportError:
-        print("requests is required for downloading images. Install with: pip install requests", file=sys.stderr)
-        sys.exit(1)
+        await fetcher.download(url, dest, overwrite=overwrite)
+    except ValueError as ex:
+        print(f"[warn] {ident}: {ex}", file=sys.stderr)
+    except Exception as ex:
+        print(f"[error] {ident}: {ex}", file=sys.stderr)
 
+
+async def download_images(rows: List[Dict[str, str]], outdir: Path, fetcher: Fetcher, overwrite: bool = False) -> None:
     outdir.mkdir(parents=True, exist_ok=True)
-    s = requests.Session()
-    s.headers.update({"User-Agent": user_agent or "Mozilla/5.0 (compatible; NichibunCollector/1.0)"})
+    await asyncio.gather(*(download_image(r, outdir, fetcher, overwrite=overwrite) for r in rows))
 
-    for r in rows:
-        ident = r["identifier"]
-        url = r["image_url"]
-        dest = outdir / f"{ident}.jpg"
-        if dest.exists() and not overwrite:
-            continue
-        try:
-            resp = s.get(url, timeout=timeout)
-            if resp.status_code == 200 and resp.headers.get("content-type", "").startswith("image"):
-                dest.write_bytes(resp.content)
+# --- CLI ---
+async def run(args: argparse.Namespace) -> None:
+    async with Fetcher(config_from_args(args)) as fetcher:
+        # Build topic list
+        topics: List[Dict[str,str]] = []
+
+        # 1) Topics by ychar (direct, if provided)
+        if args.ychar:
+            for yv in args.ychar:
+                # Accept decoded unicode too; construct URL
+                enc = urllib.parse.quote(urllib.parse.unquote(yv), safe="")
+                href = urljoin(BASE, SEARCH_PATH) + f"?query=NILL&ychar={enc}"
+                topics.append({"label": urllib.parse.unquote(enc), "href": href})
+
+        # 2) Topics scraped from index (if no ychar or also in addition)
+        if not args.ychar:
+            idx_html = await fetch(args.index_url, fetcher)
+            all_topics = parse_topics(idx_html, args.index_url)
+            if args.topics:
+                wanted = set(args.topics)
+                topics.extend([t for t in all_topics if t["label"] in wanted])
             else:
-                print(f"[warn] {ident}: HTTP {resp.status_code} (content-type={resp.headers.get('content-type')})", file=sys.stderr)
-        except Exception as ex:
-            print(f"[error] {ident}: {ex}", file=sys.stderr)
-        time.sleep(sleep)
+                topics.extend(all_topics)
+
+        if not topics:
+            print("No topics found. Check --index-url or --topics/--ychar arguments.", file=sys.stderr)
+            sys.exit(2)
+
+        follow_pagination = not args.no_pagination
+        # Already de-duplicated by identifier (first topic wins)
+        uniq = await crawl_topics(topics, fetcher, follow_pagination=follow_pagination)
+
+        out_csv = Path(args.out)
+        write_csv(uniq, out_csv)
+        print(f"[ok] Wrote {len(uniq)} rows to {out_csv}")
+
+        if args.write_urls:
+            url_path = Path(args.write_urls)
+            write_urls(uniq, url_path)
+            print(f"[ok] Wrote {len(uniq)} image URLs to {url_path}")
+
+        if args.download_images:
+            img_dir = Path(args.download_images)
+            print(f"[info] Downloading {len(uniq)} images to {img_dir} ...")
+            await download_images(uniq, img_dir, fetcher)
+            print("[ok] Done.")
+        print(f"[info] {fetcher.summary()}")
+
 
-# --- CLI ---
 def main():
     ap = argparse.ArgumentParser(description="Crawl Nichibun YoukaiGazou: collect entries by topic (ychar) from the index page.")
     ap.add_argument("--index-url", default=INDEX_URL, help=f"Index URL (default: {INDEX_URL})")
@@ -300,69 +326,10 @@ def main():
     ap.add_argument("--out", default="nichibun_topics.csv", help="Output CSV path")
     ap.add_argument("--write-urls", default=None, help="Also write a newline-separated file of image URLs")
     ap.add_argument("--download-images", default=None, help="Directory to download images (optional, off by default)")
-    ap.add_argument("--sleep", type=float, default=0.3, help="Delay between HTTP requests (default: 0.3s)")
     ap.add_argument("--no-pagination", action="store_true", help="Do not follow pagination links")
-    ap.add_argument("--user-agent", default=None, help="Custom User-Agent header")
-    ap.add_argument("--timeout", type=float, default=15.0, help="HTTP timeout seconds (default: 15)")
+    add_fetch_arguments(ap)
     args = ap.parse_args()
-
-    # Build topic list
-    topics: List[Dict[str,str]] = []
-
-    # 1) Topics by ychar (direct, if provided)
-    if args.ychar:
-        for yv in args.ychar:
-            # Accept decoded unicode too; construct URL
-            enc = urllib.parse.quote(urllib.parse.unquote(yv), safe="")
-            href = urljoin(BASE, SEARCH_PATH) + f"?query=NILL&ychar={enc}"
-            topics.append({"label": urllib.parse.unquote(enc), "href": href})
-
-    # 2) Topics scraped from index (if no ychar or also in addition)
-    if not args.ychar:
-        idx_html = fetch(args.index_url, user_agent=args.user_agent, timeout=args.timeout)
-        all_topics = parse_topics(idx_html, args.index_url)
-        if args.topics:
-            wanted = set(args.topics)
-            topics.extend([t for t in all_topics if t["label"] in wanted])
-        else:
-            topics.extend(all_topics)
-
-    if not topics:
-        print("No topics found. Check --index-url or --topics/--ychar arguments.", file=sys.stderr)
-        sys.exit(2)
-
-    follow_pagination = not args.no_pagination
-    rows = crawl_topics(
-        topics,
-        follow_pagination=follow_pagination,
-        sleep=args.sleep,
-        user_agent=args.user_agent,
-        timeout=args.timeout,
-    )
-
-    # De-duplicate by identifier (keep first)
-    seen = set()
-    uniq = []
-    for r in rows:
-        if r["identifier"] in seen:
-            continue
-        seen.add(r["identifier"])
-        uniq.append(r)
-
-    out_csv = Path(args.out)
-    write_csv(uniq, out_csv)
-    print(f"[ok] Wrote {len(uniq)} rows to {out_csv}")
-
-    if args.write_urls:
-        url_path = Path(args.write_urls)
-        write_urls(uniq, url_path)
-        print(f"[ok] Wrote {len(uniq)} image URLs to {url_path}")
-
-    if args.download_images:
-        img_dir = Path(args.download_images)
-        print(f"[info] Downloading {len(uniq)} images to {img_dir} ...")
-        download_images(uniq, img_dir, sleep=args.sleep, user_agent=args.user_agent, timeout=args.timeout)
-        print("[ok] Done.")
+    asyncio.run(run(args))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,472 @@
+"""Micro-batching scheduler that coalesces compatible generation requests."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable, TypeVar
+
+from .config import Settings, get_settings
+from .metrics import CANCELLED_TOTAL, ERRORS_TOTAL, QUEUE_WAIT_SECONDS, STAGE_SECONDS
+from .params import metric_labels, resolve_params
+from .result_cache import ResultCache
+from .schemas import GenerationRequest, ImageResult, QueueStats
+
+LOGGER = logging.getLogger(__name__)
+
+# step (1-based), total steps, optional base64 PNG latent preview. May raise
+# ``GenerationCancelled`` to abandon the running batch between steps.
+ProgressCallback = Callable[[int, int, "str | None"], None]
+# index of the image within its request, raw output; called from the pipeline thread.
+ImageSink = Callable[[int, Any], None]
+# Returns one list of raw outputs per request; ``Finalizer`` turns them into results.
+# Streaming batches get a third argument, one ``ImageSink`` per request, to be
+# called as soon as each image is decoded.
+BatchRunner = Callable[..., list[list[Any]]]
+Finalizer = Callable[[GenerationRequest, list[Any]], list[ImageResult]]
+T = TypeVar("T")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the generation queue is at ``max_queue_depth``."""
+
+    def __init__(self, depth: int, retry_after: int) -> None:
+        super().__init__(f"generation queue is full ({depth} pending)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised from the step callback once nobody is waiting for the running batch."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Set on a request's future when its ``timeout_seconds`` deadline passes."""
+
+
+@dataclass
+class _PendingRequest:
+    request: GenerationRequest
+    images: int
+    future: asyncio.Future[list[ImageResult]]
+    progress: ProgressCallback | None = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # Set (from the event loop) once the future is done; read by the pipeline thread.
+    stopped: threading.Event = field(default_factory=threading.Event)
+    deadline: asyncio.TimerHandle | None = None
+    key: Hashable = None
+    # Streaming only: (index, image) as each finishes encoding, then None once the future is done.
+    stream: asyncio.Queue[tuple[int, ImageResult] | None] | None = None
+    encodes: list[asyncio.Task[list[ImageResult]]] = field(default_factory=list)
+
+
+@dataclass
+class QueueTicket:
+    """Handle returned by ``GenerationBatcher.enqueue``; await ``future`` for the images."""
+
+    position: int
+    future: asyncio.Future[list[ImageResult]]
+    cached: bool = False
+    # Set for ``enqueue(..., stream=True)``: (index within the request, image) as soon as
+    # each is encoded, in completion order, then None.
+    images: asyncio.Queue[tuple[int, ImageResult] | None] | None = None
+
+
+class GenerationBatcher:
+    """Collects compatible requests for a short window and runs them as one pipe call.
+
+    Requests are compatible when they resolve to the same model, scheduler,
+    size, steps, guidance and LoRA set, so the only per-item inputs left are
+    prompts, seeds and init images.
+
+    Batches run one at a time on a dedicated single-thread executor; anything
+    else touching the pipeline should go through ``run_exclusive`` so LoRA
+    loading and generation never race. The optional ``finalizer`` (image
+    encoding) runs on a separate pool so the next batch can start right away.
+
+    With a ``ResultCache``, seeded requests seen before are answered at
+    admission without queueing, and finalized results are stored for next time.
+
+    Requests leave early through ``cancel`` or their deadline. Queued ones are
+    simply dropped; a running batch is abandoned at the next step boundary
+    once every request in it is gone (a batch shared with live requests
+    keeps going and the cancelled share is discarded).
+
+    Streaming requests batch only with each other; the runner hands over each
+    image as it is decoded and it is encoded and queued on the ticket right
+    away instead of after the whole batch.
+    """
+
+    def __init__(
+        self,
+        runner: BatchRunner,
+        settings: Settings | None = None,
+        finalizer: Finalizer | None = None,
+        cache: ResultCache | None = None,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self._runner = runner
+        self._finalizer = finalizer
+        self._cache = cache
+        self._pending: dict[Hashable, list[_PendingRequest]] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._encode_executor: ThreadPoolExecutor | None = None
+        self._finishing: set[asyncio.Task[None]] = set()
+        self._running = 0
+        self._batches_run = 0
+        self._requests_run = 0
+        self._images_run = 0
+        self._batch_sizes: Counter[int] = Counter()
+        self._last_batch_seconds: float | None = None
+        self._avg_batch_seconds: float | None = None
+
+    def batch_key(self, request: GenerationRequest, stream: bool = False) -> Hashable:
+        """Resolve defaults so requests relying on settings batch with explicit ones.
+
+        Prompts, negatives, seeds and img2img/inpaint images are per item, so
+        only the mode is part of the key.
+        """
+        return (
+            resolve_params(request, self.settings),
+            tuple((name, request.lora_scales.get(name, 1.0)) for name in request.lora),
+            request.init_image_id is not None,
+            request.mask_image_id is not None,
+            stream,
+        )
+
+    def _image_count(self, request: GenerationRequest) -> int:
+        return min(request.num_images, self.settings.max_batch_size)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(group) for group in self._pending.values())
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current backlog drains, for ``Retry-After``."""
+        per_batch = self._avg_batch_seconds or 1.0
+        avg_requests = self._requests_run / self._batches_run if self._batches_run else 1.0
+        per_request = per_batch / max(1.0, avg_requests)
+        return max(1, math.ceil(per_request * (self.queue_depth + self._running)))
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yokai-pipeline")
+        self._encode_executor = ThreadPoolExecutor(
+            max_workers=max(1, self.settings.encode_workers),
+            thread_name_prefix="yokai-encode",
+        )
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="generation-batcher")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for group in self._pending.values():
+            for item in group:
+                if not item.future.done():
+                    item.future.cancel()
+        self._pending.clear()
+        for task in list(self._finishing):
+            task.cancel()
+        for executor in (self._executor, self._encode_executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self._executor = None
+        self._encode_executor = None
+
+    async def run_exclusive(self, fn: Callable[..., T], *args: Any) -> T:
+        """Run ``fn`` on the pipeline thread, serialized with batch execution."""
+        await self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def enqueue(
+        self,
+        request: GenerationRequest,
+        progress: ProgressCallback | None = None,
+        stream: bool = False,
+    ) -> QueueTicket:
+        """Admit a request into the queue or raise ``QueueFullError``.
+
+        ``progress`` is invoked from the pipeline thread after each denoising step.
+        With ``stream``, images also arrive one by one on ``QueueTicket.images``.
+        """
+        await self.start()
+        assert self._wakeup is not None
+        loop = asyncio.get_running_loop()
+        if self._cache is not None and self._cache.enabled:
+            cached = await loop.run_in_executor(self._encode_executor, self._cache.get, request)
+            if cached is not None:
+                future: asyncio.Future[list[ImageResult]] = loop.create_future()
+                future.set_result(cached)
+                images: asyncio.Queue[tuple[int, ImageResult] | None] | None = None
+                if stream:
+                    images = asyncio.Queue()
+                    for entry in [*enumerate(cached), None]:
+                        images.put_nowait(entry)
+                return QueueTicket(position=0, future=future, cached=True, images=images)
+        depth = self.queue_depth
+        if depth >= self.settings.max_queue_depth:
+            raise QueueFullError(depth, self.retry_after())
+        item = _PendingRequest(
+            request=request,
+            images=self._image_count(request),
+            future=loop.create_future(),
+            progress=progress,
+            key=self.batch_key(request, stream),
+            stream=asyncio.Queue() if stream else None,
+        )
+        timeout = request.timeout_seconds or self.settings.generation_timeout_seconds
+        if timeout > 0:
+            item.deadline = loop.call_later(timeout, self._expire, item, timeout)
+        item.future.add_done_callback(lambda _future: self._on_done(item))
+        self._pending.setdefault(item.key, []).append(item)
+        self._wakeup.set()
+        return QueueTicket(position=depth + 1, future=item.future, images=item.stream)
+
+    def cancel(self, future: asyncio.Future[list[ImageResult]], reason: str = "cancelled") -> bool:
+        """Abandon a queued or running request; False if it already finished."""
+        if future.done():
+            return False
+        CANCELLED_TOTAL.inc(reason=reason)
+        future.cancel()
+        return True
+
+    def _expire(self, item: _PendingRequest, timeout: float) -> None:
+        if not item.future.done():
+            CANCELLED_TOTAL.inc(reason="deadline")
+            item.future.set_exception(DeadlineExceeded(f"generation did not finish within {timeout:g}s"))
+
+    def _on_done(self, item: _PendingRequest) -> None:
+        item.stopped.set()
+        if item.deadline is not None:
+            item.deadline.cancel()
+        if item.stream is not None:
+            item.stream.put_nowait(None)
+        # Free the queue slot right away rather than when the group is next taken.
+        group = self._pending.get(item.key)
+        if group is not None and item in group:
+            group.remove(item)
+            if not group:
+                del self._pending[item.key]
+
+    async def submit(self, request: GenerationRequest) -> list[ImageResult]:
+        """Queue a request and wait for its share of the batched output."""
+        ticket = await self.enqueue(request)
+        return await ticket.future
+
+    def queue_position(self, future: asyncio.Future[list[ImageResult]]) -> int | None:
+        """1-based position of a still-queued request, or None once it has left the queue."""
+        items = [item for group in self._pending.values() for item in group]
+        mine = next((item for item in items if item.future is future), None)
+        if mine is None:
+            return None
+        return sum(1 for item in items if item.enqueued_at <= mine.enqueued_at)
+
+    def stats(self) -> QueueStats:
+        return QueueStats(
+            queue_depth=self.queue_depth,
+            max_queue_depth=self.settings.max_queue_depth,
+            running=self._running > 0,
+            batches_run=self._batches_run,
+            requests_run=self._requests_run,
+            images_run=self._images_run,
+            avg_batch_requests=(self._requests_run / self._batches_run) if self._batches_run else 0.0,
+            batch_size_histogram={str(size): count for size, count in sorted(self._batch_sizes.items())},
+            last_batch_seconds=self._last_batch_seconds,
+        )
+
+    def _oldest_group(self) -> tuple[Hashable, list[_PendingRequest]]:
+        return min(self._pending.items(), key=lambda kv: kv[1][0].enqueued_at)
+
+    def _take_batch(self, key: Hashable) -> list[_PendingRequest]:
+        group = self._pending[key]
+        limit = self.settings.batch_max_images
+        batch: list[_PendingRequest] = []
+        total = 0
+        while group:
+            item = group[0]
+            if item.future.done():
+                # Caller went away before we got to it.
+                group.pop(0)
+                continue
+            if batch and total + item.images > limit:
+                break
+            batch.append(group.pop(0))
+            total += item.images
+        if not group:
+            del self._pending[key]
+        return batch
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        window = self.settings.batch_window_ms / 1000.0
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                key, group = self._oldest_group()
+                remaining = group[0].enqueued_at + window - time.monotonic()
+                queued_images = sum(item.images for item in group)
+                if remaining > 0 and queued_images < self.settings.batch_max_images:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    self._wakeup.clear()
+                    continue
+                batch = self._take_batch(key)
+                if batch:
+                    await self._execute(batch)
+
+    def _step_callbacks(self, batch: list[_PendingRequest]) -> list[ProgressCallback | None]:
+        """Per-request progress that also stops the batch once every request is gone."""
+
+        def wrap(item: _PendingRequest) -> ProgressCallback:
+            def report(step: int, total: int, preview: str | None) -> None:
+                if all(other.stopped.is_set() for other in batch):
+                    raise GenerationCancelled(f"all {len(batch)} request(s) cancelled at step {step}/{total}")
+                if item.progress is not None and not item.stopped.is_set():
+                    item.progress(step, total, preview)
+
+            return report
+
+        return [wrap(item) for item in batch]
+
+    async def _execute(self, batch: list[_PendingRequest]) -> None:
+        loop = asyncio.get_running_loop()
+        requests = [item.request for item in batch]
+        callbacks = self._step_callbacks(batch)
+        started = time.monotonic()
+        labels = metric_labels(requests[0], self.settings)
+        for item in batch:
+            QUEUE_WAIT_SECONDS.observe(started - item.enqueued_at, **labels)
+        args: tuple[Any, ...] = (requests, callbacks)
+        if batch[0].stream is not None:
+            args += ([self._image_sink(loop, item) for item in batch],)
+        self._running = len(batch)
+        try:
+            outputs = await loop.run_in_executor(self._executor, self._runner, *args)
+        except GenerationCancelled as exc:
+            LOGGER.info("Abandoned batch: %s", exc)
+            return
+        except Exception as exc:  # noqa: BLE001
+            ERRORS_TOTAL.inc(stage="generate", **labels)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            return
+        finally:
+            self._running = 0
+            elapsed = time.monotonic() - started
+            self._last_batch_seconds = elapsed
+            if self._avg_batch_seconds is None:
+                self._avg_batch_seconds = elapsed
+            else:
+                self._avg_batch_seconds = 0.8 * self._avg_batch_seconds + 0.2 * elapsed
+
+        self._batches_run += 1
+        self._requests_run += len(batch)
+        self._images_run += sum(len(images) for images in outputs)
+        self._batch_sizes[len(batch)] += 1
+        LOGGER.info("Ran batch of %s request(s) in %.2fs", len(batch), self._last_batch_seconds)
+        for item, raw in zip(batch, outputs):
+            if item.future.done():
+                continue
+            if item.stream is not None:
+                task = asyncio.create_task(self._finish_stream(item))
+                self._finishing.add(task)
+                task.add_done_callback(self._finishing.discard)
+                continue
+            if self._finalizer is None:
+                item.future.set_result(raw)
+                continue
+            task = asyncio.create_task(self._finish(item, raw))
+            self._finishing.add(task)
+            task.add_done_callback(self._finishing.discard)
+
+    async def _finish(self, item: _PendingRequest, raw: list[Any]) -> None:
+        assert self._finalizer is not None
+        loop = asyncio.get_running_loop()
+        try:
+            images = await loop.run_in_executor(self._encode_executor, self._finalize, item.request, raw)
+        except Exception as exc:  # noqa: BLE001
+            ERRORS_TOTAL.inc(stage="image_encode", **metric_labels(item.request, self.settings))
+            if not item.future.done():
+                item.future.set_exception(exc)
+            return
+        if not item.future.done():
+            item.future.set_result(images)
+
+    def _image_sink(self, loop: asyncio.AbstractEventLoop, item: _PendingRequest) -> ImageSink:
+        def sink(index: int, raw: Any) -> None:
+            loop.call_soon_threadsafe(self._stream_image, item, index, raw)
+
+        return sink
+
+    def _stream_image(self, item: _PendingRequest, index: int, raw: Any) -> None:
+        if item.future.done():
+            return
+        task = asyncio.create_task(self._encode_streamed(item, index, raw))
+        item.encodes.append(task)
+
+    async def _encode_streamed(self, item: _PendingRequest, index: int, raw: Any) -> list[ImageResult]:
+        if self._finalizer is None:
+            images = [raw]
+        else:
+            loop = asyncio.get_running_loop()
+            images = await loop.run_in_executor(self._encode_executor, self._encode, item.request, [raw])
+        if item.stream is not None and not item.future.done():
+            # With several encode workers images finish out of order; the index says which one this is.
+            for image in images:
+                item.stream.put_nowait((index, image))
+        return images
+
+    async def _finish_stream(self, item: _PendingRequest) -> None:
+        """Resolve a streamed request once every image it emitted has been encoded."""
+        try:
+            encoded = await asyncio.gather(*item.encodes)
+        except Exception as exc:  # noqa: BLE001
+            ERRORS_TOTAL.inc(stage="image_encode", **metric_labels(item.request, self.settings))
+            if not item.future.done():
+                item.future.set_exception(exc)
+            return
+        images = [image for chunk in encoded for image in chunk]
+        if self._cache is not None and self._finalizer is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._encode_executor, self._store, item.request, images)
+        if not item.future.done():
+            item.future.set_result(images)
+
+    def _encode(self, request: GenerationRequest, raw: list[Any]) -> list[ImageResult]:
+        assert self._finalizer is not None
+        with STAGE_SECONDS.time(stage="image_encode", **metric_labels(request, self.settings)):
+            return self._finalizer(request, raw)
+
+    def _store(self, request: GenerationRequest, images: list[ImageResult]) -> None:
+        if self._cache is None:
+            return
+        try:
+            self._cache.put(request, images)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.warning("Failed to cache generation result: %s", exc)
+
+    def _finalize(self, request: GenerationRequest, raw: list[Any]) -> list[ImageResult]:
+        images = self._encode(request, raw)
+        self._store(request, images)
+        return images
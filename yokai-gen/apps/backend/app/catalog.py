@@ -0,0 +1,262 @@
+"""Cached catalog of base models and LoRA files with sizes, hashes and header metadata."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mmap
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from .config import Settings, get_settings
+from .model_registry import detect_variant, estimate_model_bytes
+from .storage import default_model_path, list_base_models, list_lora_weights
+
+LOGGER = logging.getLogger(__name__)
+
+# safetensors headers are a few hundred KiB at most; anything larger is not one.
+_MAX_HEADER_BYTES = 100 * 1024 * 1024
+_HASH_CHUNK = 4 * 1024 * 1024
+_MAX_TRIGGER_WORDS = 5
+# Key fragments only SDXL LoRAs have: the second text encoder, or the UNet's
+# original SGM block names (SD 1.x kohya files use diffusers-style down_blocks).
+_SDXL_KEY_MARKERS = ("lora_te2_", "text_encoder_2.", "lora_unet_input_blocks", "lora_unet_output_blocks")
+
+
+@dataclass(frozen=True)
+class LoraMetadata:
+    """What a LoRA's safetensors header says about it (kohya ``ss_*`` / ``modelspec.*`` keys)."""
+
+    base_model: str | None = None
+    rank: int | None = None
+    alpha: float | None = None
+    trigger_words: tuple[str, ...] = ()
+    sdxl: bool | None = None
+
+
+@dataclass
+class CatalogEntry:
+    name: str
+    path: Path
+    size: int
+    mtime_ns: int
+    metadata: LoraMetadata | None = None
+    # Filled in lazily by ``Catalog.lora_digest``; reset whenever size or mtime change.
+    sha256: str | None = None
+
+
+@dataclass
+class ModelEntry:
+    name: str
+    path: Path
+    size: int
+    mtime_ns: int
+    pipeline_class: str | None = None
+
+
+@dataclass
+class _Listing:
+    dir_mtime_ns: int | None = None
+    scanned_at: float = 0.0
+    entries: dict[str, Any] = field(default_factory=dict)
+
+
+def read_safetensors_header(path: Path) -> dict[str, Any]:
+    """Parse the JSON header of a safetensors file through mmap, without touching tensor data."""
+    with path.open("rb") as fh:
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if len(mapped) < 8:
+                raise ValueError(f"not a safetensors file: {path.name}")
+            (length,) = struct.unpack("<Q", mapped[:8])
+            if length == 0 or length > min(len(mapped) - 8, _MAX_HEADER_BYTES):
+                raise ValueError(f"not a safetensors file: {path.name}")
+            header = json.loads(mapped[8 : 8 + length])
+    if not isinstance(header, dict):
+        raise ValueError(f"not a safetensors file: {path.name}")
+    return header
+
+
+def _int_or_none(value: Any) -> int | None:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_or_none(value: Any) -> float | None:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _trigger_words(meta: dict[str, Any]) -> tuple[str, ...]:
+    phrase = meta.get("modelspec.trigger_phrase")
+    if phrase:
+        return tuple(word.strip() for word in str(phrase).split(",") if word.strip())
+    try:
+        frequencies = json.loads(meta.get("ss_tag_frequency") or "{}")
+    except ValueError:
+        return ()
+    counts: dict[str, int] = {}
+    try:
+        for tags in frequencies.values():
+            for tag, count in tags.items():
+                counts[tag.strip()] = counts.get(tag.strip(), 0) + int(count)
+    except (AttributeError, TypeError, ValueError):
+        return ()
+    ranked = sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+    return tuple(tag for tag, _count in ranked[:_MAX_TRIGGER_WORDS] if tag)
+
+
+def lora_metadata(header: dict[str, Any]) -> LoraMetadata:
+    meta = header.get("__metadata__") or {}
+    base_model = meta.get("ss_base_model_version") or meta.get("modelspec.architecture") or meta.get("ss_sd_model_name")
+    rank = _int_or_none(meta.get("ss_network_dim"))
+    keys = [key for key in header if key != "__metadata__"]
+    if rank is None:
+        # The down projection is (rank, in_features[, 1, 1]).
+        for key in keys:
+            tensor = header[key]
+            if key.endswith(("lora_down.weight", "lora_A.weight")) and isinstance(tensor, dict):
+                rank = _int_or_none((tensor.get("shape") or [None])[0])
+                break
+    sdxl: bool | None = None
+    if any(marker in key for key in keys for marker in _SDXL_KEY_MARKERS):
+        sdxl = True
+    elif base_model:
+        sdxl = "xl" in str(base_model).lower()
+    return LoraMetadata(
+        base_model=str(base_model) if base_model else None,
+        rank=rank,
+        alpha=_float_or_none(meta.get("ss_network_alpha")),
+        trigger_words=_trigger_words(meta),
+        sdxl=sdxl,
+    )
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        while chunk := fh.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dir_mtime_ns(directory: Path) -> int | None:
+    try:
+        return directory.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class Catalog:
+    """Model and LoRA listings that only rescan when a directory changes.
+
+    A listing is reused while its directory mtime is unchanged (one stat per
+    call); adding, removing or renaming files bumps it. In-place overwrites do
+    not, so listings are also rescanned after ``catalog_rescan_seconds``.
+    Rescans re-read headers only for files whose size or mtime changed, and
+    content hashes are computed on first request (``lora_digest``) and kept
+    until the file changes.
+    """
+
+    def __init__(self, settings: Settings | None = None) -> None:
+        self.settings = settings or get_settings()
+        self._lock = threading.Lock()
+        self._loras = _Listing()
+        self._models = _Listing()
+
+    def _stale(self, listing: _Listing, directory: Path) -> bool:
+        if listing.dir_mtime_ns is None or listing.dir_mtime_ns != _dir_mtime_ns(directory):
+            return True
+        return time.monotonic() - listing.scanned_at >= self.settings.catalog_rescan_seconds
+
+    def _lora_entry(self, path: Path, previous: CatalogEntry | None) -> CatalogEntry:
+        stat = path.stat()
+        if previous is not None and (previous.size, previous.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return previous
+        metadata = None
+        if path.suffix.lower() == ".safetensors":
+            try:
+                metadata = lora_metadata(read_safetensors_header(path))
+            except (OSError, ValueError) as exc:
+                LOGGER.warning("Could not read safetensors header of %s: %s", path.name, exc)
+        return CatalogEntry(name=path.name, path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns, metadata=metadata)
+
+    def loras(self) -> list[CatalogEntry]:
+        directory = self.settings.lora_dir
+        with self._lock:
+            if self._stale(self._loras, directory):
+                dir_mtime = _dir_mtime_ns(directory)
+                previous = self._loras.entries
+                entries: dict[str, Any] = {}
+                for path in list_lora_weights(self.settings):
+                    try:
+                        entries[path.name] = self._lora_entry(path, previous.get(path.name))
+                    except OSError:
+                        continue
+                self._loras = _Listing(dir_mtime, time.monotonic(), entries)
+            return list(self._loras.entries.values())
+
+    def lora_digest(self, name: str) -> str:
+        """sha256 of a LoRA file, recomputed only when its size or mtime changed."""
+        path = self.settings.lora_dir / name
+        if path.parent != self.settings.lora_dir or not path.is_file():
+            raise FileNotFoundError(f"LoRA weight not found: {path}")
+        with self._lock:
+            entry = self._lora_entry(path, self._loras.entries.get(name))
+            self._loras.entries[name] = entry
+            if entry.sha256 is not None:
+                return entry.sha256
+        # Hash outside the lock so listings stay instant while a large file is read.
+        digest = _file_sha256(path)
+        with self._lock:
+            current = self._loras.entries.get(name)
+            if current is not None and (current.size, current.mtime_ns) == (entry.size, entry.mtime_ns):
+                current.sha256 = digest
+        return digest
+
+    def models(self) -> list[ModelEntry]:
+        """Default model first, like ``list_base_models``."""
+        directory = self.settings.model_dir
+        with self._lock:
+            if self._stale(self._models, directory):
+                dir_mtime = _dir_mtime_ns(directory)
+                previous = self._models.entries
+                entries: dict[str, Any] = {}
+                for path in list_base_models(self.settings):
+                    try:
+                        entries[path.name] = self._model_entry(path, previous.get(path.name))
+                    except OSError:
+                        continue
+                self._models = _Listing(dir_mtime, time.monotonic(), entries)
+            return list(self._models.entries.values())
+
+    def _model_entry(self, path: Path, previous: ModelEntry | None) -> ModelEntry:
+        index = path / "model_index.json"
+        mtime_ns = index.stat().st_mtime_ns
+        if previous is not None and previous.path == path and previous.mtime_ns == mtime_ns:
+            return previous
+        try:
+            pipeline_class = json.loads(index.read_text(encoding="utf-8")).get("_class_name")
+        except (OSError, ValueError, AttributeError):
+            pipeline_class = None
+        return ModelEntry(
+            name=path.name,
+            path=path,
+            size=estimate_model_bytes(path, detect_variant(path)),
+            mtime_ns=mtime_ns,
+            pipeline_class=pipeline_class,
+        )
+
+    def is_default(self, entry: ModelEntry) -> bool:
+        return entry.path == default_model_path(self.settings)
+
+
+catalog = Catalog()
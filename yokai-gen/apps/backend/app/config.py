@@ -8,6 +8,8 @@ from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from .schemas import SchedulerName
+
 
 class Settings(BaseSettings):
     """Runtime configuration sourced from env vars / .env."""
@@ -17,16 +19,75 @@ class Settings(BaseSettings):
     places_json_path: Path = Path(__file__).resolve().parents[3] / "web" / "public" / "places.json"
     places_image_dir: Path = Path(__file__).resolve().parents[3] / "web" / "public" / "img" / "yokai"
     places_image_url_prefix: str = "/img/yokai"
+    places_tiles_enabled: bool = True
+    places_tiles_dir: Path = Path(__file__).resolve().parents[3] / "web" / "public" / "tiles"
+    places_tiles_url_prefix: str = "/tiles"
+    places_tile_zoom: int = 7
+    # places.json is rewritten in full every this many publishes (or after the interval below).
+    places_flush_every: int = 50
+    places_flush_interval_seconds: float = 2.0
+    image_store_dir: Path = Path(__file__).resolve().parents[3] / "outputs" / "images"
+    image_store_ttl_seconds: int = 6 * 3600
+    places_thumbnail_size: int | None = 256
+    places_thumbnail_format: Literal["png", "webp", "jpeg"] = "webp"
     default_model_subdir: str | None = None
+    max_resident_models: int = 1
+    max_offloaded_models: int = 1
+    model_memory_budget_mb: int = 0
+    model_eviction: Literal["cpu", "drop"] = "cpu"
+    share_model_components: bool = True
     device_preference: Literal["auto", "cuda", "mps", "cpu"] = "auto"
     enable_xformers: bool = True
+    execution_profile: Literal["auto", "performance", "balanced", "low_memory", "minimal"] = "auto"
+    memory_budget_mb: int = 0
+    memory_headroom: float = 0.85
+    cpu_bf16: Literal["auto", "on", "off"] = "auto"
+    cpu_threads: int | None = None
+    cpu_interop_threads: int | None = None
     guidance_scale: float = 7.5
     inference_steps: int = 30
     max_inference_steps: int = 60
+    scheduler: SchedulerName = "euler_a"
+    preview_scheduler: SchedulerName = "dpmpp_2m_karras"
+    preview_steps: int = 8
+    preview_scale: float = 0.5
+    # LoRA file names (as in /lora) that are LCM-LoRAs; they switch requests to the lcm scheduler.
+    lcm_loras: list[str] = []
+    lcm_steps: int = 4
+    lcm_guidance_scale: float = 1.5
+    upscale_strength: float = 0.45
+    img2img_strength: float = 0.6
+    inpaint_strength: float = 0.99
     max_batch_size: int = 4
+    batch_window_ms: int = 50
+    batch_max_images: int = 8
+    max_queue_depth: int = 16
+    # Default per-request deadline from admission (0 = none); requests may set their own.
+    generation_timeout_seconds: float = 0.0
+    lora_cache_budget_mb: int = 2048
+    # /models and /lora listings are reused until their directory changes or this many seconds pass.
+    catalog_rescan_seconds: float = 30.0
+    job_ttl_seconds: int = 3600
+    preview_interval_steps: int = 5
     width: int = 1024
     height: int = 1024
     allow_safety_checker: bool = False
+    warmup_enabled: bool = True
+    warmup_steps: int = 2
+    warmup_sizes: list[tuple[int, int]] = []
+    channels_last: bool = False
+    torch_compile: bool = False
+    torch_compile_mode: Literal["default", "reduce-overhead", "max-autotune"] = "reduce-overhead"
+    compile_cache_dir: Path = Path(__file__).resolve().parents[3] / "outputs" / "compile_cache"
+    prompt_cache_size: int = 256
+    result_cache_enabled: bool = True
+    result_cache_dir: Path = Path(__file__).resolve().parents[3] / "outputs" / "result_cache"
+    result_cache_memory_mb: int = 256
+    result_cache_disk_mb: int = 2048
+    output_format: Literal["png", "webp", "jpeg"] = "png"
+    output_quality: int = 90
+    png_compress_level: int = 1
+    encode_workers: int = 2
 
     model_config = SettingsConfigDict(env_prefix="YOKAI_", env_file=".env", extra="ignore")
 
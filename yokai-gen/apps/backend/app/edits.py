@@ -0,0 +1,46 @@
+"""Turn img2img / inpaint uploads into queueable generation requests."""
+
+from __future__ import annotations
+
+from .encoding import check_image, decode_base64_image, mask_from_alpha, normalize_upload
+from .image_store import ImageStore
+from .schemas import GenerationRequest, ImageEditRequest
+
+_UPLOAD_FIELDS = {"init_image_base64", "mask_image_base64"}
+
+
+def _stored_id(store: ImageStore, image_id: str | None, upload: str | None) -> tuple[str | None, bytes | None]:
+    """Resolve an id or store an upload; returns the id and, when read, the bytes."""
+    if upload:
+        data = decode_base64_image(upload)
+        check_image(data)
+        data, media_type = normalize_upload(data)
+        return store.put(data, media_type).id, data
+    if image_id:
+        data, stored = store.read(image_id)
+        return stored.id, data
+    return None, None
+
+
+def prepare_edit(payload: ImageEditRequest, store: ImageStore, inpaint: bool) -> GenerationRequest:
+    """Store uploads and return a plain request that references them by id.
+
+    For inpainting without an explicit mask, an RGBA cutout's transparent area
+    (as produced by the segmentation tool) becomes the region to repaint.
+    Raises ``FileNotFoundError`` for unknown ids and ``ValueError`` for bad input.
+    """
+    init_id, init_data = _stored_id(store, payload.init_image_id, payload.init_image_base64)
+    mask_id = None
+    if inpaint:
+        mask_id, _mask = _stored_id(store, payload.mask_image_id, payload.mask_image_base64)
+        if mask_id is None and init_data is not None:
+            mask = mask_from_alpha(init_data)
+            if mask is not None:
+                mask_id = store.put(mask, "image/png").id
+        if mask_id is None:
+            raise ValueError("inpainting needs a mask or an init image with transparency")
+    return GenerationRequest(
+        **payload.model_dump(exclude=_UPLOAD_FIELDS | {"init_image_id", "mask_image_id"}),
+        init_image_id=init_id,
+        mask_image_id=mask_id,
+    )
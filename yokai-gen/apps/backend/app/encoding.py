@@ -0,0 +1,198 @@
+"""Image encoding for generated outputs (PNG/WebP/JPEG) and thumbnails."""
+
+from __future__ import annotations
+
+import io
+from base64 import b64decode, b64encode
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from PIL import Image
+
+from .config import Settings, get_settings
+from .image_store import ImageStore, image_store
+from .schemas import GenerationRequest, ImageResult
+
+ImageFormat = Literal["png", "webp", "jpeg"]
+
+_MEDIA_TYPES: dict[str, str] = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+
+@dataclass(frozen=True)
+class EncodeOptions:
+    format: ImageFormat
+    quality: int
+    png_compress_level: int
+
+    @property
+    def media_type(self) -> str:
+        return _MEDIA_TYPES[self.format]
+
+
+@dataclass
+class GeneratedImage:
+    """Decoded pipeline output waiting to be encoded off the inference thread."""
+
+    image: Any
+    seed: int
+    width: int
+    height: int
+
+
+def resolve_options(
+    settings: Settings,
+    fmt: ImageFormat | None = None,
+    quality: int | None = None,
+) -> EncodeOptions:
+    return EncodeOptions(
+        format=fmt or settings.output_format,
+        quality=quality or settings.output_quality,
+        png_compress_level=settings.png_compress_level,
+    )
+
+
+def encode_image(image: Image.Image, options: EncodeOptions) -> bytes:
+    buffer = io.BytesIO()
+    if options.format == "png":
+        image.save(buffer, format="PNG", compress_level=options.png_compress_level)
+    elif options.format == "webp":
+        image.save(buffer, format="WEBP", quality=options.quality, method=4)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, format="JPEG", quality=options.quality)
+    return buffer.getvalue()
+
+
+def decode_base64_image(value: str) -> bytes:
+    """Decode plain or ``data:`` URL base64; raises ``binascii.Error`` on garbage."""
+    if value.startswith("data:"):
+        value = value.split(",", 1)[-1]
+    return b64decode(value, validate=True)
+
+
+def check_image(data: bytes) -> None:
+    """Raise ``ValueError`` unless ``data`` is an image PIL can read."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+    except Exception as exc:  # noqa: BLE001
+        raise ValueError(f"not a readable image: {exc}") from exc
+
+
+def sniff_media_type(data: bytes) -> str | None:
+    """Media type from magic bytes for the formats the image store serves, else None."""
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def normalize_upload(data: bytes) -> tuple[bytes, str]:
+    """Upload bytes and their media type; other formats (GIF, BMP, TIFF, ...) are re-encoded to PNG.
+
+    Raises ``ValueError`` when PIL cannot read the image.
+    """
+    media_type = sniff_media_type(data)
+    if media_type is not None:
+        return data, media_type
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            if image.mode not in ("1", "L", "LA", "I", "P", "RGB", "RGBA"):
+                image = image.convert("RGBA")
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+    except Exception as exc:  # noqa: BLE001
+        raise ValueError(f"not a readable image: {exc}") from exc
+    return buffer.getvalue(), "image/png"
+
+
+def image_size(data: bytes) -> tuple[int, int]:
+    """(width, height) from the image header; raises ``ValueError`` when PIL cannot read it."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception as exc:  # noqa: BLE001
+        raise ValueError(f"not a readable image: {exc}") from exc
+
+
+def make_thumbnail(data: bytes, max_size: int, options: EncodeOptions) -> bytes:
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        return encode_image(image, options)
+
+
+def load_rgb(data: bytes, size: tuple[int, int]) -> Image.Image:
+    """Decode an init image at ``size``; transparent areas (cutouts) become white."""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.mode in ("RGBA", "LA", "P"):
+            rgba = image.convert("RGBA")
+            background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+            rgb = Image.alpha_composite(background, rgba).convert("RGB")
+        else:
+            rgb = image.convert("RGB")
+    return rgb.resize(size, Image.Resampling.LANCZOS)
+
+
+def load_mask(data: bytes, size: tuple[int, int]) -> Image.Image:
+    """Decode an inpainting mask (white = repaint) at ``size``."""
+    with Image.open(io.BytesIO(data)) as image:
+        mask = image.convert("L")
+    return mask.resize(size, Image.Resampling.NEAREST)
+
+
+def mask_from_alpha(data: bytes) -> bytes | None:
+    """PNG mask marking the transparent part of an RGBA cutout for repainting, or None if opaque."""
+    with Image.open(io.BytesIO(data)) as image:
+        if "A" not in image.getbands() and "transparency" not in image.info:
+            return None
+        alpha = image.convert("RGBA").getchannel("A")
+    if alpha.getextrema()[0] == 255:
+        return None
+    mask = alpha.point(lambda value: 255 if value < 128 else 0)
+    buffer = io.BytesIO()
+    mask.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def base64_fields(data: bytes, media_type: str) -> dict[str, str | None]:
+    """``ImageResult`` base64 fields; the legacy ``base64_png`` is only filled for actual PNGs."""
+    encoded = b64encode(data).decode("utf-8")
+    return {"base64_data": encoded, "base64_png": encoded if media_type == "image/png" else None}
+
+
+def finalize_images(
+    request: GenerationRequest,
+    images: list[GeneratedImage],
+    settings: Settings | None = None,
+    store: ImageStore | None = None,
+) -> list[ImageResult]:
+    """Encode pipeline outputs, put them in the image store and build API results."""
+    cfg = settings or get_settings()
+    target = store or image_store
+    options = resolve_options(cfg, request.output_format, request.output_quality)
+    results: list[ImageResult] = []
+    for generated in images:
+        data = encode_image(generated.image, options)
+        stored = target.put(data, options.media_type)
+        results.append(
+            ImageResult(
+                image_id=stored.id,
+                url=target.url_for(stored.id),
+                media_type=options.media_type,
+                seed=generated.seed,
+                width=generated.width,
+                height=generated.height,
+                lora=request.lora,
+                **(base64_fields(data, options.media_type) if request.response_format == "base64" else {}),
+            )
+        )
+    return results
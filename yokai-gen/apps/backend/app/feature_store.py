@@ -0,0 +1,251 @@
+"""Incremental, lock-protected store behind Cesium's places.json."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from .tiles import TileIndex
+
+LOGGER = logging.getLogger(__name__)
+
+_ID_PATTERN = re.compile(r"yokai-(\d+)$", re.IGNORECASE)
+
+
+def feature_id(feature: Any) -> str:
+    if not isinstance(feature, dict):
+        return ""
+    props = feature.get("properties") or {}
+    return str(props.get("id") or feature.get("id") or "")
+
+
+def _id_number(fid: str) -> int | None:
+    match = _ID_PATTERN.search(fid)
+    if not match:
+        return None
+    try:
+        return int(match.group(1))
+    except ValueError:
+        return None
+
+
+def load_feature_collection(path: Path) -> dict[str, Any]:
+    if not path.exists():
+        return {"type": "FeatureCollection", "features": []}
+    try:
+        with path.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+        if isinstance(data, dict) and isinstance(data.get("features"), list):
+            return data
+    except Exception as exc:  # noqa: BLE001
+        LOGGER.warning("Failed to read %s: %s. Re-initializing.", path, exc)
+    return {"type": "FeatureCollection", "features": []}
+
+
+def atomic_write_json(path: Path, data: Any, indent: int | None = None) -> None:
+    """Write JSON to a temp file in the same directory and rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.parent / f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with tmp.open("w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=indent)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+class FeatureStore:
+    """In-memory view of a GeoJSON FeatureCollection with an append-only journal.
+
+    Upserts are appended to ``<places>.journal`` (one JSON line each) and
+    applied to an id index, so picking ids and replacing features is O(1).
+    The full ``places.json`` is rewritten atomically every ``flush_every``
+    upserts, or ``flush_interval`` seconds after the first unflushed one,
+    after which the journal is truncated. On load, the journal is replayed on
+    top of ``places.json`` so nothing is lost if the process dies in between.
+    Batching keeps the per-publish cost to one journal line instead of a
+    rewrite that grows with the map.
+
+    All access goes through ``lock``; callers doing read-modify-write
+    sequences (pick id, write image, upsert) should hold it throughout.
+
+    When a ``TileIndex`` is attached, each flush also rewrites just the tiles
+    whose features changed.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        flush_every: int = 50,
+        flush_interval: float = 2.0,
+        tiles: TileIndex | None = None,
+    ) -> None:
+        self.path = path
+        self.tiles = tiles
+        self.journal_path = path.with_name(path.name + ".journal")
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        self._collection: dict[str, Any] | None = None
+        self._index: dict[str, int] = {}
+        self._max_num = 0
+        self._pending = 0
+        self._file_signature: tuple[int, int] | None = None
+        self._timer: threading.Timer | None = None
+
+    def _signature(self) -> tuple[int, int] | None:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _ensure_loaded(self) -> dict[str, Any]:
+        if self._collection is not None and self._signature() == self._file_signature:
+            return self._collection
+        if self._collection is not None:
+            LOGGER.info("%s changed on disk; reloading", self.path)
+        self._collection = load_feature_collection(self.path)
+        self._file_signature = self._signature()
+        self._reindex()
+        self._pending = self._replay_journal()
+        return self._collection
+
+    def _reindex(self) -> None:
+        assert self._collection is not None
+        self._index = {}
+        self._max_num = 0
+        for pos, feat in enumerate(self._collection["features"]):
+            self._track(feature_id(feat), pos)
+        if self.tiles is not None:
+            features = self._collection["features"]
+            self.tiles.rebuild({fid: features[pos] for fid, pos in self._index.items()})
+
+    def _track(self, fid: str, pos: int) -> None:
+        if fid:
+            self._index[fid] = pos
+        num = _id_number(fid)
+        if num is not None and num > self._max_num:
+            self._max_num = num
+
+    def _replay_journal(self) -> int:
+        if not self.journal_path.exists():
+            return 0
+        replayed = 0
+        with self.journal_path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; everything before it is intact.
+                    LOGGER.warning("Ignoring corrupt journal line in %s", self.journal_path)
+                    continue
+                if entry.get("op") == "upsert":
+                    self._apply(entry["feature"])
+                    replayed += 1
+        if replayed:
+            LOGGER.info("Replayed %s journal entries from %s", replayed, self.journal_path)
+        return replayed
+
+    def _apply(self, feature: dict[str, Any]) -> None:
+        assert self._collection is not None
+        features: list[Any] = self._collection["features"]
+        fid = feature_id(feature)
+        pos = self._index.get(fid) if fid else None
+        if pos is None:
+            features.append(feature)
+            self._track(fid, len(features) - 1)
+        else:
+            features[pos] = feature
+        if self.tiles is not None and fid:
+            self.tiles.place(fid, feature)
+
+    def next_id(self, requested: str | None = None) -> str:
+        with self.lock:
+            if requested:
+                return requested
+            self._ensure_loaded()
+            return f"yokai-{self._max_num + 1:03d}"
+
+    def count(self) -> int:
+        with self.lock:
+            return len(self._ensure_loaded()["features"])
+
+    def upsert(self, feature: dict[str, Any]) -> int:
+        """Insert or replace ``feature`` by id and return the feature count."""
+        with self.lock:
+            self._ensure_loaded()
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.journal_path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"op": "upsert", "feature": feature}, ensure_ascii=False) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._apply(feature)
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+            return len(self._collection["features"])  # type: ignore[index]
+
+    def flush(self) -> None:
+        """Materialize places.json atomically and truncate the journal."""
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._collection is None or not self._pending:
+                return
+            atomic_write_json(self.path, self._collection, indent=2)
+            self._file_signature = self._signature()
+            if self.tiles is not None:
+                features = self._collection["features"]
+                try:
+                    self.tiles.write(lambda fid: features[self._index[fid]])
+                except Exception as exc:  # noqa: BLE001
+                    # places.json is the source of truth; tiles are rebuilt on next load.
+                    LOGGER.warning("Failed to write tiles under %s: %s", self.tiles.root, exc)
+            self.journal_path.unlink(missing_ok=True)
+            self._pending = 0
+
+
+_STORES: dict[Path, FeatureStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_feature_store(
+    path: Path,
+    flush_every: int = 50,
+    flush_interval: float = 2.0,
+    make_tiles: Callable[[], TileIndex | None] | None = None,
+) -> FeatureStore:
+    """Process-wide store per places.json path, so every publisher shares one lock.
+
+    Options only apply when the store is first created; ``make_tiles`` is only
+    called then, so the tile index is built once per store.
+    """
+    key = path.resolve()
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            tiles = make_tiles() if make_tiles is not None else None
+            store = FeatureStore(path, flush_every=flush_every, flush_interval=flush_interval, tiles=tiles)
+            _STORES[key] = store
+        return store
+
+
+def flush_all() -> None:
+    with _STORES_LOCK:
+        stores = list(_STORES.values())
+    for store in stores:
+        store.flush()
@@ -0,0 +1,126 @@
+"""Short-lived content-addressed store for generated images."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from .config import Settings, get_settings
+
+LOGGER = logging.getLogger(__name__)
+
+_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+MEDIA_TYPES: dict[str, str] = {
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".jpg": "image/jpeg",
+}
+EXTENSIONS: dict[str, str] = {media: ext for ext, media in MEDIA_TYPES.items()}
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    id: str
+    path: Path
+    media_type: str
+    size: int
+
+    @property
+    def extension(self) -> str:
+        return self.path.suffix
+
+
+class ImageStore:
+    """Keeps encoded images on disk under their SHA-256 for ``image_store_ttl_seconds``.
+
+    Files are named ``<sha256><ext>`` so the store needs no index: lookups go
+    straight to disk and identical images are written once. Storing the same
+    bytes again refreshes the mtime, which is what the TTL is measured against.
+    """
+
+    _purge_lock = threading.Lock()
+    _last_purge = 0.0
+
+    def __init__(self, settings: Settings | None = None) -> None:
+        self.settings = settings or get_settings()
+        self.root = self.settings.image_store_dir
+
+    @staticmethod
+    def is_valid_id(image_id: str) -> bool:
+        return bool(_ID_PATTERN.match(image_id))
+
+    def url_for(self, image_id: str) -> str:
+        return f"/images/{image_id}"
+
+    def put(self, data: bytes, media_type: str = "image/png") -> StoredImage:
+        ext = EXTENSIONS.get(media_type)
+        if ext is None:
+            raise ValueError(f"Unsupported media type: {media_type}")
+        image_id = hashlib.sha256(data).hexdigest()
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{image_id}{ext}"
+        if path.exists():
+            path.touch()
+        else:
+            tmp = path.parent / f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        self._maybe_purge()
+        return StoredImage(id=image_id, path=path, media_type=media_type, size=len(data))
+
+    def get(self, image_id: str) -> StoredImage | None:
+        if not self.is_valid_id(image_id):
+            return None
+        cutoff = time.time() - self.settings.image_store_ttl_seconds
+        for ext, media_type in MEDIA_TYPES.items():
+            path = self.root / f"{image_id}{ext}"
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                return None
+            return StoredImage(id=image_id, path=path, media_type=media_type, size=stat.st_size)
+        return None
+
+    def read(self, image_id: str) -> tuple[bytes, StoredImage]:
+        stored = self.get(image_id)
+        if stored is None:
+            raise FileNotFoundError(f"Image not found or expired: {image_id}")
+        return stored.path.read_bytes(), stored
+
+    def purge_expired(self) -> int:
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - self.settings.image_store_ttl_seconds
+        removed = 0
+        for path in self.root.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        if removed:
+            LOGGER.info("Purged %s expired image(s) from %s", removed, self.root)
+        return removed
+
+    def _maybe_purge(self) -> None:
+        interval = max(60.0, self.settings.image_store_ttl_seconds / 10)
+        with ImageStore._purge_lock:
+            now = time.monotonic()
+            if now - ImageStore._last_purge < interval:
+                return
+            ImageStore._last_purge = now
+        self.purge_expired()
+
+
+image_store = ImageStore()
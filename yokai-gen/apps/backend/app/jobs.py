@@ -0,0 +1,157 @@
+"""Asynchronous generation jobs with polling and progress streaming."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from .batching import DeadlineExceeded, GenerationBatcher, QueueTicket
+from .config import Settings, get_settings
+from .schemas import GenerationRequest, JobStatus
+
+LOGGER = logging.getLogger(__name__)
+
+_TERMINAL = ("succeeded", "failed", "cancelled")
+
+
+@dataclass
+class _Job:
+    status: JobStatus
+    ticket: QueueTicket | None = None
+    task: asyncio.Task[None] | None = None
+    listeners: set[asyncio.Queue[JobStatus]] = field(default_factory=set)
+
+
+class JobStore:
+    """Tracks jobs submitted through the generation queue.
+
+    Progress arrives on the pipeline thread and is marshalled back onto the
+    event loop, so all state changes happen on one thread.
+    """
+
+    def __init__(self, batcher: GenerationBatcher, settings: Settings | None = None) -> None:
+        self.settings = settings or get_settings()
+        self.batcher = batcher
+        self._jobs: dict[str, _Job] = {}
+
+    async def submit(self, request: GenerationRequest) -> JobStatus:
+        """Queue a request and return immediately; raises ``QueueFullError`` when full."""
+        self._prune()
+        loop = asyncio.get_running_loop()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        job = _Job(status=JobStatus(id=job_id, status="queued", created_at=now, updated_at=now))
+
+        def report(step: int, total: int, preview: str | None) -> None:
+            loop.call_soon_threadsafe(self._on_progress, job_id, step, total, preview)
+
+        job.ticket = await self.batcher.enqueue(request, progress=report)
+        job.status.queue_position = job.ticket.position
+        self._jobs[job_id] = job
+        job.task = asyncio.create_task(self._wait(job_id))
+        return job.status.model_copy()
+
+    async def cancel(self, job_id: str) -> JobStatus | None:
+        """Cancel a queued or running job; finished jobs are returned unchanged."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.ticket is not None and self.batcher.cancel(job.ticket.future) and job.task is not None:
+            # Let ``_wait`` record the cancellation before answering.
+            await asyncio.wait([job.task])
+        return job.status.model_copy()
+
+    def get(self, job_id: str) -> JobStatus | None:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status.status == "queued" and job.ticket is not None:
+            job.status.queue_position = self.batcher.queue_position(job.ticket.future)
+        return job.status.model_copy()
+
+    async def events(self, job_id: str, keepalive: float = 15.0) -> AsyncIterator[JobStatus | None]:
+        """Yield the current status, then every update until the job finishes.
+
+        ``None`` is yielded after ``keepalive`` seconds without updates so the
+        caller can write a heartbeat.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        queue: asyncio.Queue[JobStatus] = asyncio.Queue()
+        job.listeners.add(queue)
+        try:
+            current = self.get(job_id)
+            if current is None:
+                return
+            yield current
+            if current.status in _TERMINAL:
+                return
+            while True:
+                try:
+                    status = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield status
+                if status.status in _TERMINAL:
+                    return
+        finally:
+            job.listeners.discard(queue)
+
+    def _publish(self, job: _Job) -> None:
+        job.status.updated_at = time.time()
+        snapshot = job.status.model_copy()
+        for queue in job.listeners:
+            queue.put_nowait(snapshot)
+
+    def _on_progress(self, job_id: str, step: int, total: int, preview: str | None) -> None:
+        job = self._jobs.get(job_id)
+        if job is None or job.status.status in _TERMINAL:
+            return
+        job.status.status = "running"
+        job.status.queue_position = None
+        job.status.step = step
+        job.status.total_steps = total
+        if preview is not None:
+            job.status.preview_png = preview
+        self._publish(job)
+
+    async def _wait(self, job_id: str) -> None:
+        job = self._jobs[job_id]
+        assert job.ticket is not None
+        try:
+            images = await job.ticket.future
+        except asyncio.CancelledError:
+            if not job.ticket.future.cancelled():
+                raise
+            job.status.status = "cancelled"
+        except DeadlineExceeded as exc:
+            LOGGER.warning("Job %s timed out: %s", job_id, exc)
+            job.status.status = "failed"
+            job.status.error = str(exc)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.exception("Job %s failed: %s", job_id, exc)
+            job.status.status = "failed"
+            job.status.error = str(exc) if isinstance(exc, FileNotFoundError) else "generation failed"
+        else:
+            job.status.status = "succeeded"
+            job.status.images = images
+            if job.status.total_steps is not None:
+                job.status.step = job.status.total_steps
+        job.status.queue_position = None
+        self._publish(job)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.settings.job_ttl_seconds
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status.status in _TERMINAL and job.status.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,148 @@
+"""Keep LoRA adapters resident on the pipeline and switch them by name."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Mapping, Sequence
+
+from .catalog import Catalog
+from .config import Settings, get_settings
+from .lru import LRUCache
+from .schemas import LoraCacheStats
+
+LOGGER = logging.getLogger(__name__)
+
+_ADAPTER_NAME_PATTERN = re.compile(r"[^0-9A-Za-z_]")
+
+
+def adapter_name_for(lora_name: str) -> str:
+    """PEFT adapter names end up as module keys, so dots and dashes are not allowed.
+
+    Sanitizing alone would map ``oni.safetensors``/``oni.pt`` or ``oni-v1``/``oni_v1``
+    to the same name, so a short hash of the full file name keeps them apart.
+    """
+    digest = hashlib.sha1(lora_name.encode("utf-8")).hexdigest()[:8]
+    return f"lora_{_ADAPTER_NAME_PATTERN.sub('_', Path(lora_name).stem)}_{digest}"
+
+
+class LoraAdapterCache:
+    """Loads each LoRA file once as a named adapter and activates subsets per request.
+
+    Resident adapters are tracked in an LRU bounded by ``lora_cache_budget_mb``
+    (file size is used as the memory estimate). Adapters needed by the current
+    request are never evicted, even if that means temporarily going over budget.
+    Each adapter remembers the content hash it was loaded from, so a file
+    replaced under the same name is reloaded instead of served stale.
+    """
+
+    def __init__(
+        self,
+        settings: Settings | None = None,
+        model: str | None = None,
+        catalog: Catalog | None = None,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self.model = model
+        self.catalog = catalog or Catalog(self.settings)
+        self._lock = threading.Lock()
+        self._pipe: Any = None
+        self._adapters: LRUCache[str, str] = LRUCache(
+            max_bytes=self.settings.lora_cache_budget_mb * 1024 * 1024,
+            on_evict=self._unload,
+        )
+        self._digests: dict[str, str] = {}
+        self._active: tuple[tuple[str, float, str], ...] = ()
+        self._enabled = True
+
+    def _unload(self, lora_name: str, adapter: str) -> None:
+        LOGGER.info("Evicting LoRA adapter %s (%s)", adapter, lora_name)
+        self._digests.pop(lora_name, None)
+        try:
+            self._pipe.delete_adapters(adapter)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.warning("Failed to delete LoRA adapter %s: %s", adapter, exc)
+
+    def reset(self) -> None:
+        """Forget all adapters, e.g. after the pipeline itself was replaced."""
+        with self._lock:
+            self._adapters.clear()
+            self._digests.clear()
+            self._active = ()
+            self._enabled = True
+            self._pipe = None
+
+    def activate(self, pipe: Any, names: Sequence[str], scales: Mapping[str, float] | None = None) -> None:
+        """Make exactly ``names`` active on ``pipe`` with the given per-adapter scales."""
+        scales = scales or {}
+        # Only a stat per file once hashed; the hash itself is computed on first use.
+        digests = {name: self.catalog.lora_digest(name) for name in names}
+        wanted = tuple((name, float(scales.get(name, 1.0)), digests[name]) for name in names)
+        with self._lock:
+            if pipe is not self._pipe:
+                if self._pipe is not None:
+                    self._adapters.clear()
+                    self._digests.clear()
+                self._pipe = pipe
+                self._active = ()
+            if wanted == self._active:
+                for name in names:
+                    self._adapters.get(name)
+                return
+
+            adapters: list[str] = []
+            for name in names:
+                adapter = self._adapters.get(name)
+                if adapter is not None and self._digests.get(name) != digests[name]:
+                    LOGGER.info("LoRA file %s changed on disk; reloading", name)
+                    self._adapters.pop(name)
+                    self._unload(name, adapter)
+                    adapter = None
+                if adapter is None:
+                    adapter = self._load(pipe, name, pinned=names)
+                    self._digests[name] = digests[name]
+                adapters.append(adapter)
+
+            if not adapters:
+                # Nothing resident means no LoRA layers exist to disable.
+                if self._enabled and len(self._adapters):
+                    pipe.disable_lora()
+                    self._enabled = False
+            else:
+                if not self._enabled:
+                    pipe.enable_lora()
+                    self._enabled = True
+                pipe.set_adapters(adapters, adapter_weights=[weight for _, weight, _ in wanted])
+            self._active = wanted
+
+    def _load(self, pipe: Any, name: str, pinned: Sequence[str]) -> str:
+        lora_path = self.settings.lora_dir / name
+        if not lora_path.exists():
+            raise FileNotFoundError(f"LoRA weight not found: {lora_path}")
+        adapter = adapter_name_for(name)
+        size = lora_path.stat().st_size
+        # Make room first so the new weights never coexist with evictees.
+        self._adapters.put(name, adapter, size=size, pinned=pinned)
+        LOGGER.info("Loading LoRA adapter %s from %s", adapter, lora_path)
+        try:
+            pipe.load_lora_weights(lora_path, adapter_name=adapter)
+        except Exception:
+            self._adapters.pop(name)
+            raise
+        return adapter
+
+    def stats(self) -> LoraCacheStats:
+        with self._lock:
+            return LoraCacheStats(
+                model=self.model,
+                hits=self._adapters.hits,
+                misses=self._adapters.misses,
+                evictions=self._adapters.evictions,
+                resident={name: size for name, _adapter, size in self._adapters.items()},
+                resident_bytes=self._adapters.total_bytes,
+                budget_bytes=self._adapters.max_bytes or 0,
+                active=[name for name, _weight, _digest in self._active],
+            )
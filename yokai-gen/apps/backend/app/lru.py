@@ -0,0 +1,109 @@
+"""Small thread-safe LRU map with item/byte budgets and hit/miss counters."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Least-recently-used cache bounded by entry count and/or total size.
+
+    ``on_evict`` runs for every entry dropped to make room, which lets callers
+    release resources (GPU adapters, files) that the value refers to.
+    """
+
+    def __init__(
+        self,
+        max_items: int | None = None,
+        max_bytes: int | None = None,
+        on_evict: Callable[[K, V], None] | None = None,
+    ) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._on_evict = on_evict
+        self._data: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key: K) -> V | None:
+        """Read without touching recency or counters."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def put(self, key: K, value: V, size: int = 0, pinned: Iterable[K] = ()) -> None:
+        """Insert ``value`` and evict older entries (never ``pinned`` ones) to fit."""
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= self._data.pop(key)[1]
+            self._make_room(size, set(pinned) | {key})
+            self._data[key] = (value, size)
+            self.total_bytes += size
+
+    def reserve(self, size: int, pinned: Iterable[K] = ()) -> None:
+        """Evict ahead of an insert whose value is expensive to build (e.g. a model load)."""
+        with self._lock:
+            self._make_room(size, set(pinned))
+
+    def pop(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self.total_bytes -= entry[1]
+            return entry[0]
+
+    def items(self) -> list[tuple[K, V, int]]:
+        """Entries from least to most recently used."""
+        with self._lock:
+            return [(key, value, size) for key, (value, size) in self._data.items()]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def _over_budget(self, incoming: int) -> bool:
+        if self.max_items is not None and len(self._data) + 1 > self.max_items:
+            return True
+        if self.max_bytes is not None and self.total_bytes + incoming > self.max_bytes:
+            return True
+        return False
+
+    def _make_room(self, incoming: int, pinned: set[K]) -> None:
+        for key in list(self._data):
+            if not self._over_budget(incoming):
+                return
+            if key in pinned:
+                continue
+            value, size = self._data.pop(key)
+            self.total_bytes -= size
+            self.evictions += 1
+            if self._on_evict is not None:
+                self._on_evict(key, value)
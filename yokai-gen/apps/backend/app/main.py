@@ -3,31 +3,67 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
-from typing import Any
+from typing import Any, AsyncIterator
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 
+from .batching import DeadlineExceeded, GenerationBatcher, QueueFullError, QueueTicket
+from .catalog import catalog
 from .config import get_settings
-from .pipeline import pipeline_manager
+from .edits import prepare_edit
+from .encoding import finalize_images
+from .feature_store import flush_all as flush_feature_stores
+from .image_store import image_store
+from .jobs import JobStore
+from .metrics import ERRORS_TOTAL, REGISTRY, register_runtime_metrics
+from .params import accept_request, validate_request
 from .schemas import (
+    AcceptRequest,
     GenerationRequest,
     GenerationResponse,
     HealthResponse,
+    ImageEditRequest,
+    JobStatus,
+    LoraCacheStats,
     LoraInfo,
     ModelInfo,
+    PromptCacheStats,
     PublishRequest,
     PublishResponse,
+    QueueStats,
+    ResultCacheStats,
 )
 from .publisher import publish_yokai
-from .storage import list_base_models, list_lora_weights
+from .result_cache import ResultCache
 
 LOGGER = logging.getLogger(__name__)
 
+# How often a waiting /generate checks whether its client went away.
+DISCONNECT_POLL_SECONDS = 0.5
 
-def create_app() -> FastAPI:
+
+def create_app(manager: Any | None = None) -> FastAPI:
+    """Build the API around ``manager`` (the torch ``pipeline_manager`` by default).
+
+    Anything with the ``PipelineManager`` surface works, which is how the
+    benchmark harness serves a stub pipeline without torch or model weights.
+    """
     settings = get_settings()
+    if manager is None:
+        from .pipeline import pipeline_manager as manager
+    result_cache = ResultCache(settings)
+    batcher = GenerationBatcher(
+        manager.generate_batch,
+        settings,
+        finalizer=finalize_images,
+        cache=result_cache,
+    )
+    jobs = JobStore(batcher, settings)
+    register_runtime_metrics(batcher, result_cache, manager)
     app = FastAPI(title="Yokai Diffusers Backend", version="0.1.0")
     app.add_middleware(
         CORSMiddleware,
@@ -35,37 +71,310 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Queue-Position", "Retry-After"],
     )
 
+    async def _warmup() -> None:
+        LOGGER.info("warming up pipeline...")
+        try:
+            await batcher.run_exclusive(manager.warmup)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.exception("Pipeline warmup failed: %s", exc)
+        else:
+            LOGGER.info("pipeline ready")
+
     @app.on_event("startup")
     async def _startup() -> None:
-        loop = asyncio.get_event_loop()
-        LOGGER.info("warming up pipeline...")
-        await loop.run_in_executor(None, pipeline_manager.ensure_pipeline)
+        # Warm up in the background so /health answers while the model loads;
+        # requests that arrive meanwhile queue behind the warmup on the pipeline thread.
+        app.state.warmup_task = asyncio.create_task(_warmup())
+
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        await batcher.stop()
+        flush_feature_stores()
+
+    def _health() -> HealthResponse:
+        return HealthResponse(
+            status="ok",
+            device=manager.device.type,
+            ready=manager.ready,
+            pipeline_state=manager.state,
+            detail=manager.state_detail,
+        )
 
     @app.get("/health", response_model=HealthResponse)
     async def health() -> HealthResponse:
-        return HealthResponse(status="ok", device=pipeline_manager.device.type)
+        """Liveness: the process is up, whether or not the model is loaded yet."""
+        return _health()
+
+    @app.get("/ready", response_model=HealthResponse)
+    async def ready() -> JSONResponse:
+        """Readiness: 200 once the pipeline is loaded and warmed up, 503 before."""
+        body = _health()
+        return JSONResponse(body.model_dump(), status_code=200 if body.ready else 503)
 
     @app.get("/models", response_model=list[ModelInfo])
     async def models() -> list[ModelInfo]:
-        return [ModelInfo(name=path.name, path=path) for path in list_base_models()]
+        return [
+            ModelInfo(
+                name=entry.name,
+                path=entry.path,
+                default=catalog.is_default(entry),
+                resident=manager.residency(entry.path),
+                size_bytes=entry.size,
+                pipeline_class=entry.pipeline_class,
+            )
+            for entry in catalog.models()
+        ]
 
     @app.get("/lora", response_model=list[LoraInfo])
-    async def lora() -> list[LoraInfo]:
-        return [LoraInfo(name=path.name, path=path) for path in list_lora_weights()]
+    async def lora(hash: bool = False) -> list[LoraInfo]:
+        """Cached LoRA catalog; ``hash=true`` computes missing content hashes first."""
+        if hash:
+            loop = asyncio.get_running_loop()
+            for entry in catalog.loras():
+                if entry.sha256 is None:
+                    try:
+                        await loop.run_in_executor(None, catalog.lora_digest, entry.name)
+                    except FileNotFoundError:
+                        continue
+        infos = []
+        for entry in catalog.loras():
+            meta = entry.metadata
+            infos.append(
+                LoraInfo(
+                    name=entry.name,
+                    path=entry.path,
+                    size_bytes=entry.size,
+                    sha256=entry.sha256,
+                    base_model=meta.base_model if meta else None,
+                    sdxl=meta.sdxl if meta else None,
+                    rank=meta.rank if meta else None,
+                    alpha=meta.alpha if meta else None,
+                    trigger_words=list(meta.trigger_words) if meta else [],
+                )
+            )
+        return infos
 
-    @app.post("/generate", response_model=GenerationResponse)
-    async def generate(payload: GenerationRequest) -> GenerationResponse:
-        loop = asyncio.get_event_loop()
+    @app.get("/lora/cache", response_model=list[LoraCacheStats])
+    async def lora_cache() -> list[LoraCacheStats]:
+        """Adapter cache per resident base model."""
+        return manager.lora_cache_stats()
+
+    async def _watch_disconnect(http_request: Request, future: asyncio.Future[Any]) -> None:
+        while not future.done():
+            if await http_request.is_disconnected():
+                LOGGER.info("Client disconnected; cancelling its generation")
+                batcher.cancel(future, reason="disconnected")
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    def _validate(payload: GenerationRequest) -> None:
+        try:
+            validate_request(payload, settings)
+        except ValueError as exc:
+            raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+    async def _admit(payload: GenerationRequest, stream: bool = False) -> QueueTicket:
+        _validate(payload)
         try:
-            images = await loop.run_in_executor(None, pipeline_manager.generate, payload)
+            return await batcher.enqueue(payload, stream=stream)
+        except QueueFullError as exc:
+            raise HTTPException(
+                status_code=429,
+                detail=str(exc),
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from exc
+
+    async def _generate(payload: GenerationRequest, response: Response, http_request: Request) -> GenerationResponse:
+        ticket = await _admit(payload)
+        response.headers["X-Queue-Position"] = str(ticket.position)
+        watcher = asyncio.create_task(_watch_disconnect(http_request, ticket.future))
+        try:
+            images = await ticket.future
+        except asyncio.CancelledError:
+            if not ticket.future.cancelled():
+                # The handler itself was cancelled (server shutdown or disconnect).
+                batcher.cancel(ticket.future, reason="disconnected")
+                raise
+            # Nginx's "client closed request"; nobody is left to read it.
+            raise HTTPException(status_code=499, detail="generation cancelled") from None
+        except DeadlineExceeded as exc:
+            raise HTTPException(status_code=504, detail=str(exc)) from exc
         except FileNotFoundError as exc:
             raise HTTPException(status_code=404, detail=str(exc)) from exc
         except Exception as exc:  # noqa: BLE001
             LOGGER.exception("Generation failed: %s", exc)
             raise HTTPException(status_code=500, detail="generation failed") from exc
-        return GenerationResponse(images=images)
+        finally:
+            watcher.cancel()
+        return GenerationResponse(images=images, queue_position=ticket.position, cached=ticket.cached)
+
+    def _ndjson(event: dict[str, Any]) -> str:
+        return json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    async def _generate_stream(payload: GenerationRequest) -> StreamingResponse:
+        ticket = await _admit(payload, stream=True)
+        assert ticket.images is not None
+        images = ticket.images
+
+        async def events() -> AsyncIterator[str]:
+            try:
+                yield _ndjson({"event": "queued", "queue_position": ticket.position, "cached": ticket.cached})
+                count = 0
+                while (entry := await images.get()) is not None:
+                    index, image = entry
+                    yield _ndjson({"event": "image", "index": index, "image": image.model_dump(mode="json")})
+                    count += 1
+                if ticket.future.cancelled():
+                    yield _ndjson({"event": "error", "status": 499, "detail": "generation cancelled"})
+                    return
+                try:
+                    ticket.future.result()
+                except DeadlineExceeded as exc:
+                    yield _ndjson({"event": "error", "status": 504, "detail": str(exc)})
+                except FileNotFoundError as exc:
+                    yield _ndjson({"event": "error", "status": 404, "detail": str(exc)})
+                except Exception as exc:  # noqa: BLE001
+                    LOGGER.exception("Generation failed: %s", exc)
+                    yield _ndjson({"event": "error", "status": 500, "detail": "generation failed"})
+                else:
+                    yield _ndjson({"event": "done", "count": count})
+            finally:
+                # The body iterator is closed early when the client goes away.
+                batcher.cancel(ticket.future, reason="disconnected")
+
+        return StreamingResponse(
+            events(),
+            media_type="application/x-ndjson",
+            headers={"X-Queue-Position": str(ticket.position), "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.post("/generate", response_model=GenerationResponse)
+    async def generate(
+        payload: GenerationRequest,
+        response: Response,
+        http_request: Request,
+        stream: bool = False,
+    ) -> GenerationResponse | StreamingResponse:
+        """Generate images; ``?stream=true`` answers with NDJSON events instead.
+
+        Events are ``queued``, one ``image`` per line as soon as it is encoded
+        (in completion order; ``index`` is its position in the request), then
+        ``done`` or ``error``. The blocking form only sends its headers
+        (``X-Queue-Position`` included) with the finished images, so callers
+        that want the position while waiting use the stream or ``POST /jobs``.
+        """
+        if stream:
+            return await _generate_stream(payload)
+        return await _generate(payload, response, http_request)
+
+    async def _edit(
+        payload: ImageEditRequest,
+        response: Response,
+        http_request: Request,
+        inpaint: bool,
+    ) -> GenerationResponse:
+        loop = asyncio.get_running_loop()
+        try:
+            request = await loop.run_in_executor(None, prepare_edit, payload, image_store, inpaint)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=404, detail=str(exc)) from exc
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return await _generate(request, response, http_request)
+
+    @app.post("/img2img", response_model=GenerationResponse)
+    async def img2img(payload: ImageEditRequest, response: Response, http_request: Request) -> GenerationResponse:
+        """Refine an existing image (default strength: Settings.img2img_strength)."""
+        return await _edit(payload, response, http_request, inpaint=False)
+
+    @app.post("/inpaint", response_model=GenerationResponse)
+    async def inpaint(payload: ImageEditRequest, response: Response, http_request: Request) -> GenerationResponse:
+        """Repaint the white area of the mask, or the transparent area of an RGBA init image."""
+        return await _edit(payload, response, http_request, inpaint=True)
+
+    @app.post("/accept", response_model=GenerationResponse)
+    async def accept(payload: AcceptRequest, response: Response, http_request: Request) -> GenerationResponse:
+        """Upscale an accepted preview: img2img from it at full size and step count."""
+        if image_store.get(payload.image_id) is None:
+            raise HTTPException(status_code=404, detail=f"image not found or expired: {payload.image_id}")
+        return await _generate(accept_request(payload, settings), response, http_request)
+
+    @app.post("/jobs", response_model=JobStatus, status_code=202)
+    async def create_job(payload: GenerationRequest) -> JobStatus:
+        _validate(payload)
+        try:
+            return await jobs.submit(payload)
+        except QueueFullError as exc:
+            raise HTTPException(
+                status_code=429,
+                detail=str(exc),
+                headers={"Retry-After": str(exc.retry_after)},
+            ) from exc
+
+    @app.get("/jobs/{job_id}", response_model=JobStatus)
+    async def get_job(job_id: str) -> JobStatus:
+        status = jobs.get(job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"job not found: {job_id}")
+        return status
+
+    @app.delete("/jobs/{job_id}", response_model=JobStatus)
+    async def cancel_job(job_id: str) -> JobStatus:
+        """Cancel a queued job, or stop a running one at the next denoising step."""
+        status = await jobs.cancel(job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"job not found: {job_id}")
+        return status
+
+    @app.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str) -> StreamingResponse:
+        if jobs.get(job_id) is None:
+            raise HTTPException(status_code=404, detail=f"job not found: {job_id}")
+
+        async def stream() -> AsyncIterator[str]:
+            async for status in jobs.events(job_id):
+                if status is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {status.status}\ndata: {status.model_dump_json()}\n\n"
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/queue", response_model=QueueStats)
+    async def queue() -> QueueStats:
+        return batcher.stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics() -> PlainTextResponse:
+        """Prometheus text exposition of stage timings, cache counters and memory gauges."""
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    @app.get("/cache/prompts", response_model=PromptCacheStats)
+    async def prompt_cache_stats() -> PromptCacheStats:
+        return manager.prompt_cache.stats()
+
+    @app.get("/cache/results", response_model=ResultCacheStats)
+    async def result_cache_stats() -> ResultCacheStats:
+        return result_cache.stats()
+
+    @app.get("/images/{image_id}")
+    async def image(image_id: str) -> FileResponse:
+        stored = image_store.get(image_id)
+        if stored is None:
+            raise HTTPException(status_code=404, detail=f"image not found or expired: {image_id}")
+        # Content-addressed, so the bytes behind an id never change.
+        return FileResponse(
+            stored.path,
+            media_type=stored.media_type,
+            headers={"Cache-Control": f"public, max-age={settings.image_store_ttl_seconds}, immutable"},
+        )
 
     @app.post("/publish", response_model=PublishResponse)
     async def publish(payload: PublishRequest) -> PublishResponse:
@@ -74,12 +383,22 @@ def create_app() -> FastAPI:
             return await loop.run_in_executor(None, publish_yokai, payload)
         except FileNotFoundError as exc:
             raise HTTPException(status_code=404, detail=str(exc)) from exc
+        except ValueError as exc:
+            # Undecodable base64 or an image PIL cannot read.
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
         except Exception as exc:  # noqa: BLE001
+            ERRORS_TOTAL.inc(stage="publish", model=payload.model or "")
             LOGGER.exception("Publish failed: %s", exc)
             raise HTTPException(status_code=500, detail="publish failed") from exc
 
     return app
 
 
-app = create_app()
+def __getattr__(name: str) -> Any:
+    # ``app`` is built on first access (uvicorn's ``main:app``) so importing
+    # ``create_app`` alone does not pull in torch and diffusers.
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
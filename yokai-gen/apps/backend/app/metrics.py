@@ -0,0 +1,330 @@
+"""Minimal Prometheus text-format metrics (counters, gauges, histograms)."""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Mapping
+
+if TYPE_CHECKING:
+    from .batching import GenerationBatcher
+    from .result_cache import ResultCache
+
+LabelValues = tuple[str, ...]
+
+# Seconds; spans sub-step timings up to multi-minute CPU generations.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_SIZE_BUCKETS_MP = (0.25, 0.5, 1.0, 1.5, 2.4)
+
+
+def size_bucket(width: int, height: int) -> str:
+    """Coarse megapixel label so per-size series stay few (e.g. ``le_1mp``)."""
+    megapixels = width * height / 1_000_000
+    for limit in _SIZE_BUCKETS_MP:
+        if megapixels <= limit * 1.05:
+            return f"le_{limit:g}mp"
+    return "gt_2.4mp"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Mapping[str, object]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose samples are read from ``fn`` at scrape time.
+
+    Used for state that already has its own counters (cache stats, queue depth).
+    ``fn`` returns label-value tuples mapped to values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Mapping[LabelValues, float]],
+        labelnames: tuple[str, ...] = (),
+        kind: str = "gauge",
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self._fn = fn
+
+    def _samples(self) -> list[str]:
+        try:
+            values = self._fn()
+        except Exception:  # noqa: BLE001
+            # A failing source must not break the whole scrape.
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[idx] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines: list[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add ``metric``; re-registering a name replaces the old one (app reloads, tests)."""
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Mapping[LabelValues, float]],
+        labelnames: tuple[str, ...] = (),
+        kind: str = "gauge",
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, labelnames, kind))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "yokai_queue_wait_seconds",
+    "Time from admission until the request's batch started.",
+    ("model", "size"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "yokai_stage_seconds",
+    "Time per batch spent in each pipeline stage (lora_apply, text_encode, denoise, vae_decode, image_encode).",
+    ("stage", "model", "size"),
+)
+DENOISE_STEP_SECONDS = REGISTRY.histogram(
+    "yokai_denoise_step_seconds",
+    "Duration of a single denoising step for a whole batch.",
+    ("model", "size"),
+)
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "yokai_publish_seconds",
+    "Time to write a published image, thumbnail and places.json entry.",
+    ("model", "size"),
+)
+ERRORS_TOTAL = REGISTRY.counter(
+    "yokai_errors_total",
+    "Failures by stage, labelled like the latency metrics (size is empty for publish failures before decoding).",
+    ("stage", "model", "size"),
+)
+CANCELLED_TOTAL = REGISTRY.counter(
+    "yokai_cancelled_total",
+    "Requests abandoned before finishing, by reason (cancelled, disconnected, deadline).",
+    ("reason",),
+)
+
+
+def _process_rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return 0.0
+    return float(pages * os.sysconf("SC_PAGE_SIZE"))
+
+
+def register_runtime_metrics(batcher: GenerationBatcher, result_cache: ResultCache, manager: Any) -> None:
+    """Expose existing queue/cache counters and memory state, read at scrape time.
+
+    ``manager`` is the ``PipelineManager`` (kept untyped so this module stays
+    importable without torch).
+    """
+
+    def cache_requests() -> dict[LabelValues, float]:
+        values: dict[LabelValues, float] = {}
+        results = result_cache.stats()
+        prompts = manager.prompt_cache.stats()
+        for cache, hits, misses in (
+            ("result", results.hits, results.misses),
+            ("prompt", prompts.hits, prompts.misses),
+        ):
+            values[(cache, "hit")] = hits
+            values[(cache, "miss")] = misses
+        for lora in manager.lora_cache_stats():
+            key_hit, key_miss = ("lora", "hit"), ("lora", "miss")
+            values[key_hit] = values.get(key_hit, 0) + lora.hits
+            values[key_miss] = values.get(key_miss, 0) + lora.misses
+        return values
+
+    def resident_models() -> dict[LabelValues, float]:
+        stats = manager.registry.stats()
+        return {("device",): len(stats.device), ("cpu",): len(stats.offloaded)}
+
+    def model_residency() -> dict[LabelValues, float]:
+        stats = manager.registry.stats()
+        return {
+            ("loads",): stats.loads,
+            ("device_hits",): stats.device_hits,
+            ("offload_hits",): stats.offload_hits,
+            ("offloads",): stats.offloads,
+            ("releases",): stats.releases,
+        }
+
+    def device_memory() -> dict[LabelValues, float]:
+        return {(kind,): value for kind, value in manager.device_memory().items()}
+
+    REGISTRY.callback(
+        "yokai_cache_requests_total",
+        "Cache lookups by cache and outcome.",
+        cache_requests,
+        ("cache", "result"),
+        kind="counter",
+    )
+    REGISTRY.callback("yokai_resident_models", "Loaded base models by tier.", resident_models, ("tier",))
+    REGISTRY.callback(
+        "yokai_model_registry_events_total",
+        "Model loads, promotions and evictions.",
+        model_residency,
+        ("event",),
+        kind="counter",
+    )
+    REGISTRY.callback("yokai_device_memory_bytes", "Accelerator memory.", device_memory, ("kind",))
+    REGISTRY.callback(
+        "yokai_process_resident_memory_bytes",
+        "Resident set size of the backend process.",
+        lambda: {(): _process_rss_bytes()},
+    )
+    REGISTRY.callback("yokai_queue_depth", "Requests waiting for a batch.", lambda: {(): batcher.queue_depth})
+    REGISTRY.callback(
+        "yokai_images_generated_total",
+        "Images produced by the pipeline.",
+        lambda: {(): batcher.stats().images_run},
+        kind="counter",
+    )
@@ -0,0 +1,222 @@
+"""LRU residency for several base-model pipelines in one process."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Generic, Iterable, TypeVar
+
+from .config import Settings, get_settings
+from .lru import LRUCache
+
+LOGGER = logging.getLogger(__name__)
+
+M = TypeVar("M")
+
+# Components that SDXL fine-tunes frequently leave untouched and that can be
+# handed to ``from_pretrained`` as already-loaded modules.
+SHAREABLE_COMPONENTS = ("text_encoder", "text_encoder_2", "tokenizer", "tokenizer_2", "vae")
+# LoRA files patch PEFT layers into these, and each model's adapter cache owns
+# that state, so they must not be shared while LoRAs can be applied.
+LORA_PATCHED_COMPONENTS = ("text_encoder", "text_encoder_2")
+_SAMPLE_BYTES = 1024 * 1024
+
+
+@dataclass
+class RegistryHooks(Generic[M]):
+    """How the registry materializes and moves models; kept abstract so tests need no torch."""
+
+    estimate: Callable[[str], int]
+    load: Callable[[str], M]
+    to_device: Callable[[M], None]
+    offload: Callable[[M], None]
+    release: Callable[[M], None]
+
+
+@dataclass
+class RegistryStats:
+    loads: int = 0
+    device_hits: int = 0
+    offload_hits: int = 0
+    offloads: int = 0
+    releases: int = 0
+    device: list[str] = field(default_factory=list)
+    offloaded: list[str] = field(default_factory=list)
+
+
+class ModelRegistry(Generic[M]):
+    """Keeps up to ``max_resident_models`` models on the device and a second tier offloaded.
+
+    The device tier is also bounded by ``model_memory_budget_mb`` (0 = no byte
+    limit). Models pushed out of it are offloaded to CPU RAM when
+    ``model_eviction == "cpu"`` (and the device is an accelerator), otherwise
+    released; models pushed out of the CPU tier are released and reloaded from
+    disk on next use. Room is made *before* loading so two large models never
+    sit on the device at once.
+    """
+
+    def __init__(self, hooks: RegistryHooks[M], settings: Settings | None = None, can_offload: bool = True) -> None:
+        self.settings = settings or get_settings()
+        self.hooks = hooks
+        self.can_offload = can_offload and self.settings.model_eviction == "cpu"
+        budget = self.settings.model_memory_budget_mb * 1024 * 1024
+        self._device: LRUCache[str, M] = LRUCache(
+            max_items=max(1, self.settings.max_resident_models),
+            max_bytes=budget or None,
+            on_evict=self._demote,
+        )
+        self._offloaded: LRUCache[str, M] = LRUCache(
+            max_items=max(0, self.settings.max_offloaded_models) if self.can_offload else 0,
+            on_evict=self._release,
+        )
+        self._sizes: dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._stats = RegistryStats()
+
+    def _demote(self, name: str, model: M) -> None:
+        if self.can_offload and (self._offloaded.max_items or 0) > 0:
+            LOGGER.info("Offloading model %s to CPU", name)
+            self.hooks.offload(model)
+            self._stats.offloads += 1
+            self._offloaded.put(name, model, size=self._sizes.get(name, 0))
+        else:
+            self._release(name, model)
+
+    def _release(self, name: str, model: M) -> None:
+        LOGGER.info("Releasing model %s", name)
+        self._stats.releases += 1
+        self.hooks.release(model)
+
+    def acquire(self, name: str) -> M:
+        """Return model ``name`` resident on the device, loading or promoting it if needed."""
+        with self._lock:
+            model = self._device.peek(name)
+            if model is not None:
+                self._device.get(name)
+                self._stats.device_hits += 1
+                return model
+
+            size = self._sizes.get(name)
+            if size is None:
+                size = self.hooks.estimate(name)
+                self._sizes[name] = size
+            # Take it out of the CPU tier first so the demotion below cannot evict it.
+            model = self._offloaded.pop(name)
+            self._device.reserve(size, pinned=[name])
+            if model is not None:
+                LOGGER.info("Moving model %s back to the device", name)
+                self.hooks.to_device(model)
+                self._stats.offload_hits += 1
+            else:
+                model = self.hooks.load(name)
+                self._stats.loads += 1
+            self._device.put(name, model, size=size, pinned=[name])
+            return model
+
+    def peek(self, name: str) -> M | None:
+        with self._lock:
+            return self._device.peek(name) or self._offloaded.peek(name)
+
+    def residency(self, name: str) -> str | None:
+        with self._lock:
+            if name in self._device:
+                return "device"
+            if name in self._offloaded:
+                return "cpu"
+            return None
+
+    def device_models(self) -> list[tuple[str, M]]:
+        with self._lock:
+            return [(name, model) for name, model, _size in self._device.items()]
+
+    def loaded_models(self) -> list[tuple[str, M]]:
+        with self._lock:
+            offloaded = [(name, model) for name, model, _size in self._offloaded.items()]
+            return self.device_models() + offloaded
+
+    def stats(self) -> RegistryStats:
+        with self._lock:
+            return RegistryStats(
+                loads=self._stats.loads,
+                device_hits=self._stats.device_hits,
+                offload_hits=self._stats.offload_hits,
+                offloads=self._stats.offloads,
+                releases=self._stats.releases,
+                device=[name for name, _model, _size in self._device.items()],
+                offloaded=[name for name, _model, _size in self._offloaded.items()],
+            )
+
+
+def detect_variant(model_path: Path) -> str | None:
+    """Prefer fp16 weights when they exist (e.g. downloaded as ``*.fp16.safetensors``)."""
+    fp16_unet = model_path / "unet" / "diffusion_pytorch_model.fp16.safetensors"
+    return "fp16" if fp16_unet.exists() else None
+
+
+def _weight_files(component_dir: Path, variant: str | None) -> list[Path]:
+    weights = [p for p in component_dir.iterdir() if p.suffix in (".safetensors", ".bin")]
+    if variant:
+        preferred = [p for p in weights if f".{variant}." in p.name]
+        return preferred or weights
+    return [p for p in weights if p.name.count(".") == 1] or weights
+
+
+def estimate_model_bytes(model_path: Path, variant: str | None = None, skip: Iterable[str] = ()) -> int:
+    """Sum weight file sizes under a diffusers model dir, ignoring components in ``skip``."""
+    skipped = set(skip)
+    total = 0
+    for component in model_path.iterdir():
+        if component.is_dir() and component.name not in skipped:
+            total += sum(p.stat().st_size for p in _weight_files(component, variant))
+    return total
+
+
+def _sample_digest(path: Path, digest: Any) -> None:
+    size = path.stat().st_size
+    digest.update(f"{path.name}:{size}".encode())
+    with path.open("rb") as fh:
+        digest.update(fh.read(_SAMPLE_BYTES))
+        if size > 2 * _SAMPLE_BYTES:
+            fh.seek(-_SAMPLE_BYTES, 2)
+            digest.update(fh.read(_SAMPLE_BYTES))
+
+
+def shareable_components(lora_enabled: bool) -> tuple[str, ...]:
+    """Components resident models may share; the text encoders only when no LoRA can touch them."""
+    if not lora_enabled:
+        return SHAREABLE_COMPONENTS
+    return tuple(name for name in SHAREABLE_COMPONENTS if name not in LORA_PATCHED_COMPONENTS)
+
+
+def component_fingerprints(
+    model_path: Path,
+    variant: str | None = None,
+    components: Iterable[str] = SHAREABLE_COMPONENTS,
+) -> dict[str, str]:
+    """Cheap identity for each shareable component of a diffusers model dir.
+
+    Configs and tokenizer files are hashed in full; weight files by size plus
+    their first and last MiB, which is enough to tell a fine-tuned encoder
+    from the base one without reading gigabytes at startup.
+    """
+    fingerprints: dict[str, str] = {}
+    for name in components:
+        component = model_path / name
+        if not component.is_dir():
+            continue
+        digest = hashlib.sha256()
+        weights = set(_weight_files(component, variant))
+        for path in sorted(component.iterdir()):
+            if not path.is_file():
+                continue
+            if path.suffix in (".safetensors", ".bin"):
+                if path in weights:
+                    _sample_digest(path, digest)
+            else:
+                digest.update(path.name.encode())
+                digest.update(path.read_bytes())
+        fingerprints[name] = digest.hexdigest()
+    return fingerprints
@@ -0,0 +1,111 @@
+"""Resolve per-request generation parameters against settings and quality tiers."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from .config import Settings
+from .metrics import size_bucket
+from .schemas import AcceptRequest, GenerationRequest
+from .storage import default_model_path
+
+
+@dataclass(frozen=True)
+class ResolvedParams:
+    """What the pipeline actually runs with once defaults and the quality tier apply."""
+
+    model: str
+    scheduler: str
+    steps: int
+    guidance: float
+    width: int
+    height: int
+    strength: float | None
+
+
+def uses_lcm_lora(request: GenerationRequest, settings: Settings) -> bool:
+    """Whether the request applies one of the LoRA files listed in ``Settings.lcm_loras``."""
+    return any(name in settings.lcm_loras for name in request.lora)
+
+
+def validate_request(request: GenerationRequest, settings: Settings) -> None:
+    """Reject parameter combinations that cannot produce a usable image (raises ``ValueError``)."""
+    if request.scheduler == "lcm" and not uses_lcm_lora(request, settings):
+        raise ValueError(
+            "scheduler 'lcm' needs an LCM-LoRA in lora (one of Settings.lcm_loras: "
+            f"{', '.join(settings.lcm_loras) or 'none configured'})"
+        )
+
+
+def _preview_size(size: int, scale: float) -> int:
+    return max(256, int(size * scale) // 64 * 64)
+
+
+def resolve_params(request: GenerationRequest, settings: Settings) -> ResolvedParams:
+    preview = request.quality == "preview"
+    if request.scheduler:
+        scheduler = request.scheduler
+    elif uses_lcm_lora(request, settings):
+        scheduler = "lcm"
+    else:
+        scheduler = settings.preview_scheduler if preview else settings.scheduler
+
+    if request.steps:
+        steps = request.steps
+    elif scheduler == "lcm":
+        steps = settings.lcm_steps
+    else:
+        steps = settings.preview_steps if preview else settings.inference_steps
+    steps = min(steps, settings.max_inference_steps)
+
+    if request.guidance_scale is not None:
+        guidance = request.guidance_scale
+    else:
+        guidance = settings.lcm_guidance_scale if scheduler == "lcm" else settings.guidance_scale
+
+    width = request.width or settings.width
+    height = request.height or settings.height
+    if preview:
+        width = _preview_size(width, settings.preview_scale)
+        height = _preview_size(height, settings.preview_scale)
+
+    strength = None
+    if request.init_image_id is not None:
+        default_strength = settings.inpaint_strength if request.mask_image_id else settings.img2img_strength
+        strength = request.strength or default_strength
+
+    return ResolvedParams(
+        model=request.model or default_model_path(settings).name,
+        scheduler=scheduler,
+        steps=steps,
+        guidance=guidance,
+        width=width,
+        height=height,
+        strength=strength,
+    )
+
+
+def metric_labels(request: GenerationRequest, settings: Settings) -> dict[str, str]:
+    """``model`` and ``size`` labels shared by the per-stage metrics."""
+    params = resolve_params(request, settings)
+    return {"model": params.model, "size": size_bucket(params.width, params.height)}
+
+
+def accept_request(accept: AcceptRequest, settings: Settings) -> GenerationRequest:
+    """Full-quality img2img request that refines an accepted preview.
+
+    The preview's width/height were already the full-size target, and a
+    scheduler or step count picked by the tier (not the user) is reset so the
+    full tier's defaults apply.
+    """
+    original = accept.request
+    return original.model_copy(
+        update={
+            "quality": "full",
+            "seed": accept.seed,
+            "num_images": 1,
+            "steps": None if original.quality == "preview" else original.steps,
+            "init_image_id": accept.image_id,
+            "strength": accept.strength or settings.upscale_strength,
+        }
+    )
@@ -2,21 +2,75 @@
 
 from __future__ import annotations
 
+import gc
 import io
 import logging
+import os
 import secrets
+import time
 from base64 import b64encode
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Iterable, Mapping
 
 import torch
-from diffusers import EulerAncestralDiscreteScheduler, StableDiffusionXLPipeline
-
+from diffusers import (
+    DDIMScheduler,
+    DPMSolverMultistepScheduler,
+    EulerAncestralDiscreteScheduler,
+    EulerDiscreteScheduler,
+    LCMScheduler,
+    StableDiffusionXLImg2ImgPipeline,
+    StableDiffusionXLInpaintPipeline,
+    StableDiffusionXLPipeline,
+    UniPCMultistepScheduler,
+)
+
+from .batching import GenerationCancelled, ImageSink, ProgressCallback
 from .config import Settings, get_settings
-from .schemas import GenerationRequest, ImageResult
+from .encoding import GeneratedImage, finalize_images, load_mask, load_rgb
+from .image_store import image_store
+from .catalog import catalog
+from .lora_cache import LoraAdapterCache
+from .metrics import DENOISE_STEP_SECONDS, STAGE_SECONDS, size_bucket
+from .model_registry import (
+    ModelRegistry,
+    RegistryHooks,
+    component_fingerprints,
+    detect_variant,
+    estimate_model_bytes,
+    shareable_components,
+)
+from .params import resolve_params
+from .profiles import ExecutionProfile, cpu_supports_bf16, select_profile, system_memory_bytes
+from .prompt_cache import PromptEmbeddingCache
+from .schemas import GenerationRequest, ImageResult, LoraCacheStats
+from .storage import resolve_base_model
 
 LOGGER = logging.getLogger(__name__)
 
+# Linear approximation of the SDXL VAE decoder (4 latent channels -> RGB), good
+# enough for cheap progress previews without running the real VAE.
+_SDXL_LATENT_RGB_FACTORS = (
+    (0.3651, 0.4232, 0.4341),
+    (-0.2533, -0.0042, 0.1068),
+    (0.1076, 0.1111, -0.0362),
+    (-0.3165, -0.2492, -0.2188),
+)
+_SDXL_LATENT_RGB_BIAS = (0.1084, -0.0175, -0.0011)
+
+# Scheduler name (``schemas.SchedulerName``) -> class and config overrides.
+_SCHEDULERS: dict[str, tuple[type, dict[str, Any]]] = {
+    "euler_a": (EulerAncestralDiscreteScheduler, {}),
+    "euler": (EulerDiscreteScheduler, {}),
+    "dpmpp_2m": (DPMSolverMultistepScheduler, {}),
+    "dpmpp_2m_karras": (DPMSolverMultistepScheduler, {"use_karras_sigmas": True}),
+    "unipc": (UniPCMultistepScheduler, {}),
+    "ddim": (DDIMScheduler, {}),
+    "lcm": (LCMScheduler, {}),
+}
+
 
 def _detect_device(preference: str) -> torch.device:
     if preference == "cuda" and torch.cuda.is_available():
@@ -33,55 +87,181 @@ def _detect_device(preference: str) -> torch.device:
     return torch.device("cpu")
 
 
-def _select_dtype(device: torch.device) -> torch.dtype:
+def _select_dtype(device: torch.device, settings: Settings) -> torch.dtype:
     if device.type == "cuda":
         return torch.float16
     if device.type == "mps":
         return torch.float16
+    if settings.cpu_bf16 == "on" or (settings.cpu_bf16 == "auto" and cpu_supports_bf16()):
+        return torch.bfloat16
     return torch.float32
 
 
+def _configure_threads(settings: Settings) -> None:
+    if settings.cpu_threads:
+        torch.set_num_threads(settings.cpu_threads)
+    if settings.cpu_interop_threads:
+        try:
+            torch.set_num_interop_threads(settings.cpu_interop_threads)
+        except RuntimeError as exc:
+            # Only allowed before the first inter-op parallel work in the process.
+            LOGGER.warning("Could not set inter-op threads: %s", exc)
+
+
+class _StepTimer:
+    """Feeds per-step denoising durations to the metrics from the step callback.
+
+    CUDA kernels run asynchronously, so on CUDA a step only records an event
+    on the stream; the queue is drained once at ``start`` and once at
+    ``finish``, where the per-step durations are read back from the events.
+    """
+
+    def __init__(self, device: torch.device, labels: dict[str, str]) -> None:
+        self.device = device
+        self.labels = labels
+        self.started = self.last = time.perf_counter()
+        self._events: list[Any] = []
+
+    def _record(self) -> None:
+        event = torch.cuda.Event(enable_timing=True)
+        event.record()
+        self._events.append(event)
+
+    def start(self) -> None:
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+            self._events = []
+            self._record()
+        self.started = self.last = time.perf_counter()
+
+    def step(self) -> None:
+        if self.device.type == "cuda":
+            self._record()
+            return
+        now = time.perf_counter()
+        DENOISE_STEP_SECONDS.observe(now - self.last, **self.labels)
+        self.last = now
+
+    def finish(self) -> None:
+        """Wait for the queued steps and observe their durations; ``last`` becomes the end of the final step."""
+        if self.device.type != "cuda":
+            return
+        torch.cuda.synchronize(self.device)
+        total = 0.0
+        for before, after in zip(self._events, self._events[1:]):
+            seconds = before.elapsed_time(after) / 1000.0
+            DENOISE_STEP_SECONDS.observe(seconds, **self.labels)
+            total += seconds
+        self.last = self.started + total
+        self._events = []
+
+
+@dataclass
+class LoadedModel:
+    """A resident base model with its own LoRA adapters."""
+
+    name: str
+    path: Path
+    pipe: StableDiffusionXLPipeline
+    lora_cache: LoraAdapterCache
+    fingerprints: dict[str, str] = field(default_factory=dict)
+    scheduler_config: Any = None
+    weight_bytes: int = 0
+    profile: str | None = None
+    # Tracked apart from ``profile``, which offload changes reset while slicing stays on the pipe.
+    attention_slicing: bool = False
+    offload: str = "none"
+    schedulers: dict[str, Any] = field(default_factory=dict)
+    derived: dict[type, Any] = field(default_factory=dict)
+
+
 class PipelineManager:
-    """Wraps Diffusers pipeline loading and generation."""
+    """Wraps Diffusers pipeline loading and generation.
+
+    Base models are selected per request by name and kept resident by a
+    ``ModelRegistry``; tokenizers and the VAE (and the text encoders, unless
+    LoRAs are enabled) are reused from an already loaded model whenever their
+    files fingerprint identically.
+    """
 
     def __init__(self, settings: Settings | None = None) -> None:
         self.settings = settings or get_settings()
         self.device = _detect_device(self.settings.device_preference)
-        self.dtype = _select_dtype(self.device)
-        self._pipeline: StableDiffusionXLPipeline | None = None
-        self._current_lora: list[str] = []
-
-    def _resolve_model_path(self) -> Path:
-        if self.settings.default_model_subdir:
-            return self.settings.model_dir / self.settings.default_model_subdir
-        return self.settings.model_dir
-
-    def ensure_pipeline(self) -> StableDiffusionXLPipeline:
-        if self._pipeline is not None:
-            return self._pipeline
-
-        model_path = self._resolve_model_path()
-        if not model_path.exists():
-            raise FileNotFoundError(f"Base model directory not found: {model_path}")
+        self.dtype = _select_dtype(self.device, self.settings)
+        _configure_threads(self.settings)
+        self.registry: ModelRegistry[LoadedModel] = ModelRegistry(
+            RegistryHooks(
+                estimate=self._estimate_model,
+                load=self._load_model,
+                to_device=self._model_to_device,
+                offload=self._offload_model,
+                release=self._release_model,
+            ),
+            self.settings,
+            can_offload=self.device.type != "cpu",
+        )
+        self._fingerprints: dict[Path, dict[str, str]] = {}
+        self.prompt_cache: PromptEmbeddingCache[tuple[Any, ...]] = PromptEmbeddingCache(self.settings)
+        self.state: str = "cold"
+        self.state_detail: str | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _model_name(self, name: str | None) -> str:
+        return resolve_base_model(name, self.settings).name
+
+    def _variant_for(self, model_path: Path) -> str | None:
+        return detect_variant(model_path)
+
+    def _component_fingerprints(self, model_path: Path) -> dict[str, str]:
+        if not self.settings.share_model_components:
+            return {}
+        if model_path not in self._fingerprints:
+            # Text encoders carry PEFT LoRA state per adapter cache, so with a LoRA dir they stay per model.
+            components = shareable_components(lora_enabled=self.settings.lora_dir.is_dir())
+            self._fingerprints[model_path] = component_fingerprints(
+                model_path, self._variant_for(model_path), components
+            )
+        return self._fingerprints[model_path]
+
+    def _shared_components(self, fingerprints: Mapping[str, str]) -> dict[str, Any]:
+        shared: dict[str, Any] = {}
+        for component, fingerprint in fingerprints.items():
+            for _name, loaded in self.registry.loaded_models():
+                if loaded.fingerprints.get(component) == fingerprint:
+                    shared[component] = loaded.pipe.components[component]
+                    break
+        return shared
+
+    def _estimate_model(self, name: str) -> int:
+        model_path = resolve_base_model(name, self.settings)
+        shared = self._shared_components(self._component_fingerprints(model_path))
+        return estimate_model_bytes(model_path, self._variant_for(model_path), skip=shared)
+
+    def _load_model(self, name: str) -> LoadedModel:
+        model_path = resolve_base_model(name, self.settings)
+        fingerprints = self._component_fingerprints(model_path)
+        shared = self._shared_components(fingerprints)
 
-        LOGGER.info("Loading pipeline from %s on %s", model_path, self.device)
-        extra_kwargs = {}
+        LOGGER.info(
+            "Loading pipeline %s from %s on %s (sharing: %s)",
+            name,
+            model_path,
+            self.device,
+            ", ".join(sorted(shared)) or "none",
+        )
+        extra_kwargs: dict[str, Any] = dict(shared)
         if not self.settings.allow_safety_checker:
             extra_kwargs["safety_checker"] = None
 
-        # Prefer fp16 weights when they exist (e.g. downloaded as *.fp16.safetensors).
-        variant = None
-        fp16_unet = model_path / "unet" / "diffusion_pytorch_model.fp16.safetensors"
-        if fp16_unet.exists():
-            variant = "fp16"
-
         pipe = StableDiffusionXLPipeline.from_pretrained(
             model_path,
             torch_dtype=self.dtype,
-            variant=variant,
+            variant=self._variant_for(model_path),
             **extra_kwargs,
         )
-        pipe.scheduler = EulerAncestralDiscreteScheduler.from_config(pipe.scheduler.config)
 
         if self.device.type == "cuda":
             pipe.to(self.device)
@@ -92,85 +272,469 @@ class PipelineManager:
         else:
             pipe.to("cpu")
 
-        self._pipeline = pipe
-        return pipe
+        self._optimize(pipe)
+        return LoadedModel(
+            name=name,
+            path=model_path,
+            pipe=pipe,
+            lora_cache=LoraAdapterCache(self.settings, model=name, catalog=catalog),
+            fingerprints=fingerprints,
+            scheduler_config=pipe.scheduler.config,
+            weight_bytes=self._weight_bytes(model_path),
+        )
 
-    def _apply_lora(self, lora_names: Iterable[str]) -> None:
-        pipe = self.ensure_pipeline()
-        names = list(lora_names)
-        if names == self._current_lora:
+    def _weight_bytes(self, model_path: Path) -> int:
+        # Approximate: files without a variant suffix are assumed to hold fp32.
+        variant = self._variant_for(model_path)
+        file_dtype_bytes = 2 if variant == "fp16" else 4
+        dtype_bytes = torch.finfo(self.dtype).bits // 8
+        return estimate_model_bytes(model_path, variant) * dtype_bytes // file_dtype_bytes
+
+    def _memory_budget(self, loaded: LoadedModel) -> int:
+        """Bytes this model may use at peak: the device (or RAM) minus other resident models."""
+        if self.settings.memory_budget_mb:
+            total = self.settings.memory_budget_mb * 1024 * 1024
+        else:
+            if self.device.type == "cuda":
+                capacity = torch.cuda.get_device_properties(self.device).total_memory
+            else:
+                capacity = system_memory_bytes() or 16 * 1024**3
+            total = int(capacity * self.settings.memory_headroom)
+        others = sum(other.weight_bytes for _name, other in self.registry.device_models() if other is not loaded)
+        return total - others
+
+    def _apply_profile(self, loaded: LoadedModel, profile: ExecutionProfile) -> None:
+        """Toggle slicing/tiling/offload on ``loaded.pipe``; a no-op when already applied."""
+        if loaded.profile == profile.name:
             return
+        pipe = loaded.pipe
+        LOGGER.info("Switching %s to execution profile %s", loaded.name, profile.name)
+        if loaded.attention_slicing != profile.attention_slicing:
+            if profile.attention_slicing:
+                pipe.enable_attention_slicing()
+            else:
+                # Dropping slicing resets the attention processors, xformers included.
+                pipe.disable_attention_slicing()
+                if self.device.type == "cuda" and self.settings.enable_xformers:
+                    pipe.enable_xformers_memory_efficient_attention()
+            loaded.attention_slicing = profile.attention_slicing
+        if profile.vae_slicing:
+            pipe.enable_vae_slicing()
+        else:
+            pipe.disable_vae_slicing()
+        if profile.vae_tiling:
+            pipe.enable_vae_tiling()
+        else:
+            pipe.disable_vae_tiling()
+
+        offload = profile.offload if self.device.type == "cuda" else "none"
+        if offload != loaded.offload:
+            self._clear_cpu_offload(loaded)
+            if offload == "model":
+                pipe.enable_model_cpu_offload(device=self.device)
+            elif offload == "sequential":
+                pipe.enable_sequential_cpu_offload(device=self.device)
+            else:
+                pipe.to(self.device)
+            loaded.offload = offload
+            loaded.derived.clear()
+        loaded.profile = profile.name
+
+    def _clear_cpu_offload(self, loaded: LoadedModel) -> None:
+        if loaded.offload != "none":
+            loaded.pipe.remove_all_hooks()
+            loaded.offload = "none"
+            loaded.profile = None
+            loaded.derived.clear()
+
+    def _model_to_device(self, model: LoadedModel) -> None:
+        model.pipe.to(self.device)
+
+    def _offload_model(self, model: LoadedModel) -> None:
+        self._clear_cpu_offload(model)
+        # Components shared with a model that stays on the device must stay there too.
+        in_use = {
+            id(component)
+            for _name, other in self.registry.device_models()
+            if other is not model
+            for component in other.pipe.components.values()
+        }
+        for component in model.pipe.components.values():
+            if isinstance(component, torch.nn.Module) and id(component) not in in_use:
+                component.to("cpu")
+        self._empty_device_cache()
+
+    def _release_model(self, model: LoadedModel) -> None:
+        model.lora_cache.reset()
+        self.prompt_cache.drop_model(model.name)
+        model.pipe = None  # type: ignore[assignment]
+        model.derived.clear()
+        model.schedulers.clear()
+        gc.collect()
+        self._empty_device_cache()
+
+    def _empty_device_cache(self) -> None:
+        if self.device.type == "cuda":
+            torch.cuda.empty_cache()
+        elif self.device.type == "mps":
+            torch.mps.empty_cache()
 
-        if self._current_lora:
-            try:
-                pipe.unload_lora_weights()
-            except Exception as exc:  # noqa: BLE001
-                LOGGER.warning("Failed to unload LoRA weights: %s", exc)
+    def acquire(self, model: str | None = None) -> LoadedModel:
+        """Resident model ``model`` (None = default), loading or promoting it as needed."""
+        return self.registry.acquire(self._model_name(model))
 
-        if not names:
-            self._current_lora = []
-            return
+    def ensure_pipeline(self, model: str | None = None) -> StableDiffusionXLPipeline:
+        return self.acquire(model).pipe
+
+    def residency(self, model_path: Path) -> str | None:
+        return self.registry.residency(model_path.name)
 
-        for name in names:
-            lora_path = self.settings.lora_dir / name
-            if not lora_path.exists():
-                raise FileNotFoundError(f"LoRA weight not found: {lora_path}")
-            LOGGER.info("Loading LoRA: %s", lora_path)
-            pipe.load_lora_weights(lora_path)
-        self._current_lora = names
+    def device_memory(self) -> dict[str, int]:
+        if self.device.type == "cuda":
+            return {
+                "allocated": torch.cuda.memory_allocated(self.device),
+                "reserved": torch.cuda.memory_reserved(self.device),
+                "peak_allocated": torch.cuda.max_memory_allocated(self.device),
+            }
+        if self.device.type == "mps":
+            return {"allocated": torch.mps.current_allocated_memory()}
+        return {}
+
+    def lora_cache_stats(self) -> list[LoraCacheStats]:
+        return [loaded.lora_cache.stats() for _name, loaded in self.registry.loaded_models()]
+
+    def _optimize(self, pipe: StableDiffusionXLPipeline) -> None:
+        """Apply channels_last / torch.compile to the UNet and VAE decoder if enabled."""
+        if self.settings.channels_last:
+            pipe.unet.to(memory_format=torch.channels_last)
+            pipe.vae.to(memory_format=torch.channels_last)
+        if not self.settings.torch_compile:
+            return
+        cache_dir = self.settings.compile_cache_dir
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Inductor reuses compiled kernels/graphs from here across restarts and replicas.
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir))
+        try:
+            import torch._inductor.config as inductor_config
+
+            inductor_config.fx_graph_cache = True
+        except (ImportError, AttributeError):
+            pass
+        LOGGER.info("Compiling UNet/VAE with torch.compile(mode=%s)", self.settings.torch_compile_mode)
+        pipe.unet = torch.compile(pipe.unet, mode=self.settings.torch_compile_mode, fullgraph=False)
+        # A VAE shared with another model has been compiled already.
+        if not getattr(pipe.vae, "_yokai_compiled", False):
+            pipe.vae.decode = torch.compile(pipe.vae.decode, mode=self.settings.torch_compile_mode, fullgraph=False)
+            pipe.vae._yokai_compiled = True
+
+    def warmup(self) -> None:
+        """Load the pipeline and run throwaway generations so the first real request is fast.
+
+        This triggers lazy CUDA/MPS kernel setup and, with ``torch_compile``, the
+        compilation itself for every configured size.
+        """
+        try:
+            self.state = "loading"
+            self.ensure_pipeline()
+            if self.settings.warmup_enabled:
+                self.state = "warming"
+                sizes = self.settings.warmup_sizes or [(self.settings.width, self.settings.height)]
+                for width, height in sizes:
+                    started = time.monotonic()
+                    self.generate_batch(
+                        [
+                            GenerationRequest(
+                                prompt="warmup",
+                                steps=self.settings.warmup_steps,
+                                width=width,
+                                height=height,
+                                seed=0,
+                            )
+                        ]
+                    )
+                    LOGGER.info("Warmup %sx%s took %.2fs", width, height, time.monotonic() - started)
+        except Exception as exc:
+            self.state = "failed"
+            self.state_detail = str(exc)
+            raise
+        self.state = "ready"
+        self.state_detail = None
+
+    def _apply_lora(
+        self,
+        loaded: LoadedModel,
+        lora_names: Iterable[str],
+        scales: Mapping[str, float] | None = None,
+    ) -> None:
+        loaded.lora_cache.activate(loaded.pipe, list(lora_names), scales)
+
+    def _scheduler(self, loaded: LoadedModel, name: str) -> Any:
+        """One instance per scheduler and model; the pipeline thread uses them serially."""
+        scheduler = loaded.schedulers.get(name)
+        if scheduler is None:
+            cls, overrides = _SCHEDULERS[name]
+            scheduler = cls.from_config(loaded.scheduler_config, **overrides)
+            loaded.schedulers[name] = scheduler
+        return scheduler
+
+    def _derived_pipe(self, loaded: LoadedModel, cls: type) -> Any:
+        """img2img/inpaint view over the same modules, so no weights are loaded twice."""
+        pipe = loaded.derived.get(cls)
+        if pipe is None:
+            pipe = cls(**loaded.pipe.components)
+            loaded.derived[cls] = pipe
+        return pipe
 
     def _image_to_base64(self, image) -> str:  # type: ignore[no-untyped-def]
         buffer = io.BytesIO()
         image.save(buffer, format="PNG")
         return b64encode(buffer.getvalue()).decode("utf-8")
 
-    def generate(self, request: GenerationRequest) -> list[ImageResult]:
-        pipe = self.ensure_pipeline()
-        self._apply_lora(request.lora)
+    def _latent_preview_base64(self, latents: torch.Tensor) -> str:
+        from PIL import Image
+
+        factors = torch.tensor(_SDXL_LATENT_RGB_FACTORS, dtype=torch.float32, device=latents.device)
+        bias = torch.tensor(_SDXL_LATENT_RGB_BIAS, dtype=torch.float32, device=latents.device)
+        rgb = torch.einsum("chw,cr->hwr", latents.float(), factors) + bias
+        rgb = ((rgb.clamp(-1, 1) + 1) * 127.5).to(torch.uint8).cpu().numpy()
+        return self._image_to_base64(Image.fromarray(rgb))
+
+    def _step_callback(
+        self,
+        plan: list[tuple[GenerationRequest, int, int]],
+        progress: list[ProgressCallback | None],
+        steps: int,
+        timer: _StepTimer,
+    ) -> Any:
+        interval = max(1, self.settings.preview_interval_steps)
+
+        def _on_step_end(pipe: Any, step: int, timestep: Any, callback_kwargs: dict[str, Any]) -> dict[str, Any]:
+            timer.step()
+            latents = callback_kwargs.get("latents")
+            done = step + 1
+            offset = 0
+            for (request, batch, _seed), report in zip(plan, progress):
+                if report is not None:
+                    preview = None
+                    if request.latent_previews and latents is not None and (done % interval == 0 or done == steps):
+                        try:
+                            preview = self._latent_preview_base64(latents[offset])
+                        except Exception as exc:  # noqa: BLE001
+                            LOGGER.debug("Latent preview failed: %s", exc)
+                    try:
+                        report(done, steps, preview)
+                    except GenerationCancelled:
+                        # Unwinds out of the pipe call; nothing after this step runs.
+                        raise
+                    except Exception as exc:  # noqa: BLE001
+                        LOGGER.warning("Progress callback failed: %s", exc)
+                offset += batch
+            return callback_kwargs
+
+        return _on_step_end
+
+    def _encode_prompt(self, pipe: Any, prompt: str, negative: str | None, do_cfg: bool) -> tuple[Any, ...]:
+        with torch.no_grad():
+            return pipe.encode_prompt(
+                prompt=prompt,
+                device=self.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=do_cfg,
+                negative_prompt=negative,
+            )
 
-        steps = request.steps or self.settings.inference_steps
-        steps = min(steps, self.settings.max_inference_steps)
-        guidance = request.guidance_scale or self.settings.guidance_scale
-        width = request.width or self.settings.width
-        height = request.height or self.settings.height
-        batch = min(request.num_images, self.settings.max_batch_size)
+    def _prompt_embeddings(
+        self,
+        loaded: LoadedModel,
+        prompts: list[str],
+        negatives: list[str | None],
+        guidance: float,
+        lora_key: tuple[tuple[str, float], ...],
+    ) -> dict[str, torch.Tensor]:
+        """Encode each prompt once per (model, LoRA set) and stack the cached embeddings."""
+        do_cfg = guidance > 1.0
+        encoded = [
+            self.prompt_cache.get_or_encode(
+                (loaded.name, prompt, negative, do_cfg, lora_key),
+                partial(self._encode_prompt, loaded.pipe, prompt, negative, do_cfg),
+            )
+            for prompt, negative in zip(prompts, negatives)
+        ]
+        embeddings = {
+            "prompt_embeds": torch.cat([item[0] for item in encoded]),
+            "pooled_prompt_embeds": torch.cat([item[2] for item in encoded]),
+        }
+        if do_cfg:
+            embeddings["negative_prompt_embeds"] = torch.cat([item[1] for item in encoded])
+            embeddings["negative_pooled_prompt_embeds"] = torch.cat([item[3] for item in encoded])
+        return embeddings
 
-        base_seed = request.seed if request.seed is not None else secrets.randbits(32)
-        generator = torch.Generator(device=self.device)
-        generator.manual_seed(base_seed)
+    def generate(self, request: GenerationRequest) -> list[ImageResult]:
+        return finalize_images(request, self.generate_batch([request])[0], self.settings)
+
+    def _decode_latents(self, pipe: Any, latents: torch.Tensor) -> Any:
+        """VAE-decode one image's latents to PIL the way the SDXL pipelines do after denoising."""
+        vae = pipe.vae
+        latents = latents.unsqueeze(0)
+        needs_upcasting = vae.dtype == torch.float16 and vae.config.force_upcast
+        if needs_upcasting:
+            pipe.upcast_vae()
+            latents = latents.to(next(iter(vae.post_quant_conv.parameters())).dtype)
+        elif latents.dtype != vae.dtype:
+            latents = latents.to(vae.dtype)
+        mean = getattr(vae.config, "latents_mean", None)
+        std = getattr(vae.config, "latents_std", None)
+        if mean is not None and std is not None:
+            mean = torch.tensor(mean).view(1, -1, 1, 1).to(latents.device, latents.dtype)
+            std = torch.tensor(std).view(1, -1, 1, 1).to(latents.device, latents.dtype)
+            latents = latents * std / vae.config.scaling_factor + mean
+        else:
+            latents = latents / vae.config.scaling_factor
+        with torch.no_grad():
+            image = vae.decode(latents, return_dict=False)[0]
+        if needs_upcasting:
+            vae.to(dtype=torch.float16)
+        if getattr(pipe, "watermark", None) is not None:
+            image = pipe.watermark.apply_watermark(image)
+        return pipe.image_processor.postprocess(image, output_type="pil")[0]
+
+    def generate_batch(
+        self,
+        requests: list[GenerationRequest],
+        progress: list[ProgressCallback | None] | None = None,
+        image_sinks: list[ImageSink] | None = None,
+    ) -> list[list[GeneratedImage]]:
+        """Run several compatible requests as one pipe call and split the images back out.
+
+        All requests must resolve to the same ``ResolvedParams`` and LoRA set
+        (see ``GenerationBatcher.batch_key``); prompts, seeds and init images
+        may differ.
+        ``progress`` holds one optional per-step callback per request. Images come
+        back as PIL objects; ``finalize_images`` encodes them.
+        With ``image_sinks`` (streaming), the pipe returns latents and each image
+        is decoded on its own and handed to its request's sink straight away,
+        so the VAE never holds the whole batch at once.
+        """
+        first = requests[0]
+        params = resolve_params(first, self.settings)
+        loaded = self.acquire(first.model)
+        with STAGE_SECONDS.time(stage="lora_apply", model=loaded.name, size=size_bucket(params.width, params.height)):
+            self._apply_lora(loaded, first.lora, first.lora_scales)
+        scheduler = self._scheduler(loaded, params.scheduler)
+        loaded.pipe.scheduler = scheduler
+        width, height = params.width, params.height
+        profile = select_profile(
+            self.settings,
+            width,
+            height,
+            sum(min(request.num_images, self.settings.max_batch_size) for request in requests),
+            loaded.weight_bytes,
+            self._memory_budget(loaded),
+            dtype_bytes=torch.finfo(self.dtype).bits // 8,
+            can_offload=self.device.type == "cuda",
+        )
+        self._apply_profile(loaded, profile)
+
+        prompts: list[str] = []
+        negatives: list[str | None] = []
+        generators: list[torch.Generator] = []
+        init_images: list[Any] = []
+        mask_images: list[Any] = []
+        plan: list[tuple[GenerationRequest, int, int]] = []
+        for request in requests:
+            batch = min(request.num_images, self.settings.max_batch_size)
+            base_seed = request.seed if request.seed is not None else secrets.randbits(32)
+            plan.append((request, batch, base_seed))
+            init_image = mask_image = None
+            if request.init_image_id is not None:
+                init_image = load_rgb(image_store.read(request.init_image_id)[0], (width, height))
+            if request.mask_image_id is not None:
+                mask_image = load_mask(image_store.read(request.mask_image_id)[0], (width, height))
+            for idx in range(batch):
+                prompts.append(request.prompt)
+                negatives.append(request.negative_prompt)
+                if init_image is not None:
+                    init_images.append(init_image)
+                if mask_image is not None:
+                    mask_images.append(mask_image)
+                # One generator per image so each reported seed reproduces its image.
+                generators.append(torch.Generator(device=self.device).manual_seed(base_seed + idx))
 
         LOGGER.info(
-            "Generating prompt='%s' lora=%s steps=%s guidance=%s size=%sx%s",
-            request.prompt,
-            request.lora,
-            steps,
-            guidance,
+            "Generating batch of %s request(s) / %s image(s) model=%s lora=%s scheduler=%s steps=%s "
+            "guidance=%s size=%sx%s profile=%s%s",
+            len(requests),
+            len(prompts),
+            loaded.name,
+            first.lora,
+            params.scheduler,
+            params.steps,
+            params.guidance,
             width,
             height,
+            profile.name,
+            f" {'inpaint' if mask_images else 'img2img'} strength={params.strength}" if init_images else "",
         )
-
-        outputs = pipe(
-            prompt=request.prompt,
-            negative_prompt=request.negative_prompt,
-            num_inference_steps=steps,
-            width=width,
-            height=height,
-            guidance_scale=guidance,
-            num_images_per_prompt=batch,
-            generator=generator,
-        ).images
-
-        results: list[ImageResult] = []
-        for idx, image in enumerate(outputs):
-            results.append(
-                ImageResult(
-                    base64_png=self._image_to_base64(image),
-                    seed=int(base_seed + idx),
-                    width=width,
-                    height=height,
-                    lora=request.lora,
-                )
+        for request in requests:
+            LOGGER.info("  prompt='%s'", request.prompt)
+
+        labels = {"model": loaded.name, "size": size_bucket(width, height)}
+        # img2img skips the first (1 - strength) of the schedule.
+        steps = params.steps if params.strength is None else max(1, int(params.steps * params.strength))
+        timer = _StepTimer(self.device, labels)
+        call_kwargs: dict[str, Any] = {
+            "num_inference_steps": params.steps,
+            "guidance_scale": params.guidance,
+            "num_images_per_prompt": 1,
+            "generator": generators,
+            "callback_on_step_end": self._step_callback(plan, progress or [None] * len(plan), steps, timer),
+            "callback_on_step_end_tensor_inputs": ["latents"],
+        }
+
+        lora_key = tuple((name, first.lora_scales.get(name, 1.0)) for name in first.lora)
+        with STAGE_SECONDS.time(stage="text_encode", **labels):
+            call_kwargs.update(self._prompt_embeddings(loaded, prompts, negatives, params.guidance, lora_key))
+
+        if mask_images:
+            runner = self._derived_pipe(loaded, StableDiffusionXLInpaintPipeline)
+            call_kwargs.update(
+                image=init_images,
+                mask_image=mask_images,
+                strength=params.strength,
+                width=width,
+                height=height,
             )
+        elif init_images:
+            runner = self._derived_pipe(loaded, StableDiffusionXLImg2ImgPipeline)
+            call_kwargs.update(image=init_images, strength=params.strength)
+        else:
+            runner = loaded.pipe
+            call_kwargs.update(width=width, height=height)
+        runner.scheduler = scheduler
+
+        if image_sinks is not None:
+            call_kwargs["output_type"] = "latent"
+        timer.start()
+        outputs = runner(**call_kwargs).images
+        # Everything after the last step is latent decoding and postprocessing.
+        timer.finish()
+        STAGE_SECONDS.observe(timer.last - timer.started, stage="denoise", **labels)
+
+        results: list[list[GeneratedImage]] = []
+        offset = 0
+        for position, (request, batch, base_seed) in enumerate(plan):
+            generated: list[GeneratedImage] = []
+            for idx in range(batch):
+                image = outputs[offset + idx]
+                if image_sinks is not None:
+                    image = self._decode_latents(runner, image)
+                item = GeneratedImage(image=image, seed=int(base_seed + idx), width=width, height=height)
+                if image_sinks is not None:
+                    image_sinks[position](idx, item)
+                generated.append(item)
+            offset += batch
+            results.append(generated)
+        STAGE_SECONDS.observe(time.perf_counter() - timer.last, stage="vae_decode", **labels)
         return results
 
 
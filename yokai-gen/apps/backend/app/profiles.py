@@ -0,0 +1,136 @@
+"""Execution profiles trading speed for peak memory, picked per batch."""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Literal
+
+from .config import Settings
+
+OffloadMode = Literal["none", "model", "sequential"]
+
+# Rough activation cost per latent pixel (1/8 of the image side) and image at
+# 2 bytes per element, measured on SDXL at 1024x1024 with CFG. They only need
+# to be good enough to order the profiles against the memory budget.
+_UNET_BYTES_PER_LATENT_PX = 200_000
+_VAE_BYTES_PER_LATENT_PX = 180_000
+_VAE_TILE_LATENT_PX = 64 * 64
+# Share of the weights that stays on the device with model CPU offload (the UNet).
+_MODEL_OFFLOAD_RESIDENT = 0.7
+_SEQUENTIAL_OFFLOAD_RESIDENT = 0.05
+
+
+@dataclass(frozen=True)
+class ExecutionProfile:
+    name: str
+    attention_slicing: bool
+    vae_slicing: bool
+    vae_tiling: bool
+    offload: OffloadMode
+
+
+PROFILES: dict[str, ExecutionProfile] = {
+    profile.name: profile
+    for profile in (
+        ExecutionProfile("performance", False, False, False, "none"),
+        ExecutionProfile("balanced", True, True, False, "none"),
+        ExecutionProfile("low_memory", True, True, True, "model"),
+        ExecutionProfile("minimal", True, True, True, "sequential"),
+    )
+}
+
+
+def estimate_peak_bytes(
+    profile: ExecutionProfile,
+    width: int,
+    height: int,
+    images: int,
+    weight_bytes: int,
+    dtype_bytes: int = 2,
+    can_offload: bool = True,
+) -> int:
+    """Weights resident on the device plus the larger of UNet and VAE-decode activations."""
+    latent_px = (width // 8) * (height // 8)
+    scale = dtype_bytes / 2
+    unet = _UNET_BYTES_PER_LATENT_PX * latent_px * images * scale
+    if profile.attention_slicing:
+        unet /= 2
+    vae_images = 1 if profile.vae_slicing else images
+    vae_px = min(latent_px, _VAE_TILE_LATENT_PX) if profile.vae_tiling else latent_px
+    vae = _VAE_BYTES_PER_LATENT_PX * vae_px * vae_images * scale
+    resident = 1.0
+    if can_offload and profile.offload == "model":
+        resident = _MODEL_OFFLOAD_RESIDENT
+    elif can_offload and profile.offload == "sequential":
+        resident = _SEQUENTIAL_OFFLOAD_RESIDENT
+    return int(weight_bytes * resident + max(unet, vae))
+
+
+def select_profile(
+    settings: Settings,
+    width: int,
+    height: int,
+    images: int,
+    weight_bytes: int,
+    budget_bytes: int,
+    dtype_bytes: int = 2,
+    can_offload: bool = True,
+) -> ExecutionProfile:
+    """The fastest profile whose estimated peak fits ``budget_bytes``.
+
+    A fixed ``Settings.execution_profile`` always wins; with ``auto`` and
+    nothing fitting, the most frugal profile is used.
+    """
+    if settings.execution_profile != "auto":
+        return PROFILES[settings.execution_profile]
+    # Without offload (CPU), "minimal" would just repeat "low_memory".
+    candidates = [p for p in PROFILES.values() if can_offload or p.offload != "sequential"]
+    for profile in candidates:
+        peak = estimate_peak_bytes(profile, width, height, images, weight_bytes, dtype_bytes, can_offload)
+        if peak <= budget_bytes:
+            return profile
+    return candidates[-1]
+
+
+def _meminfo_bytes(field: str) -> int | None:
+    try:
+        with open("/proc/meminfo", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+def system_memory_bytes() -> int | None:
+    """Total RAM, honouring a cgroup v2 limit when the process runs in a container."""
+    total = _meminfo_bytes("MemTotal")
+    if total is None:
+        try:
+            total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        except (ValueError, OSError, AttributeError):
+            return None
+    cgroup_limit = Path("/sys/fs/cgroup/memory.max")
+    try:
+        limit = cgroup_limit.read_text(encoding="ascii").strip()
+        if limit != "max":
+            total = min(total, int(limit))
+    except (OSError, ValueError):
+        pass
+    return total
+
+
+def cpu_supports_bf16() -> bool:
+    """bf16 matmuls are only fast with AVX512-BF16/AMX on x86 or the BF16 extension on Arm."""
+    try:
+        with open("/proc/cpuinfo", encoding="ascii", errors="ignore") as fh:
+            for line in fh:
+                if line.startswith(("flags", "Features")):
+                    flags = set(line.split(":", 1)[1].split())
+                    return bool(flags & {"avx512_bf16", "amx_bf16", "bf16"})
+    except OSError:
+        return False
+    return False
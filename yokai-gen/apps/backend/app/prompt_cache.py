@@ -0,0 +1,57 @@
+"""LRU cache of text-encoder outputs keyed by prompt text and LoRA state."""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Generic, Hashable, TypeVar
+
+from .config import Settings, get_settings
+from .lru import LRUCache
+from .schemas import PromptCacheStats
+
+E = TypeVar("E")
+
+
+class PromptEmbeddingCache(Generic[E]):
+    """Remembers encoded prompts so repeated texts skip both SDXL text encoders.
+
+    Keys must capture everything that changes the embedding besides the text:
+    the base model (its encoders) and the active LoRA set with scales, since
+    LoRAs can patch the text encoders too. Values are opaque to the cache.
+    """
+
+    def __init__(self, settings: Settings | None = None) -> None:
+        self.settings = settings or get_settings()
+        self._lock = threading.Lock()
+        self._entries: LRUCache[Hashable, E] = LRUCache(max_items=max(1, self.settings.prompt_cache_size))
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.prompt_cache_size > 0
+
+    def get_or_encode(self, key: Hashable, encode: Callable[[], E]) -> E:
+        if not self.enabled:
+            return encode()
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                value = encode()
+                self._entries.put(key, value)
+            return value
+
+    def drop_model(self, model: str) -> None:
+        """Forget entries for a released model; keys start with the model name."""
+        with self._lock:
+            for key, _value, _size in self._entries.items():
+                if isinstance(key, tuple) and key and key[0] == model:
+                    self._entries.pop(key)
+
+    def stats(self) -> PromptCacheStats:
+        with self._lock:
+            return PromptCacheStats(
+                hits=self._entries.hits,
+                misses=self._entries.misses,
+                evictions=self._entries.evictions,
+                entries=len(self._entries),
+                max_entries=self.settings.prompt_cache_size,
+            )
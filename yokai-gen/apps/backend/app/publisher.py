@@ -2,101 +2,92 @@
 
 from __future__ import annotations
 
-import json
 import logging
-import re
-from base64 import b64decode
-from pathlib import Path
 from typing import Any
 
 from .config import Settings, get_settings
+from .encoding import EncodeOptions, decode_base64_image, image_size, make_thumbnail, normalize_upload
+from .feature_store import FeatureStore, get_feature_store
+from .image_store import EXTENSIONS, ImageStore
+from .metrics import PUBLISH_SECONDS, size_bucket
 from .schemas import PlaceMetadata, PublishRequest, PublishResponse
+from .tiles import TileIndex
 
 LOGGER = logging.getLogger(__name__)
 
-_ID_PATTERN = re.compile(r"yokai-(\d+)$", re.IGNORECASE)
-
-
-def _strip_data_prefix(value: str) -> str:
-    if value.startswith("data:"):
-        return value.split(",", 1)[-1]
-    return value
-
 
 def _ensure_output_dirs(settings: Settings) -> None:
     settings.places_image_dir.mkdir(parents=True, exist_ok=True)
     settings.places_json_path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def _load_feature_collection(path: Path) -> dict[str, Any]:
-    if not path.exists():
-        return {"type": "FeatureCollection", "features": []}
+def _load_image_bytes(request: PublishRequest, settings: Settings) -> tuple[bytes, str]:
+    """Return the image bytes to publish and their media type."""
+    if request.image_id:
+        data, stored = ImageStore(settings).read(request.image_id)
+        return data, stored.media_type
+    assert request.image_base64 is not None
+    return normalize_upload(decode_base64_image(request.image_base64))
+
+
+def _save_thumbnail(data: bytes, feature_id: str, settings: Settings) -> str | None:
+    """Write a downscaled copy for map billboards and return its URL."""
+    if not settings.places_thumbnail_size:
+        return None
+    options = EncodeOptions(
+        format=settings.places_thumbnail_format,
+        quality=settings.output_quality,
+        png_compress_level=settings.png_compress_level,
+    )
+    thumb_name = f"{feature_id}.thumb{EXTENSIONS[options.media_type]}"
     try:
-        with path.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-        if isinstance(data, dict) and isinstance(data.get("features"), list):
-            return data
+        thumb = make_thumbnail(data, settings.places_thumbnail_size, options)
     except Exception as exc:  # noqa: BLE001
-        LOGGER.warning("Failed to read %s: %s. Re-initializing.", path, exc)
-    return {"type": "FeatureCollection", "features": []}
-
-
-def _pick_next_id(features: list[Any], requested: str | None) -> str:
-    if requested:
-        return requested
-    max_num = 0
-    for feat in features:
-        fid = ""
-        if isinstance(feat, dict):
-            props = feat.get("properties") or {}
-            fid = str(props.get("id") or feat.get("id") or "")
-        match = _ID_PATTERN.search(fid)
-        if match:
-            try:
-                max_num = max(max_num, int(match.group(1)))
-            except ValueError:
-                continue
-    return f"yokai-{max_num + 1:03d}"
-
-
-def _save_image_png(image_b64: str, dest_path: Path) -> None:
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    raw = _strip_data_prefix(image_b64)
-    data = b64decode(raw)
-    dest_path.write_bytes(data)
-
-
-def _replace_feature(features: list[Any], feature_id: str, new_feature: dict[str, Any]) -> list[Any]:
-    out: list[Any] = []
-    replaced = False
-    for feat in features:
-        fid = ""
-        if isinstance(feat, dict):
-            props = feat.get("properties") or {}
-            fid = str(props.get("id") or feat.get("id") or "")
-        if fid == feature_id:
-            out.append(new_feature)
-            replaced = True
-        else:
-            out.append(feat)
-    if not replaced:
-        out.append(new_feature)
-    return out
+        LOGGER.warning("Failed to create thumbnail for %s: %s", feature_id, exc)
+        return None
+    (settings.places_image_dir / thumb_name).write_bytes(thumb)
+    return f"{settings.places_image_url_prefix.rstrip('/')}/{thumb_name}"
+
+
+def _tile_index(settings: Settings) -> TileIndex | None:
+    if not settings.places_tiles_enabled:
+        return None
+    return TileIndex(settings.places_tiles_dir, settings.places_tile_zoom, settings.places_tiles_url_prefix)
 
 
 def publish_yokai(request: PublishRequest, settings: Settings | None = None) -> PublishResponse:
     """Persist a generated yokai PNG and append it to Cesium's GeoJSON."""
     cfg = settings or get_settings()
     _ensure_output_dirs(cfg)
-
-    fc = _load_feature_collection(cfg.places_json_path)
-    features: list[Any] = fc.get("features", [])
-    feature_id = _pick_next_id(features, request.metadata.id)
-    file_name = f"{feature_id}.png"
+    data, media_type = _load_image_bytes(request, cfg)
+    store = get_feature_store(
+        cfg.places_json_path,
+        flush_every=cfg.places_flush_every,
+        flush_interval=cfg.places_flush_interval_seconds,
+        make_tiles=lambda: _tile_index(cfg),
+    )
+    # Hold the store lock from id selection to upsert so concurrent publishes
+    # can neither pick the same id nor drop each other's features.
+    labels = {"model": request.model or "", "size": size_bucket(*image_size(data))}
+    with store.lock, PUBLISH_SECONDS.time(**labels):
+        return _publish_locked(request, cfg, store, data, media_type)
+
+
+def _publish_locked(
+    request: PublishRequest,
+    cfg: Settings,
+    store: FeatureStore,
+    data: bytes,
+    media_type: str,
+) -> PublishResponse:
+    feature_id = store.next_id(request.metadata.id)
+    file_name = f"{feature_id}{EXTENSIONS.get(media_type, '.png')}"
     image_path = cfg.places_image_dir / file_name
     image_url = f"{cfg.places_image_url_prefix.rstrip('/')}/{file_name}"
 
-    _save_image_png(request.image_base64, image_path)
+    image_path.parent.mkdir(parents=True, exist_ok=True)
+    image_path.write_bytes(data)
+    thumbnail_url = _save_thumbnail(data, feature_id, cfg)
 
     meta: PlaceMetadata = request.metadata
     properties: dict[str, Any] = {
@@ -111,6 +102,9 @@ def publish_yokai(request: PublishRequest, settings: Settings | None = None) ->
         "origin": meta.source or "yokai-gen",
     }
 
+    if thumbnail_url:
+        properties["thumbnail_url"] = thumbnail_url
+
     # Keep prompt context around for later debugging.
     if request.prompt:
         properties["prompt"] = request.prompt
@@ -120,6 +114,8 @@ def publish_yokai(request: PublishRequest, settings: Settings | None = None) ->
         properties["seed"] = request.seed
     if request.lora:
         properties["lora"] = request.lora
+    if request.model:
+        properties["model"] = request.model
 
     feature = {
         "type": "Feature",
@@ -130,14 +126,13 @@ def publish_yokai(request: PublishRequest, settings: Settings | None = None) ->
         "properties": properties,
     }
 
-    fc["features"] = _replace_feature(features, feature_id, feature)
-    with cfg.places_json_path.open("w", encoding="utf-8") as fh:
-        json.dump(fc, fh, ensure_ascii=False, indent=2)
+    places_count = store.upsert(feature)
 
     return PublishResponse(
         id=feature_id,
         image_url=image_url,
+        thumbnail_url=thumbnail_url,
         image_path=image_path,
         places_path=cfg.places_json_path,
-        places_count=len(fc["features"]),
+        places_count=places_count,
     )
@@ -0,0 +1,283 @@
+"""Persistent cache of finished generations for fully seeded requests."""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from .config import Settings, get_settings
+from .encoding import base64_fields
+from .feature_store import atomic_write_json
+from .image_store import EXTENSIONS, MEDIA_TYPES, ImageStore, image_store
+from .lru import LRUCache
+from .params import resolve_params
+from .schemas import GenerationRequest, ImageResult, ResultCacheStats
+from .storage import resolve_base_model
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when anything that changes pixels for identical parameters changes.
+CACHE_VERSION = 1
+# Fields that only change how results are delivered, not what is generated.
+_PRESENTATION_FIELDS = {"response_format", "latent_previews", "timeout_seconds"}
+# Replaced by their ``ResolvedParams`` values so explicit defaults hit the same entry.
+_RESOLVED_FIELDS = {"model", "scheduler", "steps", "guidance_scale", "width", "height", "strength"}
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".pt", ".ckpt")
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    data: bytes
+    media_type: str
+    seed: int
+    width: int
+    height: int
+
+
+def _file_fingerprint(path: Path) -> list[Any]:
+    stat = path.stat()
+    return [path.name, stat.st_size, stat.st_mtime_ns]
+
+
+def model_fingerprint(model_path: Path) -> str:
+    """Stat-based identity of every config and weight file in a diffusers model dir."""
+    entries: list[Any] = []
+    for path in sorted(model_path.rglob("*")):
+        if path.is_file() and (path.suffix in _WEIGHT_SUFFIXES or path.suffix == ".json"):
+            entries.append([str(path.relative_to(model_path))] + _file_fingerprint(path)[1:])
+    return hashlib.sha256(json.dumps(entries).encode()).hexdigest()
+
+
+class ResultCache:
+    """Maps a canonical hash of a seeded request to its encoded images.
+
+    The key covers every generation parameter after settings defaults are
+    resolved, plus stat fingerprints of the base model and LoRA files, so
+    swapping weights on disk invalidates old entries. Model fingerprints walk
+    the whole model dir, so they are memoized per path like catalog listings:
+    reused while the dir's mtime is unchanged, for at most
+    ``catalog_rescan_seconds``. Entries live in a
+    memory LRU (``result_cache_memory_mb``) in front of a directory LRU
+    (``result_cache_disk_mb``) that survives restarts; a hit re-registers
+    the images with the image store so their URLs resolve again.
+    """
+
+    def __init__(self, settings: Settings | None = None, store: ImageStore | None = None) -> None:
+        self.settings = settings or get_settings()
+        self.store = store or image_store
+        self.root = self.settings.result_cache_dir
+        self._lock = threading.RLock()
+        self._memory: LRUCache[str, list[CachedImage]] = LRUCache(
+            max_bytes=self.settings.result_cache_memory_mb * 1024 * 1024,
+        )
+        self._disk: LRUCache[str, list[Path]] = LRUCache(
+            max_bytes=self.settings.result_cache_disk_mb * 1024 * 1024,
+            on_evict=self._delete,
+        )
+        self._disk_loaded = False
+        # model dir -> (dir mtime, computed at, fingerprint)
+        self._fingerprints: dict[Path, tuple[int, float, str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.result_cache_enabled
+
+    def key_for(self, request: GenerationRequest) -> str | None:
+        """Canonical hash for ``request``, or None when it cannot be reproduced."""
+        if request.seed is None:
+            return None
+        cfg = self.settings
+        params = request.model_dump(mode="json", exclude=_PRESENTATION_FIELDS | _RESOLVED_FIELDS)
+        params.update(
+            dataclasses.asdict(resolve_params(request, cfg)),
+            num_images=min(request.num_images, cfg.max_batch_size),
+            output_format=request.output_format or cfg.output_format,
+            output_quality=request.output_quality or cfg.output_quality,
+            lora_scales={name: request.lora_scales.get(name, 1.0) for name in request.lora},
+        )
+        try:
+            model_path = resolve_base_model(request.model, cfg)
+            params["model"] = model_path.name
+            params["model_fingerprint"] = self._model_fingerprint(model_path)
+            params["lora_fingerprints"] = [_file_fingerprint(cfg.lora_dir / name) for name in request.lora]
+        except FileNotFoundError:
+            # Let the pipeline raise the proper 404.
+            return None
+        params["cache_version"] = CACHE_VERSION
+        canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _model_fingerprint(self, model_path: Path) -> str:
+        dir_mtime = model_path.stat().st_mtime_ns
+        with self._lock:
+            cached = self._fingerprints.get(model_path)
+        if (
+            cached is not None
+            and cached[0] == dir_mtime
+            and time.monotonic() - cached[1] < self.settings.catalog_rescan_seconds
+        ):
+            return cached[2]
+        fingerprint = model_fingerprint(model_path)
+        with self._lock:
+            self._fingerprints[model_path] = (dir_mtime, time.monotonic(), fingerprint)
+        return fingerprint
+
+    def _delete(self, key: str, paths: list[Path]) -> None:
+        for path in paths:
+            path.unlink(missing_ok=True)
+
+    def _ensure_disk_index(self) -> None:
+        if self._disk_loaded:
+            return
+        self._disk_loaded = True
+        if not self.root.exists():
+            return
+        # One directory listing grouped by key (``<key>.json``, ``<key>.<idx>.<ext>``), not a glob per entry.
+        manifests: list[tuple[float, Path]] = []
+        images: dict[str, list[Path]] = {}
+        for path in self.root.iterdir():
+            key = path.name.split(".", 1)[0]
+            if path.suffix == ".json":
+                manifests.append((path.stat().st_mtime, path))
+            elif path.suffix in MEDIA_TYPES:
+                images.setdefault(key, []).append(path)
+        for _mtime, manifest in sorted(manifests):
+            key = manifest.stem
+            paths = [manifest] + sorted(images.get(key, []))
+            self._disk.put(key, paths, size=sum(p.stat().st_size for p in paths))
+
+    def _read_disk(self, key: str) -> list[CachedImage] | None:
+        paths = self._disk.get(key)
+        if paths is None:
+            return None
+        manifest = self.root / f"{key}.json"
+        try:
+            meta = json.loads(manifest.read_text(encoding="utf-8"))
+            images = [
+                CachedImage(
+                    data=(self.root / item["file"]).read_bytes(),
+                    media_type=item["media_type"],
+                    seed=item["seed"],
+                    width=item["width"],
+                    height=item["height"],
+                )
+                for item in meta["images"]
+            ]
+        except (OSError, ValueError, KeyError) as exc:
+            LOGGER.warning("Dropping unreadable result cache entry %s: %s", key, exc)
+            self._disk.pop(key)
+            self._delete(key, paths)
+            return None
+        os.utime(manifest)
+        return images
+
+    def _write_disk(self, key: str, images: list[CachedImage]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        paths: list[Path] = []
+        items = []
+        for idx, image in enumerate(images):
+            path = self.root / f"{key}.{idx}{EXTENSIONS[image.media_type]}"
+            path.write_bytes(image.data)
+            paths.append(path)
+            items.append(
+                {
+                    "file": path.name,
+                    "media_type": image.media_type,
+                    "seed": image.seed,
+                    "width": image.width,
+                    "height": image.height,
+                }
+            )
+        manifest = self.root / f"{key}.json"
+        # The manifest goes last so a crash never leaves one pointing at missing files.
+        atomic_write_json(manifest, {"images": items})
+        paths.insert(0, manifest)
+        self._disk.put(key, paths, size=sum(p.stat().st_size for p in paths))
+
+    def get(self, request: GenerationRequest) -> list[ImageResult] | None:
+        if not self.enabled:
+            return None
+        key = self.key_for(request)
+        if key is None:
+            return None
+        with self._lock:
+            images = self._memory.get(key)
+            if images is None:
+                self._ensure_disk_index()
+                images = self._read_disk(key)
+                if images is not None:
+                    self._memory.put(key, images, size=sum(len(image.data) for image in images))
+            if images is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [self._to_result(request, image) for image in images]
+
+    def put(self, request: GenerationRequest, results: list[ImageResult]) -> None:
+        if not self.enabled:
+            return
+        key = self.key_for(request)
+        if key is None:
+            return
+        images = []
+        for result in results:
+            if result.image_id is None:
+                return
+            data, stored = self.store.read(result.image_id)
+            images.append(
+                CachedImage(
+                    data=data,
+                    media_type=stored.media_type,
+                    seed=result.seed,
+                    width=result.width,
+                    height=result.height,
+                )
+            )
+        with self._lock:
+            self._ensure_disk_index()
+            self._memory.put(key, images, size=sum(len(image.data) for image in images))
+            try:
+                self._write_disk(key, images)
+            except OSError as exc:
+                LOGGER.warning("Failed to persist result cache entry %s: %s", key, exc)
+            self.stores += 1
+
+    def _to_result(self, request: GenerationRequest, image: CachedImage) -> ImageResult:
+        stored = self.store.put(image.data, image.media_type)
+        return ImageResult(
+            image_id=stored.id,
+            url=self.store.url_for(stored.id),
+            media_type=image.media_type,
+            seed=image.seed,
+            width=image.width,
+            height=image.height,
+            lora=request.lora,
+            **(base64_fields(image.data, image.media_type) if request.response_format == "base64" else {}),
+        )
+
+    def stats(self) -> ResultCacheStats:
+        with self._lock:
+            self._ensure_disk_index()
+            return ResultCacheStats(
+                enabled=self.enabled,
+                hits=self.hits,
+                misses=self.misses,
+                stores=self.stores,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory.total_bytes,
+                memory_budget_bytes=self._memory.max_bytes or 0,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk.total_bytes,
+                disk_budget_bytes=self._disk.max_bytes or 0,
+            )
@@ -5,7 +5,9 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+SchedulerName = Literal["euler_a", "euler", "dpmpp_2m", "dpmpp_2m_karras", "unipc", "ddim", "lcm"]
 
 
 class GenerationRequest(BaseModel):
@@ -17,11 +19,84 @@ class GenerationRequest(BaseModel):
     width: int | None = Field(default=None, ge=256, le=1536, multiple_of=64)
     height: int | None = Field(default=None, ge=256, le=1536, multiple_of=64)
     num_images: int = Field(default=1, ge=1, le=4)
+    model: str | None = Field(default=None, description="Base model name from /models (default model if omitted)")
     lora: list[str] = Field(default_factory=list, description="LoRA filenames to apply")
+    lora_scales: dict[str, float] = Field(
+        default_factory=dict,
+        description="Per-LoRA adapter weight keyed by filename (default 1.0)",
+    )
+    scheduler: SchedulerName | None = Field(
+        default=None,
+        description=(
+            "Sampler (defaults to lcm with an LCM-LoRA from Settings.lcm_loras, else Settings.scheduler / "
+            "preview_scheduler); lcm is rejected without one"
+        ),
+    )
+    quality: Literal["full", "preview"] = Field(
+        default="full",
+        description="preview: few steps at reduced resolution; width/height stay the full-size target",
+    )
+    init_image_id: str | None = Field(default=None, description="Image store id to start from (img2img)")
+    mask_image_id: str | None = Field(
+        default=None,
+        description="Image store id of an inpainting mask (white = repaint); requires init_image_id",
+    )
+    strength: float | None = Field(default=None, gt=0.0, le=1.0, description="img2img denoising strength")
+    latent_previews: bool = Field(default=False, description="Attach low-res latent previews to job progress")
+    timeout_seconds: float | None = Field(
+        default=None,
+        gt=0.0,
+        description="Deadline from admission; queued or running work is abandoned once it passes",
+    )
+    output_format: Literal["png", "webp", "jpeg"] | None = Field(
+        default=None,
+        description="Encoding for the stored image (defaults to Settings.output_format)",
+    )
+    output_quality: int | None = Field(default=None, ge=1, le=100, description="WebP/JPEG quality")
+    response_format: Literal["url", "base64"] = Field(
+        default="url",
+        description="Return stored image ids/URLs only, or also inline base64",
+    )
+
+    @model_validator(mode="after")
+    def _mask_needs_init_image(self) -> "GenerationRequest":
+        if self.mask_image_id and not self.init_image_id:
+            raise ValueError("mask_image_id requires init_image_id")
+        return self
+
+
+class ImageEditRequest(GenerationRequest):
+    """img2img / inpaint input: stored image ids or inline uploads (base64)."""
+
+    init_image_base64: str | None = Field(default=None, description="Upload instead of init_image_id")
+    mask_image_base64: str | None = Field(default=None, description="Upload instead of mask_image_id")
+
+    @model_validator(mode="after")
+    def _require_init_image(self) -> "ImageEditRequest":
+        if not self.init_image_id and not self.init_image_base64:
+            raise ValueError("init_image_id or init_image_base64 is required")
+        return self
+
+
+class AcceptRequest(BaseModel):
+    """Re-render a preview at full quality, starting from the preview image."""
+
+    image_id: str = Field(..., description="Image store id of the accepted preview")
+    seed: int = Field(..., ge=0, description="Seed reported for that preview image")
+    request: GenerationRequest = Field(..., description="The request that produced the preview")
+    strength: float | None = Field(default=None, gt=0.0, le=1.0, description="Defaults to Settings.upscale_strength")
 
 
 class ImageResult(BaseModel):
-    base64_png: str
+    image_id: str | None = Field(default=None, description="Content hash in the image store")
+    url: str | None = Field(default=None, description="Path serving the raw image bytes")
+    media_type: str = "image/png"
+    base64_data: str | None = Field(default=None, description="Encoded image as base64 (format in media_type)")
+    base64_png: str | None = Field(
+        default=None,
+        description="Deprecated: use base64_data. Same payload, only set when media_type is image/png",
+        json_schema_extra={"deprecated": True},
+    )
     seed: int
     width: int
     height: int
@@ -30,21 +105,100 @@ class ImageResult(BaseModel):
 
 class GenerationResponse(BaseModel):
     images: list[ImageResult]
+    queue_position: int | None = Field(
+        default=None,
+        description=(
+            "Position in the queue when admitted. Only known to the caller once the generation finished; "
+            "use POST /jobs or /generate?stream=true to see it while waiting"
+        ),
+    )
+    cached: bool = Field(default=False, description="Served from the result cache")
+
+
+class JobStatus(BaseModel):
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed", "cancelled"]
+    queue_position: int | None = None
+    step: int = 0
+    total_steps: int | None = None
+    preview_png: str | None = Field(default=None, description="Low-res latent preview (base64 PNG)")
+    images: list[ImageResult] | None = None
+    error: str | None = None
+    created_at: float
+    updated_at: float
 
 
 class ModelInfo(BaseModel):
     name: str
     path: Path
+    default: bool = False
+    resident: Literal["device", "cpu"] | None = None
+    size_bytes: int = 0
+    pipeline_class: str | None = Field(default=None, description="_class_name from model_index.json")
 
 
 class LoraInfo(BaseModel):
     name: str
     path: Path
+    size_bytes: int = 0
+    sha256: str | None = Field(default=None, description="Content hash; null until first computed (see ?hash=true)")
+    base_model: str | None = Field(default=None, description="Base model recorded in the safetensors metadata")
+    sdxl: bool | None = Field(default=None, description="Whether the weights target SDXL; null if unknown")
+    rank: int | None = None
+    alpha: float | None = None
+    trigger_words: list[str] = Field(default_factory=list)
+
+
+class QueueStats(BaseModel):
+    queue_depth: int
+    max_queue_depth: int
+    running: bool
+    batches_run: int
+    requests_run: int
+    images_run: int
+    avg_batch_requests: float
+    batch_size_histogram: dict[str, int]
+    last_batch_seconds: float | None = None
+
+
+class LoraCacheStats(BaseModel):
+    model: str | None = None
+    hits: int
+    misses: int
+    evictions: int
+    resident: dict[str, int] = Field(description="Resident LoRA filename -> size in bytes")
+    resident_bytes: int
+    budget_bytes: int
+    active: list[str]
+
+
+class PromptCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    max_entries: int
+
+
+class ResultCacheStats(BaseModel):
+    enabled: bool
+    hits: int
+    misses: int
+    stores: int
+    memory_entries: int
+    memory_bytes: int
+    memory_budget_bytes: int
+    disk_entries: int
+    disk_bytes: int
+    disk_budget_bytes: int
 
 
 class HealthResponse(BaseModel):
     status: Literal["ok"]
     device: str
+    ready: bool = False
+    pipeline_state: str = "cold"
+    detail: str | None = None
 
 
 class PlaceMetadata(BaseModel):
@@ -66,16 +220,25 @@ class PublishRequest(BaseModel):
     """Publish a generated image into the Cesium GeoJSON dataset."""
 
     metadata: PlaceMetadata
-    image_base64: str = Field(..., description="PNG data (base64, without data URI)")
+    image_id: str | None = Field(default=None, description="Id of a generated image in the image store")
+    image_base64: str | None = Field(default=None, description="PNG/WebP/JPEG data (base64, data URI allowed)")
     prompt: str | None = None
     negative_prompt: str | None = None
     seed: int | None = None
     lora: list[str] = Field(default_factory=list)
+    model: str | None = Field(default=None, description="Base model the image was generated with")
+
+    @model_validator(mode="after")
+    def _require_image(self) -> "PublishRequest":
+        if not self.image_id and not self.image_base64:
+            raise ValueError("either image_id or image_base64 is required")
+        return self
 
 
 class PublishResponse(BaseModel):
     id: str
     image_url: str
+    thumbnail_url: str | None = None
     image_path: Path
     places_path: Path
     places_count: int
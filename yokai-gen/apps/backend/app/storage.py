@@ -16,12 +16,44 @@ def _list_files(directory: Path, suffixes: tuple[str, ...]) -> list[Path]:
     )
 
 
-def list_base_models(settings: Settings | None = None) -> list[Path]:
+def _is_diffusers_dir(path: Path) -> bool:
+    return (path / "model_index.json").exists()
+
+
+def default_model_path(settings: Settings | None = None) -> Path:
     cfg = settings or get_settings()
     if cfg.default_model_subdir:
-        target = cfg.model_dir / cfg.default_model_subdir
-        return [target] if target.exists() else []
-    return [cfg.model_dir] if cfg.model_dir.exists() else []
+        return cfg.model_dir / cfg.default_model_subdir
+    return cfg.model_dir
+
+
+def list_base_models(settings: Settings | None = None) -> list[Path]:
+    """Default model first, then every diffusers model directory under ``model_dir``."""
+    cfg = settings or get_settings()
+    if not cfg.model_dir.exists():
+        return []
+    models = sorted(
+        (p for p in cfg.model_dir.iterdir() if p.is_dir() and _is_diffusers_dir(p)),
+        key=lambda p: p.name,
+    )
+    default = default_model_path(cfg)
+    if default.exists():
+        models = [default] + [p for p in models if p != default]
+    return models
+
+
+def resolve_base_model(name: str | None, settings: Settings | None = None) -> Path:
+    """Map a model name from ``/models`` (None = default) to its directory."""
+    cfg = settings or get_settings()
+    if name is None:
+        path = default_model_path(cfg)
+        if not path.exists():
+            raise FileNotFoundError(f"Base model directory not found: {path}")
+        return path
+    for path in list_base_models(cfg):
+        if path.name == name:
+            return path
+    raise FileNotFoundError(f"Base model not found: {name}")
 
 
 def list_lora_weights(settings: Settings | None = None) -> list[Path]:
@@ -0,0 +1,146 @@
+"""Single-zoom tile export of places.json for viewport-based loading in Cesium.
+
+Tiles follow Cesium's GeographicTilingScheme at one level (``places_tile_zoom``);
+parent levels are not written.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from .feature_store import atomic_write_json
+
+LOGGER = logging.getLogger(__name__)
+
+TileKey = tuple[int, int]
+
+
+def _coordinates(feature: Any) -> tuple[float, float] | None:
+    try:
+        lon, lat = feature["geometry"]["coordinates"][:2]
+        return float(lon), float(lat)
+    except (KeyError, TypeError, ValueError, IndexError):
+        return None
+
+
+def tile_for(lon: float, lat: float, zoom: int) -> TileKey:
+    """Tile (x, y) in Cesium's GeographicTilingScheme: 2^(z+1) x 2^z tiles, y from the north."""
+    cols = 2 ** (zoom + 1)
+    rows = 2**zoom
+    x = math.floor((lon + 180.0) / 360.0 * cols)
+    y = math.floor((90.0 - lat) / 180.0 * rows)
+    return min(max(x, 0), cols - 1), min(max(y, 0), rows - 1)
+
+
+def tile_bbox(key: TileKey, zoom: int) -> list[float]:
+    """[west, south, east, north] in degrees."""
+    x, y = key
+    width = 360.0 / 2 ** (zoom + 1)
+    height = 180.0 / 2**zoom
+    west = -180.0 + x * width
+    north = 90.0 - y * height
+    return [west, north - height, west + width, north]
+
+
+class TileIndex:
+    """Keeps per-tile membership for a feature set and rewrites only tiles that changed.
+
+    Layout under ``root``: ``<zoom>/<x>/<y>.json`` FeatureCollections plus a
+    ``manifest.json`` listing every non-empty tile with its bbox and count.
+    Features are tracked by an opaque key (the feature id in practice).
+    """
+
+    def __init__(self, root: Path, zoom: int, url_prefix: str = "/tiles") -> None:
+        self.root = root
+        self.zoom = zoom
+        self.url_prefix = url_prefix.rstrip("/")
+        self._tile_of: dict[str, TileKey] = {}
+        self._members: dict[TileKey, set[str]] = {}
+        self._dirty: set[TileKey] = set()
+
+    def rebuild(self, features: dict[str, Any]) -> None:
+        self._tile_of.clear()
+        self._members.clear()
+        for key, feature in features.items():
+            self.place(key, feature)
+        # Tiles on disk may predate this process; rewrite everything once.
+        self._dirty = set(self._members)
+        self._dirty.update(self._existing_tiles())
+
+    def place(self, key: str, feature: Any) -> None:
+        """Record (or move) ``key`` to the tile containing ``feature``."""
+        coords = _coordinates(feature)
+        new_tile = tile_for(coords[0], coords[1], self.zoom) if coords else None
+        old_tile = self._tile_of.get(key)
+        if old_tile is not None:
+            self._dirty.add(old_tile)
+            if old_tile != new_tile:
+                self._members[old_tile].discard(key)
+                if not self._members[old_tile]:
+                    del self._members[old_tile]
+        if new_tile is None:
+            self._tile_of.pop(key, None)
+            return
+        self._tile_of[key] = new_tile
+        self._members.setdefault(new_tile, set()).add(key)
+        self._dirty.add(new_tile)
+
+    def _tile_path(self, key: TileKey) -> Path:
+        x, y = key
+        return self.root / str(self.zoom) / str(x) / f"{y}.json"
+
+    def _existing_tiles(self) -> set[TileKey]:
+        zoom_dir = self.root / str(self.zoom)
+        if not zoom_dir.exists():
+            return set()
+        found: set[TileKey] = set()
+        for path in zoom_dir.glob("*/*.json"):
+            try:
+                found.add((int(path.parent.name), int(path.stem)))
+            except ValueError:
+                continue
+        return found
+
+    def write(self, lookup: Callable[[str], Any]) -> int:
+        """Write dirty tiles and the manifest; returns the number of tiles touched."""
+        if not self._dirty:
+            return 0
+        touched = 0
+        for tile in sorted(self._dirty):
+            path = self._tile_path(tile)
+            members = self._members.get(tile)
+            if not members:
+                path.unlink(missing_ok=True)
+            else:
+                features = [lookup(key) for key in sorted(members)]
+                atomic_write_json(path, {"type": "FeatureCollection", "features": features})
+            touched += 1
+        self._dirty.clear()
+        self._write_manifest()
+        LOGGER.debug("Rewrote %s tile(s) under %s", touched, self.root)
+        return touched
+
+    def _write_manifest(self) -> None:
+        tiles = []
+        for (x, y), members in sorted(self._members.items()):
+            tiles.append(
+                {
+                    "x": x,
+                    "y": y,
+                    "count": len(members),
+                    "bbox": tile_bbox((x, y), self.zoom),
+                    "url": f"{self.url_prefix}/{self.zoom}/{x}/{y}.json",
+                }
+            )
+        manifest = {
+            "scheme": "geographic",
+            "zoom": self.zoom,
+            "feature_count": len(self._tile_of),
+            "updated_at": time.time(),
+            "tiles": tiles,
+        }
+        atomic_write_json(self.root / "manifest.json", manifest)
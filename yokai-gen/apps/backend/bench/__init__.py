@@ -0,0 +1 @@
+"""In-process load tests for the backend with a stubbed diffusion pipeline."""
@@ -0,0 +1,280 @@
+"""Drive /generate and /publish in-process against a stub pipeline and report latencies.
+
+Run from ``yokai-gen/`` as a fresh process (settings are read at import)::
+
+    python -m apps.backend.bench.loadtest --requests 200 --concurrency 16 \\
+        --sizes 512x512,1024x1024 --lora-pool 6 --lora-ratio 0.5 --output bench.json
+
+The JSON report has p50/p95/p99 latency, throughput and peak RSS per
+endpoint plus the server's own queue and LoRA cache stats. ``--max-p95-ms``
+turns it into a regression gate (exit code 1 when exceeded).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+
+@dataclass
+class BenchConfig:
+    requests: int = 100
+    concurrency: int = 8
+    sizes: list[tuple[int, int]] = field(default_factory=lambda: [(512, 512), (1024, 1024)])
+    steps: int = 20
+    num_images: int = 1
+    lora_pool: int = 4
+    lora_ratio: float = 0.5
+    publish_ratio: float = 0.25
+    prompt_pool: int = 16
+    step_ms: float = 10.0
+    lora_load_ms: float = 50.0
+    seed: int = 0
+
+
+def parse_sizes(text: str) -> list[tuple[int, int]]:
+    sizes = []
+    for item in text.split(","):
+        width, _, height = item.strip().lower().partition("x")
+        sizes.append((int(width), int(height or width)))
+    return sizes
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Linear-interpolated percentile (``q`` in 0..100), None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies: list[float], errors: dict[str, int], wall_seconds: float) -> dict[str, Any]:
+    def ms(value: float | None) -> float | None:
+        return round(value * 1000.0, 2) if value is not None else None
+
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds > 0 else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies)) if latencies else None,
+    }
+
+
+def peak_rss_bytes() -> int | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _write_stub_lora(path: Path, rank: int) -> None:
+    header = {
+        "__metadata__": {"ss_base_model_version": "sdxl_base_v1-0", "ss_network_dim": str(rank)},
+        "lora_te2_text_model_encoder_layers_0_mlp_fc1.lora_down.weight": {
+            "dtype": "F16",
+            "shape": [rank, 1280],
+            "data_offsets": [0, rank * 1280 * 2],
+        },
+    }
+    raw = json.dumps(header).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(raw)) + raw + b"\0" * (rank * 1280 * 2))
+
+
+def prepare_workspace(root: Path, config: BenchConfig) -> dict[str, str]:
+    """Create a fake model dir and LoRA files under ``root``; return the env to point settings at them."""
+    model_dir = root / "models" / "base"
+    (model_dir / "stub").mkdir(parents=True)
+    (model_dir / "stub" / "model_index.json").write_text('{"_class_name": "StubPipeline"}', encoding="utf-8")
+    lora_dir = root / "models" / "lora"
+    lora_dir.mkdir(parents=True)
+    for idx in range(config.lora_pool):
+        _write_stub_lora(lora_dir / f"bench_{idx}.safetensors", rank=8 * (idx % 4 + 1))
+    web = root / "web"
+    return {
+        "YOKAI_MODEL_DIR": str(model_dir),
+        "YOKAI_DEFAULT_MODEL_SUBDIR": "stub",
+        "YOKAI_LORA_DIR": str(lora_dir),
+        "YOKAI_IMAGE_STORE_DIR": str(root / "outputs" / "images"),
+        "YOKAI_RESULT_CACHE_DIR": str(root / "outputs" / "result_cache"),
+        "YOKAI_RESULT_CACHE_ENABLED": "false",
+        "YOKAI_PLACES_JSON_PATH": str(web / "places.json"),
+        "YOKAI_PLACES_IMAGE_DIR": str(web / "img" / "yokai"),
+        "YOKAI_PLACES_TILES_DIR": str(web / "tiles"),
+    }
+
+
+def _plan(config: BenchConfig) -> list[dict[str, Any]]:
+    rng = random.Random(config.seed)
+    loras = [f"bench_{idx}.safetensors" for idx in range(config.lora_pool)]
+    plan = []
+    for idx in range(config.requests):
+        width, height = rng.choice(config.sizes)
+        payload: dict[str, Any] = {
+            "prompt": f"bench yokai {rng.randrange(config.prompt_pool)}",
+            "width": width,
+            "height": height,
+            "steps": config.steps,
+            "num_images": config.num_images,
+            "seed": idx,
+        }
+        if loras and rng.random() < config.lora_ratio:
+            payload["lora"] = [rng.choice(loras)]
+        plan.append({"generate": payload, "publish": rng.random() < config.publish_ratio})
+    return plan
+
+
+async def run(config: BenchConfig) -> dict[str, Any]:
+    # Imported here so the caller's environment (see ``prepare_workspace``) is in place first.
+    from ..app.main import create_app
+    from .stub import StubPipelineManager
+
+    manager = StubPipelineManager(step_seconds=config.step_ms / 1000.0, lora_load_seconds=config.lora_load_ms / 1000.0)
+    app = create_app(manager)
+    plan = _plan(config)
+    latencies: dict[str, list[float]] = {"generate": [], "publish": []}
+    errors: dict[str, dict[str, int]] = {"generate": {}, "publish": {}}
+    jobs: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+    for item in plan:
+        jobs.put_nowait(item)
+
+    async def timed(client: httpx.AsyncClient, endpoint: str, payload: dict[str, Any]) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"/{endpoint}", json=payload)
+        except httpx.HTTPError as exc:
+            errors[endpoint][type(exc).__name__] = errors[endpoint].get(type(exc).__name__, 0) + 1
+            return None
+        if response.status_code != 200:
+            key = str(response.status_code)
+            errors[endpoint][key] = errors[endpoint].get(key, 0) + 1
+            return None
+        latencies[endpoint].append(time.perf_counter() - started)
+        return response
+
+    async def worker(client: httpx.AsyncClient, rng: random.Random) -> None:
+        while not jobs.empty():
+            item = jobs.get_nowait()
+            response = await timed(client, "generate", item["generate"])
+            if response is None or not item["publish"]:
+                continue
+            image = response.json()["images"][0]
+            publish = {
+                "image_id": image["image_id"],
+                "prompt": item["generate"]["prompt"],
+                "seed": image["seed"],
+                "metadata": {
+                    "title": item["generate"]["prompt"],
+                    "longitude": rng.uniform(129.0, 146.0),
+                    "latitude": rng.uniform(31.0, 45.0),
+                },
+            }
+            await timed(client, "publish", publish)
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Load the stub model outside the measured window.
+            await client.post("/generate", json={"prompt": "warmup", "steps": 1, "width": 256, "height": 256})
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(worker(client, random.Random(config.seed + idx)) for idx in range(max(1, config.concurrency)))
+            )
+            wall = time.perf_counter() - started
+            queue = (await client.get("/queue")).json()
+            lora_cache = (await client.get("/lora/cache")).json()
+
+    return {
+        "config": asdict(config),
+        "wall_seconds": round(wall, 3),
+        "generate": summarize(latencies["generate"], errors["generate"], wall),
+        "publish": summarize(latencies["publish"], errors["publish"], wall),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "queue": queue,
+        "lora_cache": lora_cache,
+    }
+
+
+def _parse_args(argv: list[str] | None) -> tuple[BenchConfig, argparse.Namespace]:
+    defaults = BenchConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=defaults.requests)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument("--sizes", type=parse_sizes, default=defaults.sizes, help="e.g. 512x512,1024x768")
+    parser.add_argument("--steps", type=int, default=defaults.steps)
+    parser.add_argument("--num-images", type=int, default=defaults.num_images)
+    parser.add_argument("--lora-pool", type=int, default=defaults.lora_pool, help="distinct LoRA files")
+    parser.add_argument("--lora-ratio", type=float, default=defaults.lora_ratio, help="share of requests with a LoRA")
+    parser.add_argument("--publish-ratio", type=float, default=defaults.publish_ratio)
+    parser.add_argument("--prompt-pool", type=int, default=defaults.prompt_pool, help="distinct prompts")
+    parser.add_argument("--step-ms", type=float, default=defaults.step_ms, help="stub cost per step at 1024x1024")
+    parser.add_argument("--lora-load-ms", type=float, default=defaults.lora_load_ms)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", type=Path, default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="fail if /generate p95 exceeds this")
+    args = parser.parse_args(argv)
+    config = BenchConfig(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        sizes=args.sizes,
+        steps=args.steps,
+        num_images=args.num_images,
+        lora_pool=args.lora_pool,
+        lora_ratio=args.lora_ratio,
+        publish_ratio=args.publish_ratio,
+        prompt_pool=args.prompt_pool,
+        step_ms=args.step_ms,
+        lora_load_ms=args.lora_load_ms,
+        seed=args.seed,
+    )
+    return config, args
+
+
+def main(argv: list[str] | None = None) -> int:
+    config, args = _parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="yokai-bench-") as tmp:
+        for key, value in prepare_workspace(Path(tmp), config).items():
+            os.environ.setdefault(key, value)
+        report = asyncio.run(run(config))
+
+    text = json.dumps(report, indent=2)
+    if args.output is not None:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    generate = report["generate"]
+    print(
+        f"[bench] {generate['count']} generate(s), {generate['throughput_rps']} req/s, "
+        f"p50={generate['p50_ms']}ms p95={generate['p95_ms']}ms p99={generate['p99_ms']}ms, "
+        f"errors={generate['errors']}",
+        file=sys.stderr,
+    )
+    if args.max_p95_ms is not None and (generate["p95_ms"] is None or generate["p95_ms"] > args.max_p95_ms):
+        print(f"[bench] p95 above --max-p95-ms={args.max_p95_ms}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""A CPU-only stand-in for ``PipelineManager`` that needs no torch or weights.
+
+Only the denoising loop is faked (a sleep per step, scaled by pixels and
+images). Model residency, LoRA switching, prompt caching, progress callbacks
+and cancellation go through the real classes, so the queueing, encoding and
+publish paths under test behave as in production.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterable, Mapping
+
+from PIL import Image
+
+from ..app.batching import ImageSink, ProgressCallback
+from ..app.catalog import Catalog
+from ..app.config import Settings, get_settings
+from ..app.encoding import GeneratedImage
+from ..app.lora_cache import LoraAdapterCache
+from ..app.model_registry import ModelRegistry, RegistryHooks
+from ..app.params import resolve_params
+from ..app.prompt_cache import PromptEmbeddingCache
+from ..app.schemas import GenerationRequest, LoraCacheStats
+from ..app.storage import resolve_base_model
+
+_REFERENCE_PIXELS = 1024 * 1024
+
+
+class _StubPipe:
+    """Accepts the LoRA calls ``LoraAdapterCache`` makes; loading costs ``load_seconds``."""
+
+    def __init__(self, load_seconds: float) -> None:
+        self.load_seconds = load_seconds
+
+    def load_lora_weights(self, path: Any, adapter_name: str) -> None:
+        time.sleep(self.load_seconds)
+
+    def delete_adapters(self, adapter_name: str) -> None:
+        pass
+
+    def set_adapters(self, adapters: list[str], adapter_weights: list[float]) -> None:
+        pass
+
+    def disable_lora(self) -> None:
+        pass
+
+    def enable_lora(self) -> None:
+        pass
+
+
+@dataclass
+class _StubModel:
+    name: str
+    pipe: _StubPipe
+    lora_cache: LoraAdapterCache
+
+
+class StubPipelineManager:
+    """Mimics the ``PipelineManager`` surface ``create_app`` relies on.
+
+    ``step_seconds`` is the cost of one step for one 1024x1024 image;
+    ``lora_load_seconds`` the cost of loading an adapter that is not resident.
+    """
+
+    def __init__(
+        self,
+        settings: Settings | None = None,
+        step_seconds: float = 0.01,
+        lora_load_seconds: float = 0.05,
+        model_load_seconds: float = 0.2,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self.step_seconds = step_seconds
+        self.lora_load_seconds = lora_load_seconds
+        self.model_load_seconds = model_load_seconds
+        self.device = SimpleNamespace(type="cpu")
+        self.catalog = Catalog(self.settings)
+        self.registry: ModelRegistry[_StubModel] = ModelRegistry(
+            RegistryHooks(
+                estimate=lambda name: 0,
+                load=self._load_model,
+                to_device=lambda model: None,
+                offload=lambda model: None,
+                release=lambda model: None,
+            ),
+            self.settings,
+            can_offload=False,
+        )
+        self.prompt_cache: PromptEmbeddingCache[tuple[Any, ...]] = PromptEmbeddingCache(self.settings)
+        self.state = "ready"
+        self.state_detail: str | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def _load_model(self, name: str) -> _StubModel:
+        time.sleep(self.model_load_seconds)
+        return _StubModel(
+            name=name,
+            pipe=_StubPipe(self.lora_load_seconds),
+            lora_cache=LoraAdapterCache(self.settings, model=name, catalog=self.catalog),
+        )
+
+    def warmup(self) -> None:
+        self.registry.acquire(resolve_base_model(None, self.settings).name)
+
+    def residency(self, model_path: Path) -> str | None:
+        return self.registry.residency(model_path.name)
+
+    def lora_cache_stats(self) -> list[LoraCacheStats]:
+        return [model.lora_cache.stats() for _name, model in self.registry.loaded_models()]
+
+    def device_memory(self) -> dict[str, int]:
+        return {}
+
+    def _apply_lora(self, model: _StubModel, names: Iterable[str], scales: Mapping[str, float]) -> None:
+        model.lora_cache.activate(model.pipe, list(names), scales)
+
+    def generate_batch(
+        self,
+        requests: list[GenerationRequest],
+        progress: list[ProgressCallback | None] | None = None,
+        image_sinks: list[ImageSink] | None = None,
+    ) -> list[list[GeneratedImage]]:
+        first = requests[0]
+        params = resolve_params(first, self.settings)
+        model = self.registry.acquire(resolve_base_model(first.model, self.settings).name)
+        self._apply_lora(model, first.lora, first.lora_scales)
+        counts = [min(request.num_images, self.settings.max_batch_size) for request in requests]
+        for request in requests:
+            # Same key shape as the real pipeline, so hit rates are comparable.
+            self.prompt_cache.get_or_encode(
+                (model.name, request.prompt, request.negative_prompt, params.guidance > 1.0, tuple(first.lora)),
+                lambda: True,
+            )
+
+        steps = params.steps if params.strength is None else max(1, int(params.steps * params.strength))
+        per_step = self.step_seconds * sum(counts) * params.width * params.height / _REFERENCE_PIXELS
+        for step in range(1, steps + 1):
+            time.sleep(per_step)
+            for report in progress or []:
+                if report is not None:
+                    report(step, steps, None)
+
+        results: list[list[GeneratedImage]] = []
+        for position, (request, count) in enumerate(zip(requests, counts)):
+            seed = request.seed if request.seed is not None else 0
+            generated = []
+            for idx in range(count):
+                item = GeneratedImage(
+                    image=_noise_image(params.width, params.height, f"{request.prompt}:{seed + idx}"),
+                    seed=seed + idx,
+                    width=params.width,
+                    height=params.height,
+                )
+                if image_sinks is not None:
+                    image_sinks[position](idx, item)
+                generated.append(item)
+            results.append(generated)
+        return results
+
+
+def _noise_image(width: int, height: int, key: str) -> Image.Image:
+    """Noisy RGB image, so encoding costs roughly what a real render would."""
+    tile = hashlib.shake_256(key.encode("utf-8")).digest(64 * 64 * 3)
+    base = Image.frombytes("RGB", (64, 64), tile)
+    return base.resize((width, height), Image.Resampling.NEAREST).effect_spread(4)
@@ -0,0 +1,274 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from apps.backend.app.batching import DeadlineExceeded, GenerationBatcher, QueueFullError
+from apps.backend.app.config import Settings
+from apps.backend.app.schemas import GenerationRequest, ImageResult
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def _fake_runner(calls: list[list[str]]):
+    def run(requests: list[GenerationRequest], progress: list) -> list[list[ImageResult]]:
+        calls.append([req.prompt for req in requests])
+        return [
+            [
+                ImageResult(base64_png=req.prompt, seed=idx, width=64, height=64, lora=req.lora)
+                for idx in range(req.num_images)
+            ]
+            for req in requests
+        ]
+
+    return run
+
+
+def test_compatible_requests_share_one_batch() -> None:
+    calls: list[list[str]] = []
+    batcher = GenerationBatcher(_fake_runner(calls), DummySettings(batch_window_ms=20))
+
+    async def scenario() -> list[list[ImageResult]]:
+        await batcher.start()
+        try:
+            return await asyncio.gather(
+                batcher.submit(GenerationRequest(prompt="oni", num_images=2)),
+                batcher.submit(GenerationRequest(prompt="kappa")),
+            )
+        finally:
+            await batcher.stop()
+
+    first, second = asyncio.run(scenario())
+
+    assert calls == [["oni", "kappa"]]
+    assert [img.base64_png for img in first] == ["oni", "oni"]
+    assert [img.base64_png for img in second] == ["kappa"]
+    stats = batcher.stats()
+    assert stats.batches_run == 1
+    assert stats.batch_size_histogram == {"2": 1}
+    assert stats.queue_depth == 0
+
+
+def test_incompatible_requests_run_separately() -> None:
+    calls: list[list[str]] = []
+    batcher = GenerationBatcher(_fake_runner(calls), DummySettings(batch_window_ms=20))
+
+    async def scenario() -> None:
+        await batcher.start()
+        try:
+            await asyncio.gather(
+                batcher.submit(GenerationRequest(prompt="small", width=512, height=512)),
+                batcher.submit(GenerationRequest(prompt="large")),
+                batcher.submit(GenerationRequest(prompt="oni", lora=["oni.safetensors"])),
+            )
+        finally:
+            await batcher.stop()
+
+    asyncio.run(scenario())
+
+    assert sorted(calls) == [["large"], ["oni"], ["small"]]
+
+
+def test_batch_respects_image_limit() -> None:
+    calls: list[list[str]] = []
+    batcher = GenerationBatcher(
+        _fake_runner(calls),
+        DummySettings(batch_window_ms=20, batch_max_images=4),
+    )
+
+    async def scenario() -> None:
+        await batcher.start()
+        try:
+            await asyncio.gather(
+                *(batcher.submit(GenerationRequest(prompt=f"p{idx}", num_images=2)) for idx in range(3))
+            )
+        finally:
+            await batcher.stop()
+
+    asyncio.run(scenario())
+
+    assert calls == [["p0", "p1"], ["p2"]]
+
+
+def test_full_queue_rejects_with_retry_after() -> None:
+    batcher = GenerationBatcher(_fake_runner([]), DummySettings(batch_window_ms=1000, max_queue_depth=2))
+
+    async def scenario() -> None:
+        await batcher.start()
+        try:
+            first = await batcher.enqueue(GenerationRequest(prompt="a"))
+            second = await batcher.enqueue(GenerationRequest(prompt="b"))
+            assert (first.position, second.position) == (1, 2)
+            with pytest.raises(QueueFullError) as excinfo:
+                await batcher.enqueue(GenerationRequest(prompt="c"))
+            assert excinfo.value.retry_after >= 1
+        finally:
+            await batcher.stop()
+
+    asyncio.run(scenario())
+
+
+def test_finalizer_runs_off_the_pipeline_thread() -> None:
+    import threading
+
+    threads: dict[str, str] = {}
+
+    def runner(requests: list[GenerationRequest], progress: list) -> list[list[str]]:
+        threads["runner"] = threading.current_thread().name
+        return [[req.prompt] for req in requests]
+
+    def finalizer(request: GenerationRequest, raw: list[str]) -> list[ImageResult]:
+        threads["finalizer"] = threading.current_thread().name
+        return [ImageResult(base64_png=item.upper(), seed=0, width=64, height=64, lora=[]) for item in raw]
+
+    batcher = GenerationBatcher(runner, DummySettings(batch_window_ms=5), finalizer=finalizer)
+
+    async def scenario() -> list[ImageResult]:
+        try:
+            return await batcher.submit(GenerationRequest(prompt="oni"))
+        finally:
+            await batcher.stop()
+
+    (result,) = asyncio.run(scenario())
+
+    assert result.base64_png == "ONI"
+    assert threads["runner"].startswith("yokai-pipeline")
+    assert threads["finalizer"].startswith("yokai-encode")
+
+
+def _slow_runner(steps_run: list[int]):
+    def run(requests: list[GenerationRequest], progress: list) -> list[list[str]]:
+        import time
+
+        for step in range(1, 201):
+            for report in progress:
+                report(step, 200, None)
+            steps_run.append(step)
+            time.sleep(0.005)
+        return [[req.prompt] for req in requests]
+
+    return run
+
+
+def test_cancel_frees_queue_slot_and_stops_running_batch() -> None:
+    steps_run: list[int] = []
+    batcher = GenerationBatcher(_slow_runner(steps_run), DummySettings(batch_window_ms=5, max_queue_depth=1))
+
+    async def scenario() -> None:
+        await batcher.start()
+        try:
+            running = await batcher.enqueue(GenerationRequest(prompt="a"))
+            while not steps_run:
+                await asyncio.sleep(0.005)
+            queued = await batcher.enqueue(GenerationRequest(prompt="b", width=512, height=512))
+            assert batcher.cancel(queued.future)
+            await asyncio.sleep(0)
+            assert batcher.queue_depth == 0
+            assert batcher.cancel(running.future)
+            with pytest.raises(asyncio.CancelledError):
+                await running.future
+            # The pipeline thread is free again well before the 200 steps are done.
+            await batcher.run_exclusive(lambda: None)
+        finally:
+            await batcher.stop()
+
+    asyncio.run(scenario())
+
+    assert 0 < len(steps_run) < 200
+
+
+def test_deadline_fails_request() -> None:
+    steps_run: list[int] = []
+    batcher = GenerationBatcher(_slow_runner(steps_run), DummySettings(batch_window_ms=5))
+
+    async def scenario() -> None:
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await batcher.submit(GenerationRequest(prompt="a", timeout_seconds=0.1))
+            await batcher.run_exclusive(lambda: None)
+        finally:
+            await batcher.stop()
+
+    asyncio.run(scenario())
+
+    assert len(steps_run) < 200
+
+
+def test_streamed_images_arrive_before_the_batch_finishes() -> None:
+    import threading
+
+    release = threading.Event()
+
+    def runner(requests: list[GenerationRequest], progress: list, sinks: list) -> list[list[str]]:
+        outputs = []
+        for request, sink in zip(requests, sinks):
+            images = [f"{request.prompt}-{idx}" for idx in range(request.num_images)]
+            for idx, image in enumerate(images):
+                sink(idx, image)
+                # Hold the batch open until the test has seen the first image.
+                assert release.wait(timeout=5)
+            outputs.append(images)
+        return outputs
+
+    def finalizer(request: GenerationRequest, raw: list[str]) -> list[ImageResult]:
+        return [ImageResult(base64_png=item, seed=0, width=64, height=64, lora=[]) for item in raw]
+
+    batcher = GenerationBatcher(runner, DummySettings(batch_window_ms=5), finalizer=finalizer)
+
+    async def scenario() -> tuple[list[str], list[str]]:
+        try:
+            ticket = await batcher.enqueue(GenerationRequest(prompt="oni", num_images=2), stream=True)
+            assert ticket.images is not None
+            first = await asyncio.wait_for(ticket.images.get(), timeout=5)
+            assert not ticket.future.done()
+            release.set()
+            assert first is not None
+            streamed = [first[1].base64_png]
+            while (entry := await ticket.images.get()) is not None:
+                streamed.append(entry[1].base64_png)
+            final = await ticket.future
+            return streamed, [image.base64_png for image in final]
+        finally:
+            await batcher.stop()
+
+    streamed, final = asyncio.run(scenario())
+
+    assert streamed == ["oni-0", "oni-1"]
+    assert final == ["oni-0", "oni-1"]
+
+
+def test_streamed_images_keep_their_index_when_encoded_out_of_order() -> None:
+    def runner(requests: list[GenerationRequest], progress: list, sinks: list) -> list[list[str]]:
+        outputs = []
+        for request, sink in zip(requests, sinks):
+            images = [f"{request.prompt}-{idx}" for idx in range(request.num_images)]
+            for idx, image in enumerate(images):
+                sink(idx, image)
+            outputs.append(images)
+        return outputs
+
+    def finalizer(request: GenerationRequest, raw: list[str]) -> list[ImageResult]:
+        # The first image takes longest to encode, so it finishes last.
+        if raw[0].endswith("-0"):
+            time.sleep(0.2)
+        return [ImageResult(base64_png=item, seed=0, width=64, height=64, lora=[]) for item in raw]
+
+    batcher = GenerationBatcher(runner, DummySettings(batch_window_ms=5, encode_workers=2), finalizer=finalizer)
+
+    async def scenario() -> list[tuple[int, str]]:
+        try:
+            ticket = await batcher.enqueue(GenerationRequest(prompt="oni", num_images=2), stream=True)
+            assert ticket.images is not None
+            streamed = []
+            while (entry := await ticket.images.get()) is not None:
+                streamed.append((entry[0], entry[1].base64_png))
+            await ticket.future
+            return streamed
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(scenario()) == [(1, "oni-1"), (0, "oni-0")]
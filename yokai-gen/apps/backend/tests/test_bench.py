@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+from apps.backend.bench.loadtest import parse_sizes, percentile
+
+_ROOT = Path(__file__).resolve().parents[3]
+
+
+def test_percentile_interpolates() -> None:
+    values = [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert percentile(values, 50) == 0.3
+    assert abs(percentile(values, 95) - 0.48) < 1e-9
+    assert percentile([], 99) is None
+    assert parse_sizes("512x512, 1024x768,640") == [(512, 512), (1024, 768), (640, 640)]
+
+
+def test_loadtest_reports_latencies(tmp_path: Path) -> None:
+    output = tmp_path / "bench.json"
+    # A fresh interpreter, since the harness points settings at its own temp workspace.
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "apps.backend.bench.loadtest",
+            "--requests=6",
+            "--concurrency=3",
+            "--steps=2",
+            "--step-ms=1",
+            "--lora-load-ms=1",
+            "--sizes=256x256",
+            "--publish-ratio=0.5",
+            f"--output={output}",
+        ],
+        cwd=_ROOT,
+        check=True,
+        capture_output=True,
+        timeout=120,
+    )
+    report = json.loads(output.read_text(encoding="utf-8"))
+
+    assert report["generate"]["count"] == 6
+    assert report["generate"]["errors"] == {}
+    assert report["generate"]["p99_ms"] >= report["generate"]["p50_ms"] > 0
+    assert report["publish"]["errors"] == {}
+    assert report["queue"]["requests_run"] >= 6
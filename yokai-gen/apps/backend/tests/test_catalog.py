@@ -0,0 +1,76 @@
+import json
+import os
+import struct
+from pathlib import Path
+
+from apps.backend.app.catalog import Catalog, read_safetensors_header
+from apps.backend.app.config import Settings
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def _write_safetensors(path: Path, header: dict, payload: bytes = b"\0" * 64) -> None:
+    raw = json.dumps(header).encode("utf-8")
+    path.write_bytes(struct.pack("<Q", len(raw)) + raw + payload)
+
+
+def test_reads_kohya_metadata_from_header(tmp_path: Path) -> None:
+    _write_safetensors(
+        tmp_path / "oni.safetensors",
+        {
+            "__metadata__": {
+                "ss_base_model_version": "sdxl_base_v1-0",
+                "ss_network_alpha": "8.0",
+                "ss_tag_frequency": json.dumps({"10_oni": {"oni": 12, "horns": 9, "red skin": 3}}),
+            },
+            "lora_unet_input_blocks_4_1_proj_in.lora_down.weight": {
+                "dtype": "F16",
+                "shape": [16, 640],
+                "data_offsets": [0, 20480],
+            },
+        },
+    )
+    (tmp_path / "broken.safetensors").write_bytes(b"\xff" * 16)
+
+    entries = {entry.name: entry for entry in Catalog(DummySettings(lora_dir=tmp_path)).loras()}
+
+    meta = entries["oni.safetensors"].metadata
+    assert meta is not None
+    assert (meta.base_model, meta.rank, meta.alpha, meta.sdxl) == ("sdxl_base_v1-0", 16, 8.0, True)
+    assert meta.trigger_words == ("oni", "horns", "red skin")
+    assert entries["broken.safetensors"].metadata is None
+    assert entries["oni.safetensors"].size == (tmp_path / "oni.safetensors").stat().st_size
+    assert "__metadata__" in read_safetensors_header(tmp_path / "oni.safetensors")
+
+
+def test_listing_is_reused_until_directory_changes(tmp_path: Path) -> None:
+    _write_safetensors(tmp_path / "a.safetensors", {})
+    catalog = Catalog(DummySettings(lora_dir=tmp_path, catalog_rescan_seconds=3600))
+
+    first = catalog.loras()
+    assert [entry.name for entry in first] == ["a.safetensors"]
+    assert catalog.loras()[0] is first[0]
+
+    _write_safetensors(tmp_path / "b.safetensors", {})
+    # Coarse filesystem timestamps could hide the change within the same tick.
+    stat = tmp_path.stat()
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    names = [entry.name for entry in catalog.loras()]
+    assert names == ["a.safetensors", "b.safetensors"]
+    assert catalog.loras()[0] is first[0]
+
+
+def test_digest_is_lazy_and_follows_file_changes(tmp_path: Path) -> None:
+    path = tmp_path / "a.safetensors"
+    _write_safetensors(path, {})
+    catalog = Catalog(DummySettings(lora_dir=tmp_path))
+
+    assert catalog.loras()[0].sha256 is None
+    digest = catalog.lora_digest("a.safetensors")
+    assert catalog.loras()[0].sha256 == digest
+
+    _write_safetensors(path, {}, payload=b"\1" * 65)
+    assert catalog.lora_digest("a.safetensors") != digest
@@ -0,0 +1,76 @@
+import io
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from apps.backend.app.config import Settings
+from apps.backend.app.edits import prepare_edit
+from apps.backend.app.encoding import load_mask, load_rgb
+from apps.backend.app.image_store import ImageStore
+from apps.backend.app.schemas import GenerationRequest, ImageEditRequest
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def _png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _cutout() -> bytes:
+    image = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+    image.paste((200, 10, 10, 255), (2, 2, 6, 6))
+    return _png(image)
+
+
+def test_inpaint_mask_defaults_to_cutout_transparency(tmp_path: Path) -> None:
+    store = ImageStore(DummySettings(image_store_dir=tmp_path))
+    payload = ImageEditRequest(prompt="oni", init_image_base64=b64encode(_cutout()).decode())
+
+    request = prepare_edit(payload, store, inpaint=True)
+
+    assert type(request) is GenerationRequest
+    assert store.get(request.init_image_id) is not None
+    mask = load_mask(store.read(request.mask_image_id)[0], (8, 8))
+    assert mask.getpixel((0, 0)) == 255
+    assert mask.getpixel((3, 3)) == 0
+    # The cutout itself is composited on white for the init image.
+    init = load_rgb(store.read(request.init_image_id)[0], (8, 8))
+    assert init.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_img2img_reuses_stored_ids_and_rejects_bad_input(tmp_path: Path) -> None:
+    store = ImageStore(DummySettings(image_store_dir=tmp_path))
+    stored = store.put(_png(Image.new("RGB", (8, 8), "red")), "image/png")
+
+    request = prepare_edit(ImageEditRequest(prompt="oni", init_image_id=stored.id), store, inpaint=False)
+    assert (request.init_image_id, request.mask_image_id) == (stored.id, None)
+
+    with pytest.raises(ValueError):
+        prepare_edit(ImageEditRequest(prompt="oni", init_image_id=stored.id), store, inpaint=True)
+    with pytest.raises(ValueError):
+        prepare_edit(ImageEditRequest(prompt="oni", init_image_base64="bm90IGFuIGltYWdl"), store, inpaint=False)
+    with pytest.raises(FileNotFoundError):
+        prepare_edit(ImageEditRequest(prompt="oni", init_image_id="0" * 64), store, inpaint=False)
+    with pytest.raises(ValueError):
+        ImageEditRequest(prompt="oni")
+
+
+def test_uploads_in_other_formats_are_stored_as_png(tmp_path: Path) -> None:
+    store = ImageStore(DummySettings(image_store_dir=tmp_path))
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "blue").save(buffer, format="GIF")
+    payload = ImageEditRequest(prompt="oni", init_image_base64=b64encode(buffer.getvalue()).decode())
+
+    request = prepare_edit(payload, store, inpaint=False)
+
+    data, stored = store.read(request.init_image_id)
+    assert stored.media_type == "image/png"
+    assert stored.path.suffix == ".png"
+    assert data.startswith(b"\x89PNG")
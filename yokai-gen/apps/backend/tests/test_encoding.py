@@ -0,0 +1,54 @@
+import io
+from pathlib import Path
+
+from PIL import Image
+
+from apps.backend.app.config import Settings
+from apps.backend.app.encoding import GeneratedImage, finalize_images, sniff_media_type
+from apps.backend.app.image_store import ImageStore
+from apps.backend.app.schemas import GenerationRequest
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def test_finalize_uses_requested_format(tmp_path: Path) -> None:
+    cfg = DummySettings(image_store_dir=tmp_path, output_format="png")
+    store = ImageStore(cfg)
+    generated = [GeneratedImage(image=Image.new("RGB", (16, 16), (0, 128, 0)), seed=7, width=16, height=16)]
+    request = GenerationRequest(prompt="kappa", output_format="webp", output_quality=70, response_format="base64")
+
+    (result,) = finalize_images(request, generated, cfg, store)
+
+    assert result.media_type == "image/webp"
+    assert result.base64_data
+    # The legacy field name promises PNG, so it stays empty for WebP.
+    assert result.base64_png is None
+    data, stored = store.read(result.image_id)
+    assert stored.path.suffix == ".webp"
+    assert sniff_media_type(data) == "image/webp"
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.size == (16, 16)
+
+
+def test_finalize_defaults_to_settings_format(tmp_path: Path) -> None:
+    cfg = DummySettings(image_store_dir=tmp_path, output_format="jpeg")
+    generated = [GeneratedImage(image=Image.new("RGBA", (8, 8)), seed=1, width=8, height=8)]
+
+    (result,) = finalize_images(GenerationRequest(prompt="oni"), generated, cfg, ImageStore(cfg))
+
+    assert result.media_type == "image/jpeg"
+    assert result.base64_data is None and result.base64_png is None
+    assert result.url == f"/images/{result.image_id}"
+
+
+def test_png_output_fills_the_deprecated_field_too(tmp_path: Path) -> None:
+    cfg = DummySettings(image_store_dir=tmp_path, output_format="png")
+    generated = [GeneratedImage(image=Image.new("RGB", (8, 8)), seed=1, width=8, height=8)]
+    request = GenerationRequest(prompt="oni", response_format="base64")
+
+    (result,) = finalize_images(request, generated, cfg, ImageStore(cfg))
+
+    assert result.base64_data and result.base64_png == result.base64_data
@@ -0,0 +1,89 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from apps.backend.app import feature_store
+from apps.backend.app.feature_store import FeatureStore
+
+
+def _feature(fid: str, title: str = "妖怪") -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [139.7, 35.6, 0]},
+        "properties": {"id": fid, "title": title},
+    }
+
+
+def test_next_id_continues_from_existing_file(tmp_path: Path) -> None:
+    path = tmp_path / "places.json"
+    path.write_text(
+        json.dumps({"type": "FeatureCollection", "features": [_feature("yokai-007"), _feature("kitaro")]}),
+        encoding="utf-8",
+    )
+    store = FeatureStore(path)
+
+    assert store.next_id() == "yokai-008"
+    assert store.upsert(_feature("yokai-007", "replaced")) == 2
+    store.flush()
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["features"][0]["properties"]["title"] == "replaced"
+
+
+def test_concurrent_upserts_are_not_lost(tmp_path: Path) -> None:
+    store = FeatureStore(tmp_path / "places.json")
+
+    def publish() -> None:
+        for _ in range(10):
+            with store.lock:
+                store.upsert(_feature(store.next_id()))
+
+    threads = [threading.Thread(target=publish) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.flush()
+
+    data = json.loads((tmp_path / "places.json").read_text(encoding="utf-8"))
+    ids = {feat["properties"]["id"] for feat in data["features"]}
+    assert len(ids) == 40
+
+
+def test_unflushed_journal_is_replayed(tmp_path: Path) -> None:
+    path = tmp_path / "places.json"
+    store = FeatureStore(path, flush_every=100, flush_interval=3600)
+    store.upsert(_feature("yokai-001"))
+    store.upsert(_feature("yokai-002"))
+    assert not path.exists()
+
+    # A fresh process sees the journaled features before any flush happened.
+    recovered = FeatureStore(path)
+    assert recovered.count() == 2
+    assert recovered.next_id() == "yokai-003"
+
+    store.flush()
+    assert not store.journal_path.exists()
+    assert len(json.loads(path.read_text(encoding="utf-8"))["features"]) == 2
+
+
+def test_default_batches_full_rewrites(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "places.json"
+    rewrites = []
+    real_write = feature_store.atomic_write_json
+
+    def counting_write(target: Path, data, indent=None) -> None:
+        if target == path:
+            rewrites.append(len(data["features"]))
+        real_write(target, data, indent=indent)
+
+    monkeypatch.setattr(feature_store, "atomic_write_json", counting_write)
+    store = FeatureStore(path, flush_interval=3600)
+    upserts = 20
+    for num in range(1, upserts + 1):
+        store.upsert(_feature(f"yokai-{num:03d}"))
+
+    assert len(rewrites) < upserts
+    store.flush()
+    assert rewrites[-1] == upserts
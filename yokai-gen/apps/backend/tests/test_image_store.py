@@ -0,0 +1,36 @@
+import os
+import time
+from pathlib import Path
+
+from apps.backend.app.config import Settings
+from apps.backend.app.image_store import ImageStore
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def test_put_is_content_addressed(tmp_path: Path) -> None:
+    store = ImageStore(DummySettings(image_store_dir=tmp_path))
+
+    first = store.put(b"png-bytes", "image/png")
+    second = store.put(b"png-bytes", "image/png")
+
+    assert first.id == second.id
+    assert len(list(tmp_path.iterdir())) == 1
+    data, stored = store.read(first.id)
+    assert data == b"png-bytes"
+    assert stored.media_type == "image/png"
+    assert store.url_for(first.id) == f"/images/{first.id}"
+
+
+def test_expired_and_invalid_ids_are_not_served(tmp_path: Path) -> None:
+    store = ImageStore(DummySettings(image_store_dir=tmp_path, image_store_ttl_seconds=60))
+    stored = store.put(b"old", "image/png")
+    stale = time.time() - 120
+    os.utime(stored.path, (stale, stale))
+
+    assert store.get(stored.id) is None
+    assert not stored.path.exists()
+    assert store.get("../../etc/passwd") is None
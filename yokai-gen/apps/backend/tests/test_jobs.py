@@ -0,0 +1,100 @@
+import asyncio
+from pathlib import Path
+
+from apps.backend.app.batching import GenerationBatcher
+from apps.backend.app.config import Settings
+from apps.backend.app.jobs import JobStore
+from apps.backend.app.schemas import GenerationRequest, ImageResult
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def _stepping_runner(requests: list[GenerationRequest], progress: list) -> list[list[ImageResult]]:
+    for step in range(1, 4):
+        for report in progress:
+            if report is not None:
+                report(step, 3, "preview" if step == 3 else None)
+    return [[ImageResult(base64_png="png", seed=1, width=64, height=64, lora=[])] for _ in requests]
+
+
+def test_job_reports_progress_and_result() -> None:
+    batcher = GenerationBatcher(_stepping_runner, DummySettings(batch_window_ms=5))
+    store = JobStore(batcher, DummySettings())
+
+    async def scenario() -> list:
+        await batcher.start()
+        try:
+            created = await store.submit(GenerationRequest(prompt="oni", latent_previews=True))
+            assert created.status == "queued"
+            assert created.queue_position == 1
+            return [status async for status in store.events(created.id)]
+        finally:
+            await batcher.stop()
+
+    events = asyncio.run(scenario())
+
+    assert events[0].status == "queued"
+    assert [e.step for e in events if e.status == "running"] == [1, 2, 3]
+    final = events[-1]
+    assert final.status == "succeeded"
+    assert final.preview_png == "preview"
+    assert final.images is not None and final.images[0].base64_png == "png"
+
+
+def test_failed_job_records_error() -> None:
+    def failing(requests: list[GenerationRequest], progress: list) -> list[list[ImageResult]]:
+        raise FileNotFoundError("LoRA weight not found: missing.safetensors")
+
+    batcher = GenerationBatcher(failing, DummySettings(batch_window_ms=5))
+    store = JobStore(batcher, DummySettings())
+
+    async def scenario():
+        await batcher.start()
+        try:
+            created = await store.submit(GenerationRequest(prompt="oni"))
+            async for _ in store.events(created.id):
+                pass
+            return store.get(created.id)
+        finally:
+            await batcher.stop()
+
+    status = asyncio.run(scenario())
+
+    assert status.status == "failed"
+    assert "missing.safetensors" in status.error
+
+
+def test_cancelled_job() -> None:
+    started = asyncio.Event()
+
+    def blocking(requests: list[GenerationRequest], progress: list) -> list[list[ImageResult]]:
+        import time
+
+        for step in range(1, 201):
+            for report in progress:
+                report(step, 200, None)
+            time.sleep(0.005)
+        return [[] for _ in requests]
+
+    batcher = GenerationBatcher(blocking, DummySettings(batch_window_ms=5))
+    store = JobStore(batcher, DummySettings())
+
+    async def scenario():
+        await batcher.start()
+        try:
+            created = await store.submit(GenerationRequest(prompt="oni"))
+            async for status in store.events(created.id):
+                if status is not None and status.status == "running":
+                    started.set()
+                    break
+            return await store.cancel(created.id)
+        finally:
+            await batcher.stop()
+
+    status = asyncio.run(scenario())
+
+    assert started.is_set()
+    assert status.status == "cancelled"
@@ -0,0 +1,168 @@
+from pathlib import Path
+
+import pytest
+
+from apps.backend.app.config import Settings
+from apps.backend.app.lora_cache import LoraAdapterCache, adapter_name_for
+from apps.backend.app.model_registry import shareable_components
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+class FakePipe:
+    def __init__(self) -> None:
+        self.calls: list[tuple] = []
+
+    def load_lora_weights(self, path, adapter_name):
+        self.calls.append(("load", Path(path).name, adapter_name))
+
+    def delete_adapters(self, adapter_name):
+        self.calls.append(("delete", adapter_name))
+
+    def set_adapters(self, adapters, adapter_weights):
+        self.calls.append(("set", tuple(adapters), tuple(adapter_weights)))
+
+    def disable_lora(self):
+        self.calls.append(("disable",))
+
+    def enable_lora(self):
+        self.calls.append(("enable",))
+
+
+class FakeEncoder:
+    """PEFT state on a text encoder: adapter names must be unique, one set is active."""
+
+    def __init__(self) -> None:
+        self.adapters: set[str] = set()
+        self.active: tuple[str, ...] = ()
+
+    def load(self, adapter_name: str) -> None:
+        if adapter_name in self.adapters:
+            raise ValueError(f"Adapter with name {adapter_name} already exists")
+        self.adapters.add(adapter_name)
+
+
+class EncoderPipe(FakePipe):
+    def __init__(self, text_encoder: FakeEncoder) -> None:
+        super().__init__()
+        self.text_encoder = text_encoder
+
+    def load_lora_weights(self, path, adapter_name):
+        self.text_encoder.load(adapter_name)
+        super().load_lora_weights(path, adapter_name)
+
+    def set_adapters(self, adapters, adapter_weights):
+        self.text_encoder.active = tuple(adapters)
+        super().set_adapters(adapters, adapter_weights)
+
+
+def _write_lora(directory: Path, name: str, size: int) -> None:
+    (directory / name).write_bytes(b"\0" * size)
+
+
+def test_alternating_loras_load_once(tmp_path: Path) -> None:
+    _write_lora(tmp_path, "oni.safetensors", 10)
+    _write_lora(tmp_path, "kappa.safetensors", 10)
+    cache = LoraAdapterCache(DummySettings(lora_dir=tmp_path))
+    pipe = FakePipe()
+
+    cache.activate(pipe, ["oni.safetensors"])
+    cache.activate(pipe, ["kappa.safetensors"], {"kappa.safetensors": 0.6})
+    cache.activate(pipe, ["oni.safetensors"])
+    cache.activate(pipe, [])
+
+    loads = [call for call in pipe.calls if call[0] == "load"]
+    assert loads == [
+        ("load", "oni.safetensors", adapter_name_for("oni.safetensors")),
+        ("load", "kappa.safetensors", adapter_name_for("kappa.safetensors")),
+    ]
+    assert ("set", (adapter_name_for("kappa.safetensors"),), (0.6,)) in pipe.calls
+    assert pipe.calls[-1] == ("disable",)
+    stats = cache.stats()
+    assert (stats.hits, stats.misses) == (1, 2)
+    assert stats.active == []
+
+
+def test_similar_file_names_get_distinct_adapters(tmp_path: Path) -> None:
+    names = ["oni.safetensors", "oni.pt", "oni-v1.safetensors", "oni_v1.safetensors"]
+    for name in names:
+        _write_lora(tmp_path, name, 10)
+    cache = LoraAdapterCache(DummySettings(lora_dir=tmp_path))
+    pipe = FakePipe()
+
+    cache.activate(pipe, names)
+
+    adapters = [call[2] for call in pipe.calls if call[0] == "load"]
+    assert len(set(adapters)) == len(names)
+    assert all(adapter.isidentifier() for adapter in adapters)
+    assert ("set", tuple(adapters), (1.0,) * len(names)) in pipe.calls
+
+
+def test_two_models_keep_their_own_text_encoder_lora_state(tmp_path: Path) -> None:
+    _write_lora(tmp_path, "oni.safetensors", 10)
+    _write_lora(tmp_path, "kappa.safetensors", 10)
+    settings = DummySettings(lora_dir=tmp_path)
+    # Build the second model the way PipelineManager does with LoRAs enabled.
+    first_encoder = FakeEncoder()
+    second_encoder = first_encoder if "text_encoder" in shareable_components(lora_enabled=True) else FakeEncoder()
+    first, second = EncoderPipe(first_encoder), EncoderPipe(second_encoder)
+    first_cache = LoraAdapterCache(settings, model="base")
+    second_cache = LoraAdapterCache(settings, model="style")
+
+    first_cache.activate(first, ["oni.safetensors"])
+    second_cache.activate(second, ["oni.safetensors"])
+    first_cache.activate(first, ["kappa.safetensors"])
+    second_cache.activate(second, ["oni.safetensors"])
+
+    assert first.text_encoder.active == (adapter_name_for("kappa.safetensors"),)
+    assert second.text_encoder.active == (adapter_name_for("oni.safetensors"),)
+    assert "text_encoder" in shareable_components(lora_enabled=False)
+
+
+def test_budget_evicts_least_recently_used(tmp_path: Path) -> None:
+    mb = 1024 * 1024
+    for name in ("a.safetensors", "b.safetensors", "c.safetensors"):
+        _write_lora(tmp_path, name, mb)
+    cache = LoraAdapterCache(DummySettings(lora_dir=tmp_path, lora_cache_budget_mb=2))
+    pipe = FakePipe()
+
+    cache.activate(pipe, ["a.safetensors"])
+    cache.activate(pipe, ["b.safetensors"])
+    cache.activate(pipe, ["c.safetensors"])
+
+    assert ("delete", adapter_name_for("a.safetensors")) in pipe.calls
+    assert set(cache.stats().resident) == {"b.safetensors", "c.safetensors"}
+
+
+def test_no_lora_request_before_any_load_leaves_pipe_alone(tmp_path: Path) -> None:
+    cache = LoraAdapterCache(DummySettings(lora_dir=tmp_path))
+    pipe = FakePipe()
+
+    # diffusers raises from disable_lora when the pipe has no LoRA layers yet.
+    cache.activate(pipe, [])
+
+    assert pipe.calls == []
+
+
+def test_missing_lora_raises(tmp_path: Path) -> None:
+    cache = LoraAdapterCache(DummySettings(lora_dir=tmp_path))
+    with pytest.raises(FileNotFoundError):
+        cache.activate(FakePipe(), ["missing.safetensors"])
+    assert cache.stats().resident == {}
+
+
+def test_replaced_lora_file_is_reloaded(tmp_path: Path) -> None:
+    _write_lora(tmp_path, "oni.safetensors", 10)
+    cache = LoraAdapterCache(DummySettings(lora_dir=tmp_path))
+    pipe = FakePipe()
+
+    cache.activate(pipe, ["oni.safetensors"])
+    _write_lora(tmp_path, "oni.safetensors", 12)
+    cache.activate(pipe, ["oni.safetensors"])
+
+    loads = [call for call in pipe.calls if call[0] == "load"]
+    assert len(loads) == 2
+    assert ("delete", adapter_name_for("oni.safetensors")) in pipe.calls
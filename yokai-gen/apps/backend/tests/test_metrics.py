@@ -0,0 +1,36 @@
+from apps.backend.app.metrics import MetricsRegistry, size_bucket
+
+
+def test_histogram_and_counter_exposition() -> None:
+    registry = MetricsRegistry()
+    stage = registry.histogram("t_stage_seconds", "Stage time.", ("stage", "model"), buckets=(0.1, 1.0))
+    errors = registry.counter("t_errors_total", "Errors.", ("stage",))
+    registry.callback("t_queue_depth", "Depth.", lambda: {(): 3})
+
+    stage.observe(0.05, stage="denoise", model="base")
+    stage.observe(0.5, stage="denoise", model="base")
+    stage.observe(5.0, stage="denoise", model="base")
+    errors.inc(stage="publish")
+    errors.inc(stage="publish")
+
+    text = registry.render()
+    assert "# TYPE t_stage_seconds histogram" in text
+    assert 't_stage_seconds_bucket{stage="denoise",model="base",le="0.1"} 1' in text
+    assert 't_stage_seconds_bucket{stage="denoise",model="base",le="1"} 2' in text
+    assert 't_stage_seconds_bucket{stage="denoise",model="base",le="+Inf"} 3' in text
+    assert 't_stage_seconds_count{stage="denoise",model="base"} 3' in text
+    assert 't_errors_total{stage="publish"} 2' in text
+    assert "t_queue_depth 3" in text
+
+
+def test_failing_callback_does_not_break_scrape() -> None:
+    registry = MetricsRegistry()
+    registry.callback("t_broken", "Broken.", lambda: 1 / 0)
+    registry.counter("t_ok_total", "Ok.").inc()
+    assert "t_ok_total 1" in registry.render()
+
+
+def test_size_buckets() -> None:
+    assert size_bucket(512, 512) == "le_0.25mp"
+    assert size_bucket(1024, 1024) == "le_1mp"
+    assert size_bucket(1536, 1536) == "le_2.4mp"
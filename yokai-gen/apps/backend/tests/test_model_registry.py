@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from apps.backend.app.config import Settings
+from apps.backend.app.model_registry import (
+    ModelRegistry,
+    RegistryHooks,
+    component_fingerprints,
+    estimate_model_bytes,
+)
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def _registry(events: list[tuple[str, str]], sizes: dict[str, int] | None = None, **overrides) -> ModelRegistry:
+    sizes = sizes or {}
+    hooks = RegistryHooks(
+        estimate=lambda name: sizes.get(name, 0),
+        load=lambda name: events.append(("load", name)) or {"name": name},
+        to_device=lambda model: events.append(("to_device", model["name"])),
+        offload=lambda model: events.append(("offload", model["name"])),
+        release=lambda model: events.append(("release", model["name"])),
+    )
+    return ModelRegistry(hooks, DummySettings(**overrides))
+
+
+def test_lru_models_are_offloaded_then_released() -> None:
+    events: list[tuple[str, str]] = []
+    registry = _registry(events, max_resident_models=1, max_offloaded_models=1)
+
+    registry.acquire("base")
+    registry.acquire("anime")
+    registry.acquire("base")
+    registry.acquire("ink")
+
+    assert events == [
+        ("load", "base"),
+        ("offload", "base"),
+        ("load", "anime"),
+        ("offload", "anime"),
+        ("to_device", "base"),
+        ("offload", "base"),
+        ("release", "anime"),
+        ("load", "ink"),
+    ]
+    stats = registry.stats()
+    assert stats.device == ["ink"]
+    assert stats.offloaded == ["base"]
+    assert (stats.loads, stats.offload_hits) == (3, 1)
+
+
+def test_memory_budget_and_drop_policy() -> None:
+    events: list[tuple[str, str]] = []
+    mb = 1024 * 1024
+    registry = _registry(
+        events,
+        {"base": 6 * mb, "anime": 3 * mb, "ink": 5 * mb},
+        max_resident_models=3,
+        model_memory_budget_mb=10,
+        model_eviction="drop",
+    )
+
+    registry.acquire("base")
+    registry.acquire("anime")
+    assert ("release", "base") not in events
+    registry.acquire("anime")
+    registry.acquire("ink")
+
+    assert ("release", "base") in events
+    assert registry.residency("anime") == "device"
+    assert registry.residency("base") is None
+    assert registry.stats().device_hits == 1
+
+
+def _write_model(root: Path, encoder_bytes: bytes) -> Path:
+    for component, payload in (("text_encoder", encoder_bytes), ("vae", b"vae"), ("unet", b"u" * 100)):
+        (root / component).mkdir(parents=True)
+        (root / component / "config.json").write_text("{}", encoding="utf-8")
+        (root / component / "model.safetensors").write_bytes(payload)
+    return root
+
+
+def test_fingerprints_detect_shared_components(tmp_path: Path) -> None:
+    base = component_fingerprints(_write_model(tmp_path / "base", b"clip"))
+    style = component_fingerprints(_write_model(tmp_path / "style", b"clip"))
+    tuned = component_fingerprints(_write_model(tmp_path / "tuned", b"CLIP"))
+
+    assert base == style
+    assert base["vae"] == tuned["vae"]
+    assert base["text_encoder"] != tuned["text_encoder"]
+    assert "unet" not in base
+    assert estimate_model_bytes(tmp_path / "base") == 4 + 3 + 100
+    assert estimate_model_bytes(tmp_path / "base", skip=["text_encoder", "vae"]) == 100
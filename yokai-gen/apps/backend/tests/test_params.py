@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from apps.backend.app.config import Settings
+from apps.backend.app.params import accept_request, resolve_params, validate_request
+from apps.backend.app.schemas import AcceptRequest, GenerationRequest
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def test_full_tier_uses_settings_defaults() -> None:
+    cfg = DummySettings()
+    params = resolve_params(GenerationRequest(prompt="oni"), cfg)
+
+    assert (params.scheduler, params.steps, params.width, params.height) == (
+        cfg.scheduler,
+        cfg.inference_steps,
+        cfg.width,
+        cfg.height,
+    )
+    assert params.guidance == cfg.guidance_scale
+    assert params.strength is None
+
+
+def test_preview_tier_shrinks_and_shortens() -> None:
+    cfg = DummySettings(preview_scale=0.5, preview_steps=8)
+    params = resolve_params(GenerationRequest(prompt="oni", quality="preview", width=1024, height=768), cfg)
+
+    assert (params.width, params.height) == (512, 384)
+    assert params.steps == 8
+    assert params.scheduler == cfg.preview_scheduler
+
+
+def test_lcm_lora_switches_scheduler_and_guidance() -> None:
+    cfg = DummySettings(lcm_loras=["lcm-lora-sdxl.safetensors"], lcm_steps=4, lcm_guidance_scale=1.5)
+    request = GenerationRequest(prompt="oni", lora=["lcm-lora-sdxl.safetensors"])
+    params = resolve_params(request, cfg)
+
+    assert (params.scheduler, params.steps, params.guidance) == ("lcm", 4, 1.5)
+    explicit = resolve_params(request.model_copy(update={"scheduler": "unipc", "steps": 12}), cfg)
+    assert (explicit.scheduler, explicit.steps) == ("unipc", 12)
+
+
+def test_lcm_needs_a_configured_lcm_lora() -> None:
+    cfg = DummySettings(lcm_loras=["lcm-lora-sdxl.safetensors"])
+    # A name that merely contains "lcm" is an ordinary LoRA.
+    lookalike = GenerationRequest(prompt="oni", lora=["oni-lcm-style.safetensors"])
+    assert resolve_params(lookalike, cfg).scheduler == cfg.scheduler
+
+    with pytest.raises(ValueError):
+        validate_request(lookalike.model_copy(update={"scheduler": "lcm"}), cfg)
+    validate_request(GenerationRequest(prompt="oni", scheduler="lcm", lora=["lcm-lora-sdxl.safetensors"]), cfg)
+
+
+def test_accept_turns_preview_into_full_img2img() -> None:
+    cfg = DummySettings(upscale_strength=0.4)
+    preview = GenerationRequest(prompt="oni", quality="preview", num_images=4, width=1024, height=1024)
+    full = accept_request(AcceptRequest(image_id="a" * 64, seed=42, request=preview), cfg)
+
+    assert (full.quality, full.seed, full.num_images, full.init_image_id) == ("full", 42, 1, "a" * 64)
+    params = resolve_params(full, cfg)
+    assert (params.width, params.steps, params.strength) == (1024, cfg.inference_steps, 0.4)
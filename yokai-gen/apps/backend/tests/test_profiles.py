@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from apps.backend.app.config import Settings
+from apps.backend.app.profiles import PROFILES, estimate_peak_bytes, select_profile
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+GB = 1024**3
+SDXL_FP16 = 7 * GB
+
+
+def test_auto_profile_degrades_with_size_and_batch() -> None:
+    cfg = DummySettings()
+
+    def pick(width: int, height: int, images: int) -> str:
+        return select_profile(cfg, width, height, images, SDXL_FP16, 16 * GB).name
+
+    assert pick(512, 512, 1) == "performance"
+    assert pick(1024, 1024, 4) == "balanced"
+    assert pick(1536, 1024, 4) == "low_memory"
+    assert pick(1536, 1536, 4) == "minimal"
+
+
+def test_cpu_never_picks_sequential_offload() -> None:
+    cfg = DummySettings()
+    profile = select_profile(cfg, 1536, 1536, 8, SDXL_FP16 * 2, 8 * GB, dtype_bytes=4, can_offload=False)
+    assert profile.name == "low_memory"
+    # Offload does not shrink the estimate when it cannot be used.
+    low = PROFILES["low_memory"]
+    assert estimate_peak_bytes(low, 1024, 1024, 1, SDXL_FP16, can_offload=False) > SDXL_FP16
+
+
+def test_fixed_profile_wins() -> None:
+    cfg = DummySettings(execution_profile="balanced")
+    assert select_profile(cfg, 512, 512, 1, SDXL_FP16, 100 * GB).name == "balanced"
@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from apps.backend.app.config import Settings
+from apps.backend.app.prompt_cache import PromptEmbeddingCache
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def test_encodes_each_prompt_and_lora_set_once() -> None:
+    cache = PromptEmbeddingCache(DummySettings(prompt_cache_size=2))
+    calls: list[str] = []
+
+    def encode(text: str):
+        return lambda: calls.append(text) or (text,)
+
+    plain = ("base", "oni", None, True, ())
+    with_lora = ("base", "oni", None, True, (("oni.safetensors", 1.0),))
+    assert cache.get_or_encode(plain, encode("oni")) == ("oni",)
+    assert cache.get_or_encode(plain, encode("oni")) == ("oni",)
+    cache.get_or_encode(with_lora, encode("oni+lora"))
+    cache.get_or_encode(("base", "kappa", None, True, ()), encode("kappa"))
+
+    assert calls == ["oni", "oni+lora", "kappa"]
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.entries) == (1, 3, 1, 2)
+
+    cache.drop_model("base")
+    assert cache.stats().entries == 0
+
+
+def test_disabled_cache_always_encodes() -> None:
+    cache = PromptEmbeddingCache(DummySettings(prompt_cache_size=0))
+    calls: list[int] = []
+    for _ in range(2):
+        cache.get_or_encode(("base", "oni"), lambda: calls.append(1) or (1,))
+    assert len(calls) == 2
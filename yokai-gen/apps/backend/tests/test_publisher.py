@@ -3,16 +3,23 @@ import io
 import json
 from pathlib import Path
 
+import pytest
 from PIL import Image
 
+from apps.backend.app import publisher
 from apps.backend.app.config import Settings
+from apps.backend.app.image_store import ImageStore
+from apps.backend.app.metrics import REGISTRY
 from apps.backend.app.publisher import publish_yokai
 from apps.backend.app.schemas import PlaceMetadata, PublishRequest
+from apps.backend.app.tiles import TileIndex
 
 
 class DummySettings(Settings):
     model_dir: Path = Path("/tmp/model")
     lora_dir: Path = Path("/tmp/lora")
+    places_tiles_enabled: bool = False
+    places_flush_every: int = 1
 
 
 def _make_image_b64() -> str:
@@ -55,3 +62,87 @@ def test_publish_writes_png_and_updates_geojson(tmp_path: Path) -> None:
     assert props["title"] == "テスト妖怪"
     assert props["origin"] == "yokai-gen"
     assert props["prompt"] == "prompt text"
+
+
+def test_publish_by_image_id_copies_stored_bytes(tmp_path: Path) -> None:
+    cfg = DummySettings(
+        places_json_path=tmp_path / "places.json",
+        places_image_dir=tmp_path / "img" / "yokai",
+        image_store_dir=tmp_path / "store",
+    )
+    png = base64.b64decode(_make_image_b64())
+    stored = ImageStore(cfg).put(png, "image/png")
+    payload = PublishRequest(
+        metadata=PlaceMetadata(title="id妖怪", longitude=135.0, latitude=35.0),
+        image_id=stored.id,
+    )
+
+    resp = publish_yokai(payload, cfg)
+
+    assert resp.image_path.read_bytes() == png
+
+
+def test_publish_writes_thumbnail_for_map(tmp_path: Path) -> None:
+    cfg = DummySettings(
+        places_json_path=tmp_path / "places.json",
+        places_image_dir=tmp_path / "img" / "yokai",
+        places_thumbnail_size=4,
+        places_thumbnail_format="webp",
+    )
+    payload = PublishRequest(
+        metadata=PlaceMetadata(title="サムネ妖怪", longitude=135.0, latitude=35.0),
+        image_base64=_make_image_b64(),
+    )
+
+    resp = publish_yokai(payload, cfg)
+
+    assert resp.thumbnail_url == f"/img/yokai/{resp.id}.thumb.webp"
+    with Image.open(cfg.places_image_dir / f"{resp.id}.thumb.webp") as thumb:
+        assert max(thumb.size) <= 4
+    fc = json.loads(resp.places_path.read_text(encoding="utf-8"))
+    assert fc["features"][0]["properties"]["thumbnail_url"] == resp.thumbnail_url
+
+
+def test_tile_index_is_built_once_per_store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    built = []
+
+    class CountingTileIndex(TileIndex):
+        def __init__(self, *args, **kwargs) -> None:
+            built.append(args)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(publisher, "TileIndex", CountingTileIndex)
+    cfg = DummySettings(
+        places_json_path=tmp_path / "places.json",
+        places_image_dir=tmp_path / "img" / "yokai",
+        places_tiles_enabled=True,
+        places_tiles_dir=tmp_path / "tiles",
+    )
+    for title in ("一つ目", "二つ目"):
+        payload = PublishRequest(
+            metadata=PlaceMetadata(title=title, longitude=135.0, latitude=35.0),
+            image_base64=_make_image_b64(),
+        )
+        publish_yokai(payload, cfg)
+
+    assert len(built) == 1
+    manifest = json.loads((tmp_path / "tiles" / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["feature_count"] == 2
+
+
+def test_publish_latency_is_labelled_by_model_and_size(tmp_path: Path) -> None:
+    cfg = DummySettings(
+        places_json_path=tmp_path / "places.json",
+        places_image_dir=tmp_path / "img" / "yokai",
+    )
+    payload = PublishRequest(
+        metadata=PlaceMetadata(title="計測妖怪", longitude=135.0, latitude=35.0),
+        image_base64=_make_image_b64(),
+        model="style-xl",
+    )
+
+    resp = publish_yokai(payload, cfg)
+
+    assert 'yokai_publish_seconds_count{model="style-xl",size="le_0.25mp"}' in REGISTRY.render()
+    fc = json.loads(resp.places_path.read_text(encoding="utf-8"))
+    assert fc["features"][0]["properties"]["model"] == "style-xl"
@@ -0,0 +1,134 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from apps.backend.app import result_cache
+from apps.backend.app.batching import GenerationBatcher
+from apps.backend.app.config import Settings
+from apps.backend.app.image_store import ImageStore
+from apps.backend.app.result_cache import ResultCache
+from apps.backend.app.schemas import GenerationRequest, ImageResult
+
+
+class DummySettings(Settings):
+    model_dir: Path = Path("/tmp/model")
+    lora_dir: Path = Path("/tmp/lora")
+
+
+def _settings(tmp_path: Path, **overrides) -> DummySettings:
+    model_dir = tmp_path / "model"
+    (model_dir / "unet").mkdir(parents=True, exist_ok=True)
+    (model_dir / "unet" / "diffusion_pytorch_model.safetensors").write_bytes(b"unet")
+    lora_dir = tmp_path / "lora"
+    lora_dir.mkdir(exist_ok=True)
+    (lora_dir / "oni.safetensors").write_bytes(b"oni")
+    return DummySettings(
+        model_dir=model_dir,
+        lora_dir=lora_dir,
+        image_store_dir=tmp_path / "images",
+        result_cache_dir=tmp_path / "results",
+        **overrides,
+    )
+
+
+def _results(store: ImageStore, payloads: list[bytes]) -> list[ImageResult]:
+    results = []
+    for seed, payload in enumerate(payloads):
+        stored = store.put(payload, "image/png")
+        results.append(
+            ImageResult(image_id=stored.id, url=store.url_for(stored.id), seed=seed, width=64, height=64, lora=[])
+        )
+    return results
+
+
+def test_key_covers_generation_parameters_and_weights(tmp_path: Path) -> None:
+    cfg = _settings(tmp_path)
+    cache = ResultCache(cfg, ImageStore(cfg))
+    base = GenerationRequest(prompt="oni", seed=1, lora=["oni.safetensors"])
+
+    assert cache.key_for(GenerationRequest(prompt="oni")) is None
+    key = cache.key_for(base)
+    assert key == cache.key_for(base.model_copy(update={"steps": cfg.inference_steps, "response_format": "base64"}))
+    assert key != cache.key_for(base.model_copy(update={"seed": 2}))
+    assert key != cache.key_for(base.model_copy(update={"lora_scales": {"oni.safetensors": 0.5}}))
+
+    lora = cfg.lora_dir / "oni.safetensors"
+    stat = lora.stat()
+    os.utime(lora, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert key != cache.key_for(base)
+
+
+def test_model_fingerprint_is_memoized_until_rescan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    walks = []
+    real_fingerprint = result_cache.model_fingerprint
+
+    def counting_fingerprint(model_path: Path) -> str:
+        walks.append(model_path)
+        return real_fingerprint(model_path)
+
+    monkeypatch.setattr(result_cache, "model_fingerprint", counting_fingerprint)
+    request = GenerationRequest(prompt="oni", seed=1)
+
+    cfg = _settings(tmp_path)
+    cache = ResultCache(cfg, ImageStore(cfg))
+    key = cache.key_for(request)
+    assert cache.key_for(request) == key
+    assert len(walks) == 1
+
+    # With no grace period, an in-place weight overwrite is picked up on the next key.
+    fresh = ResultCache(_settings(tmp_path, catalog_rescan_seconds=0), ImageStore(cfg))
+    before = fresh.key_for(request)
+    (cfg.model_dir / "unet" / "diffusion_pytorch_model.safetensors").write_bytes(b"retrained unet")
+    assert fresh.key_for(request) != before
+
+
+def test_hits_survive_restart_and_disk_budget_evicts(tmp_path: Path) -> None:
+    cfg = _settings(tmp_path, result_cache_disk_mb=1)
+    store = ImageStore(cfg)
+    cache = ResultCache(cfg, store)
+    first = GenerationRequest(prompt="oni", seed=1)
+    second = GenerationRequest(prompt="kappa", seed=1)
+
+    assert cache.get(first) is None
+    cache.put(first, _results(store, [b"a" * 600_000]))
+    hit = cache.get(first)
+    assert hit is not None and hit[0].seed == 0
+
+    restarted = ResultCache(cfg, store)
+    assert restarted.get(first) is not None
+    restarted.put(second, _results(store, [b"b" * 600_000]))
+
+    stats = restarted.stats()
+    assert (stats.hits, stats.stores, stats.disk_entries) == (1, 1, 1)
+    assert ResultCache(cfg, store).get(first) is None
+    assert len(list(cfg.result_cache_dir.glob("*.json"))) == 1
+
+
+def test_batcher_answers_repeat_requests_from_cache(tmp_path: Path) -> None:
+    cfg = _settings(tmp_path, batch_window_ms=0)
+    store = ImageStore(cfg)
+    calls: list[str] = []
+
+    def runner(requests: list[GenerationRequest], progress: list) -> list[list[bytes]]:
+        calls.extend(req.prompt for req in requests)
+        return [[req.prompt.encode()] for req in requests]
+
+    def finalizer(request: GenerationRequest, raw: list[bytes]) -> list[ImageResult]:
+        return _results(store, raw)
+
+    batcher = GenerationBatcher(runner, cfg, finalizer=finalizer, cache=ResultCache(cfg, store))
+
+    async def scenario() -> tuple[bool, bool]:
+        try:
+            first = await batcher.enqueue(GenerationRequest(prompt="oni", seed=7))
+            await first.future
+            second = await batcher.enqueue(GenerationRequest(prompt="oni", seed=7))
+            await second.future
+            return first.cached, second.cached
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(scenario()) == (False, True)
+    assert calls == ["oni"]
@@ -1,5 +1,7 @@
 from pathlib import Path
 
+import pytest
+
 from apps.backend.app import storage
 from apps.backend.app.config import Settings
 
@@ -18,3 +20,30 @@ def test_list_lora_weights(tmp_path):
     assert len(paths) == 1
     assert paths[0].name == "oni.safetensors"
 
+
+
+def _make_model(path: Path) -> Path:
+    path.mkdir(parents=True)
+    (path / "model_index.json").write_text("{}", encoding="utf-8")
+    return path
+
+
+def test_list_base_models_puts_default_first(tmp_path):
+    _make_model(tmp_path / "anime")
+    _make_model(tmp_path / "base")
+    (tmp_path / "notes").mkdir()
+    cfg = DummySettings(model_dir=tmp_path, default_model_subdir="base")
+
+    names = [path.name for path in storage.list_base_models(cfg)]
+    assert names == ["base", "anime"]
+    assert storage.resolve_base_model(None, cfg) == tmp_path / "base"
+    assert storage.resolve_base_model("anime", cfg) == tmp_path / "anime"
+
+
+def test_resolve_base_model_rejects_unknown_names(tmp_path):
+    _make_model(tmp_path / "base")
+    cfg = DummySettings(model_dir=tmp_path, default_model_subdir="base")
+
+    for name in ("missing", "../base", "notes"):
+        with pytest.raises(FileNotFoundError):
+            storage.resolve_base_model(name, cfg)
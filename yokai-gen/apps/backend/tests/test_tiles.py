@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+from apps.backend.app.feature_store import FeatureStore
+from apps.backend.app.tiles import TileIndex, tile_bbox, tile_for
+
+
+def _feature(fid: str, lon: float, lat: float) -> dict:
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat, 0]},
+        "properties": {"id": fid},
+    }
+
+
+def test_tile_for_matches_bbox() -> None:
+    key = tile_for(139.76, 35.68, 7)
+    west, south, east, north = tile_bbox(key, 7)
+    assert west <= 139.76 < east
+    assert south <= 35.68 < north
+
+
+def test_store_writes_only_changed_tiles(tmp_path: Path) -> None:
+    tiles_dir = tmp_path / "tiles"
+    tiles = TileIndex(tiles_dir, zoom=7)
+    store = FeatureStore(tmp_path / "places.json", flush_every=1, tiles=tiles)
+
+    store.upsert(_feature("yokai-001", 139.76, 35.68))  # Tokyo
+    store.upsert(_feature("yokai-002", 135.50, 34.69))  # Osaka
+
+    manifest = json.loads((tiles_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["feature_count"] == 2
+    assert len(manifest["tiles"]) == 2
+    osaka_tile = tile_for(135.50, 34.69, 7)
+    osaka_path = tiles_dir / "7" / str(osaka_tile[0]) / f"{osaka_tile[1]}.json"
+    before = osaka_path.stat().st_mtime_ns
+
+    # Moving the Tokyo yokai next to Osaka empties its old tile.
+    store.upsert(_feature("yokai-001", 135.51, 34.70))
+
+    manifest = json.loads((tiles_dir / "manifest.json").read_text(encoding="utf-8"))
+    assert [(t["x"], t["y"], t["count"]) for t in manifest["tiles"]] == [(*osaka_tile, 2)]
+    tokyo_tile = tile_for(139.76, 35.68, 7)
+    assert not (tiles_dir / "7" / str(tokyo_tile[0]) / f"{tokyo_tile[1]}.json").exists()
+    assert osaka_path.stat().st_mtime_ns >= before
+    ids = [f["properties"]["id"] for f in json.loads(osaka_path.read_text(encoding="utf-8"))["features"]]
+    assert ids == ["yokai-001", "yokai-002"]
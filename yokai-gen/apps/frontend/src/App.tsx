@@ -140,7 +140,8 @@ export default function App() {
           era: metadata.era ?? "now",
           source: metadata.source ?? "yokai-gen",
         },
-        image_base64: selectedImage.base64_png,
+        image_id: selectedImage.image_id ?? undefined,
+        image_base64: selectedImage.image_id ? undefined : selectedImage.base64_data ?? selectedImage.base64_png ?? undefined,
         prompt: promptPreview.prompt,
         negative_prompt: promptPreview.negative,
         seed: selectedImage.seed,
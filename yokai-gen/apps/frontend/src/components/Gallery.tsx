@@ -1,3 +1,4 @@
+import { imageSrc } from "@/lib/api";
 import type { GenerationImage } from "@/types";
 
 interface GalleryProps {
@@ -30,9 +31,9 @@ export function Gallery({ images, isLoading, selectedSeed, onSelect }: GalleryPr
       {images.map((img) => {
         const isSelected = selectedSeed === img.seed;
         return (
-          <article key={`${img.seed}-${img.base64_png.slice(0, 16)}`} className="gallery__card">
+          <article key={img.image_id ?? `${img.seed}-${(img.base64_data ?? img.base64_png ?? "").slice(0, 16)}`} className="gallery__card">
             <div className="gallery__frame">
-              <img src={`data:image/png;base64,${img.base64_png}`} alt="Generated yokai" />
+              <img src={imageSrc(img)} alt="Generated yokai" />
               {onSelect && (
                 <button
                   type="button"
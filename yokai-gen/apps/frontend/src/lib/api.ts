@@ -1,5 +1,7 @@
 import type {
+  AcceptPayload,
   GeneratePayload,
+  GenerationImage,
   GenerationResponse,
   LoraInfo,
   PublishPayload,
@@ -8,6 +10,11 @@ import type {
 
 const API_BASE = import.meta.env.VITE_API_URL ?? "http://127.0.0.1:8000";
 
+export function imageSrc(image: GenerationImage): string {
+  if (image.url) return `${API_BASE}${image.url}`;
+  return `data:${image.media_type};base64,${image.base64_data ?? image.base64_png ?? ""}`;
+}
+
 async function handleResponse<T>(res: Response): Promise<T> {
   if (!res.ok) {
     const message = await res.text();
@@ -30,6 +37,15 @@ export async function generateImages(payload: GeneratePayload): Promise<Generati
   return handleResponse(res);
 }
 
+export async function acceptPreview(payload: AcceptPayload): Promise<GenerationResponse> {
+  const res = await fetch(`${API_BASE}/accept`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  return handleResponse(res);
+}
+
 export async function publishYokai(payload: PublishPayload): Promise<PublishResponse> {
   const res = await fetch(`${API_BASE}/publish`, {
     method: "POST",
@@ -1,10 +1,22 @@
 export interface LoraInfo {
   name: string;
   path: string;
+  size_bytes?: number;
+  sha256?: string | null;
+  base_model?: string | null;
+  sdxl?: boolean | null;
+  rank?: number | null;
+  alpha?: number | null;
+  trigger_words?: string[];
 }
 
 export interface GenerationImage {
-  base64_png: string;
+  image_id: string | null;
+  url: string | null;
+  media_type: string;
+  base64_data?: string | null;
+  /** @deprecated use base64_data; only set for PNG output */
+  base64_png: string | null;
   seed: number;
   width: number;
   height: number;
@@ -13,6 +25,7 @@ export interface GenerationImage {
 
 export interface GenerationResponse {
   images: GenerationImage[];
+  cached?: boolean;
 }
 
 export interface GeneratePayload {
@@ -21,10 +34,23 @@ export interface GeneratePayload {
   steps?: number;
   guidance_scale?: number;
   num_images?: number;
+  model?: string;
   lora?: string[];
   seed?: number | null;
   width?: number;
   height?: number;
+  scheduler?: "euler_a" | "euler" | "dpmpp_2m" | "dpmpp_2m_karras" | "unipc" | "ddim" | "lcm";
+  quality?: "full" | "preview";
+  output_format?: "png" | "webp" | "jpeg";
+  output_quality?: number;
+  response_format?: "url" | "base64";
+}
+
+export interface AcceptPayload {
+  image_id: string;
+  seed: number;
+  request: GeneratePayload;
+  strength?: number;
 }
 
 export interface PublishMetadata {
@@ -42,16 +68,19 @@ export interface PublishMetadata {
 
 export interface PublishPayload {
   metadata: PublishMetadata;
-  image_base64: string;
+  image_id?: string;
+  image_base64?: string;
   prompt?: string;
   negative_prompt?: string;
   seed?: number;
   lora?: string[];
+  model?: string;
 }
 
 export interface PublishResponse {
   id: string;
   image_url: string;
+  thumbnail_url?: string | null;
   image_path: string;
   places_path: string;
   places_count: number;
@@ -0,0 +1,18 @@
+#!/usr/bin/env bash
+# In-process load test of the backend against a stub pipeline (no GPU or weights needed).
+# Extra arguments go to the harness, e.g. --requests 500 --concurrency 32 --output bench.json
+set -euo pipefail
+
+REPO_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+VENV_DIR="${VENV_DIR:-${REPO_ROOT}/.venv}"
+
+if [ ! -d "${VENV_DIR}" ]; then
+  echo "[bench_backend] Missing venv. Run scripts/setup_sd_env.sh first." >&2
+  exit 1
+fi
+
+source "${VENV_DIR}/bin/activate"
+cd "${REPO_ROOT}"
+export PYTHONPATH="${PYTHONPATH:-}:${REPO_ROOT}"
+
+exec python -m apps.backend.bench.loadtest "$@"